@@ -1,13 +1,23 @@
 from flask import Flask, render_template, request, jsonify, Response, make_response, stream_with_context
-from utils import generate_concepts, generate_relationships, create_network_data, parse_json_response, generate_new_concept_detail, pre_judge_person
+from utils import generate_concepts, generate_relationships, create_network_data, parse_json_response, generate_new_concept_detail, pre_judge_person, check_content_filter, judge_and_generate_concepts
 from database import DatabaseManager
-from models import Session, KnowledgeGraph
+from models import Session, ReadSession, KnowledgeGraph, LOAD_PAYLOAD, LOAD_CONCEPTS
+from stream_parser import ConceptStreamParser
+from pipeline import relationship_builder
+from topic_cache import person_cache, normalize_topic, topic_index
+from single_flight import generation_flights, regeneration_flights
+from graph_cache import hot_graphs, graph_files
+from network import NETWORK_DATA_VERSION, derive_graph
+from model_router import model_router
+from rate_limit import provider_limits
+from configs import derive_smaller_graphs, save_derived_graphs
 import json
 import uuid
-import re
 import time
 import os
 import logging
+import threading
+from contextlib import contextmanager
 
 app = Flask(__name__)
 
@@ -23,6 +33,136 @@ logging.basicConfig(
     format='%(asctime)s %(levelname)s: %(message)s'
 )
 
+# 保存派生图谱时按 (规范化主题, 节点数量) 加锁，同一进程中并发未命中的请求只保存一次：键 -> [锁, 使用者数]
+derive_locks = {}
+derive_locks_guard = threading.Lock()
+
+@contextmanager
+def derive_lock(topic: str, count: int):
+    key = (normalize_topic(topic), count)
+    with derive_locks_guard:
+        entry = derive_locks.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with derive_locks_guard:
+            entry[1] -= 1
+            if not entry[1]:
+                del derive_locks[key]
+
+def stream_concepts(topic: str, count: int, is_person: bool, builder=None, chunks=None, started_at: float = None):
+    """
+    流式生成概念并产出SSE进度事件，用法：concepts = yield from stream_concepts(...)
+    进度中只展示已完整生成（含介绍）的概念，增量解析失败时回退到 parse_json_response
+    :param builder: 关系构建器，每个完整生成的概念都会交给它（流水线模式下提前开始推断关系）
+    :param chunks: 已开始的概念文本流（如投机生成的结果），默认新建一次流式生成
+    :param started_at: 请求开始时间，用于记录首个节点耗时
+    """
+    if chunks is None:
+        chunks = generate_concepts(topic, count, is_person, True)
+    parser = ConceptStreamParser()
+    generated_concepts = []
+    new_concepts = {}
+    last_update_time = 0
+    dot_phase = 0
+    
+    for chunk in chunks:
+        for concept, description in parser.feed(chunk):
+            if started_at and not generated_concepts:
+                logging.info(f"主题 '{topic}' 首个节点耗时: {time.time() - started_at:.2f}s")
+            generated_concepts.append("✅" + concept)
+            new_concepts[concept] = description
+            if builder:
+                builder.add(concept, description)
+        current_time = time.time()
+        # 有新概念完成或每0.3秒更新一次进度
+        if new_concepts or current_time - last_update_time >= 0.3:
+            progress_value = 30 + (len(generated_concepts) / count) * 40
+            progress_value = min(progress_value, 70)
+            dots = '.' * ((dot_phase % 3) + 1)
+            dot_phase += 1
+            display_message = "正在生成节点:\n" + "\n".join(generated_concepts) + dots
+            yield "data: " + json.dumps({
+                'status': 'generating_concepts_partial',
+                'progress': progress_value,
+                'message': display_message,
+                'new_concepts': new_concepts
+            }) + '\n\n'
+            new_concepts = {}
+            last_update_time = current_time
+    
+    concepts = parser.result()
+    if concepts is None:
+        # 解析完整的概念 JSON 文本
+        concepts = parse_json_response(parser.text, error_context=f"处理主体 '{topic}' 的节点生成结果时")
+    return concepts
+
+def load_cached_graph_event(topic: str, count: int):
+    """
+    从数据库获取最佳图谱并编码为SSE complete 事件字节，供热门图谱缓存保存
+    :return: (事件字节, 图谱所属的 (主题, 节点数量))；没有缓存图谱时返回 (None, None)
+    """
+    source = (topic, count)
+    cached_graph = DatabaseManager.get_best_graph(topic, count)
+    if not cached_graph:
+        # 没有该主题的图谱时，复用相近主题（空白、标点、大小写或拼写略有不同）已有的图谱，
+        # 热门图谱缓存记为相近主题的别名，相近主题的图谱被点赞/点踩或保存新图谱时一并失效
+        similar_topic = topic_index.match(topic, count)
+        if similar_topic is not None:
+            logging.info(f"主题 '{topic}' 使用相近主题 '{similar_topic}' 的图谱")
+            cached_graph = DatabaseManager.get_best_graph(similar_topic, count)
+            source = (similar_topic, count)
+    if not cached_graph and derive_smaller_graphs:
+        cached_graph, source = derive_cached_graph(topic, count)
+    if not cached_graph:
+        return None, None
+    # 检查缓存图谱是否包含is_person字段
+    is_person = cached_graph.get('is_person', False)
+    return ("data: " + json.dumps({
+        'status': 'complete',
+        'progress': 100,
+        'message': '正在获取关系图谱...',
+        'data': {
+            'graph_id': cached_graph['id'],
+            'concepts': cached_graph['concepts'],
+            'relationships': cached_graph['relationships'],
+            'network_data': cached_graph['network_data'],
+            'is_person': is_person  # 返回is_person标记
+        }
+    }) + '\n\n').encode('utf-8'), source
+
+def derive_cached_graph(topic: str, count: int):
+    """
+    从同一主题节点更多的已有图谱中选出最核心的 count 个概念派生出图谱，启用 save_derived_graphs 时保存为新图谱
+    :return: (与 get_best_graph 结果字段相同的字典, 图谱所属的 (主题, 节点数量))；没有更大的图谱时返回 (None, None)。
+             不保存时图谱ID为None（不能点赞、点踩或分享），热门图谱缓存记为来源图谱的别名，来源图谱失效时一并失效
+    """
+    source = DatabaseManager.get_best_larger_graph(topic, count)
+    if not source:
+        return None, None
+    concepts, relationships = derive_graph(source['concepts'], source['relationships'], count, topic)
+    network_data = create_network_data(concepts, relationships)
+    is_person = source.get('is_person', 0)
+    graph_id, graph_source = None, (topic, source['concept_count'])
+    if save_derived_graphs:
+        with derive_lock(topic, count):
+            # 在锁内再查一次，其他请求已保存派生图谱时直接使用
+            saved = DatabaseManager.get_best_graph(topic, count)
+            if saved:
+                return saved, (topic, count)
+            graph_id = DatabaseManager.save_knowledge_graph(topic, count, concepts, relationships, is_person, network_data=network_data)
+        graph_source = (topic, count)
+    logging.info(f"主题 '{topic}' 从 {source['concept_count']} 个节点的图谱 {source['id']} 派生出 {len(concepts)} 个节点的图谱")
+    return {
+        'id': graph_id,
+        'concepts': concepts,
+        'relationships': relationships,
+        'network_data': network_data,
+        'is_person': is_person
+    }, graph_source
+
 @app.route('/')
 def index():
     # 为新用户生成UUID
@@ -43,32 +183,31 @@ def generate_stream():
     if not 5 <= count <= 20:
         return jsonify({'error': '节点数量必须在5到20之间'}), 400
     
+    DatabaseManager.record_topic_request(normalize_topic(topic), count)
+
     def generate():
         try:
-            # 尝试从数据库获取缓存图谱
-            cached_graph = DatabaseManager.get_best_graph(topic, count)
-            if cached_graph:
-                # 检查缓存图谱是否包含is_person字段
-                is_person = cached_graph.get('is_person', False)
-                yield "data: " + json.dumps({
-                    'status': 'complete',
-                    'progress': 100,
-                    'message': '正在获取关系图谱...',
-                    'data': {
-                        'graph_id': cached_graph['id'],
-                        'concepts': cached_graph['concepts'],
-                        'relationships': cached_graph['relationships'],
-                        'network_data': create_network_data(
-                            cached_graph['concepts'],
-                            cached_graph['relationships']
-                        ),
-                        'is_person': is_person  # 返回is_person标记
-                    }
-                }) + '\n\n'
+            # 尝试从热门图谱缓存或数据库获取缓存图谱
+            cached_event = hot_graphs.fetch(topic, count, lambda: load_cached_graph_event(topic, count))
+            if cached_event:
+                yield cached_event
                 return
+        except Exception as e:
+            logging.error(f"生成流程出错: {str(e)}", exc_info=True)
+            yield "data: " + json.dumps({
+                'status': 'error',
+                'message': str(e)
+            }) + '\n\n'
+            return
+
+        # 没有缓存时，相同主题和数量的并发请求共享同一次生成
+        yield from generation_flights.join((normalize_topic(topic), count), generate_graph)
 
-            # 预判主题是否为人物
-            is_person = pre_judge_person(topic)
+    def generate_graph():
+        try:
+            # 预判主题是否为人物（投机模式下同时开始生成概念）
+            started_at = time.time()
+            is_person, chunks = judge_and_generate_concepts(topic, count)
             logging.info(f"主题 '{topic}' 是否为人物: {is_person}")
             
             # 第一阶段：流式生成概念
@@ -78,33 +217,8 @@ def generate_stream():
                 'message': '正在初始化...\n接下来可能需要几分钟'
             }) + '\n\n'
             
-            accumulated_text = ""
-            generated_concepts = []
-            key_pattern = re.compile(r'"([^"]+)"\s*:')
-            last_update_time = 0
-            dot_phase = 0
-            
-            # 调用生成概念函数，启用流式输出
-            for chunk in generate_concepts(topic, count, is_person, True):
-                accumulated_text += chunk
-                current_time = time.time()
-                # 每0.3秒更新一次进度
-                if current_time - last_update_time >= 0.3:
-                    keys = key_pattern.findall(accumulated_text)
-                    for key in keys:
-                        if "✅" + key not in generated_concepts:
-                            generated_concepts.append("✅" + key)
-                    progress_value = 30 + (len(generated_concepts) / count) * 40
-                    progress_value = min(progress_value, 70)
-                    dots = '.' * ((dot_phase % 3) + 1)
-                    dot_phase += 1
-                    display_message = "正在生成节点:\n" + "\n".join(generated_concepts) + dots
-                    yield "data: " + json.dumps({
-                        'status': 'generating_concepts_partial',
-                        'progress': progress_value,
-                        'message': display_message
-                    }) + '\n\n'
-                    last_update_time = current_time
+            builder = relationship_builder(is_person)
+            concepts = yield from stream_concepts(topic, count, is_person, builder, chunks, started_at)
             
             # 第二阶段：生成概念关系
             yield "data: " + json.dumps({
@@ -113,9 +227,7 @@ def generate_stream():
                 'message': '正在分析节点关系...\n节点太多的话可能需时几分钟'
             }) + '\n\n'
             
-            # 解析完整的概念 JSON 文本
-            concepts = parse_json_response(accumulated_text, error_context=f"处理主体 '{topic}' 的节点生成结果时")
-            relationships = generate_relationships(concepts, is_person)
+            relationships = builder.finish(concepts)
             network_data = create_network_data(concepts, relationships)
             
             # 保存生成的图谱和is_person标记
@@ -124,7 +236,8 @@ def generate_stream():
                 concept_count=count,
                 concepts=concepts,
                 relationships=relationships,
-                is_person=is_person  # 保存is_person标记到数据库
+                is_person=is_person,  # 保存is_person标记到数据库
+                network_data=network_data
             )
     
             yield "data: " + json.dumps({
@@ -185,7 +298,8 @@ def feedback():
         if not is_like:
             # 如果非【新增概念】或者没有强制重生标记，则执行缓存逻辑
             if not (is_new_concept_flag and force_regenerate):
-                DatabaseManager.record_user_view(user_id, graph_id)
+                # 随后的查询需要排除刚查看的图谱，等待写入提交
+                DatabaseManager.record_user_view(user_id, graph_id, wait=True)
                 viewed_count = DatabaseManager.get_viewed_count(topic, count, user_id)
                 logging.debug(f"Viewed count: {viewed_count}")
                 
@@ -194,10 +308,7 @@ def feedback():
                     logging.debug(f"Found top graphs: {len(top_graphs) if top_graphs else 0}")
                     if top_graphs:
                         next_graph = top_graphs[0]
-                        network_data = create_network_data(
-                            next_graph['concepts'],
-                            next_graph['relationships']
-                        )
+                        network_data = next_graph['network_data']
                         return jsonify({
                             'status': 'complete',
                             'progress': 100,
@@ -224,9 +335,9 @@ def feedback():
                         with Session() as session:
                             base_graph_id = request.json.get('added_concept_data', {}).get('base_graph_id')
                             if base_graph_id:
-                                graph = session.query(KnowledgeGraph).get(base_graph_id)
+                                graph = session.query(KnowledgeGraph).options(LOAD_CONCEPTS).get(base_graph_id)
                             else:
-                                graph = session.query(KnowledgeGraph).get(graph_id)
+                                graph = session.query(KnowledgeGraph).options(LOAD_CONCEPTS).get(graph_id)
                             if not graph:
                                 yield "data: " + json.dumps({
                                     'status': 'error',
@@ -279,7 +390,8 @@ def feedback():
                             concept_count=len(updated_concepts),
                             concepts=updated_concepts,
                             relationships=updated_relationships,
-                            is_person=is_person  # 保存is_person标记
+                            is_person=is_person,  # 保存is_person标记
+                            network_data=network_data
                         )
                         
                         DatabaseManager.record_user_view(user_id, new_graph_id)
@@ -308,8 +420,9 @@ def feedback():
             else:
                 def generate():
                     try:
-                        # 预判主题是否为人物
-                        is_person = pre_judge_person(topic)
+                        # 预判主题是否为人物（投机模式下同时开始生成概念）
+                        started_at = time.time()
+                        is_person, chunks = judge_and_generate_concepts(topic, count)
                         logging.info(f"预判主题 '{topic}' 是否为人物: {is_person}")
                         
                         yield "data: " + json.dumps({
@@ -318,36 +431,8 @@ def feedback():
                             'message': '正在初始化...\n接下来可能需要几分钟'
                         }) + '\n\n'
                         
-                        accumulated_text = ""
-                        generated_concepts = []
-                        key_pattern = re.compile(r'"([^"]+)"\s*:')
-                        last_update_time = 0
-                        dot_phase = 0
-                        
-                        for chunk in generate_concepts(topic, count, is_person, True):
-                            accumulated_text += chunk
-                            current_time = time.time()
-                            if current_time - last_update_time >= 0.3:
-                                keys = key_pattern.findall(accumulated_text)
-                                for key in keys:
-                                    if "✅" + key not in generated_concepts:
-                                        generated_concepts.append("✅" + key)
-                                progress_value = 30 + (len(generated_concepts) / count) * 40
-                                progress_value = min(progress_value, 70)
-                                dots = '.' * ((dot_phase % 3) + 1)
-                                dot_phase += 1
-                                display_message = "正在生成节点:\n" + "\n".join(generated_concepts) + dots
-                                yield "data: " + json.dumps({
-                                    'status': 'generating_concepts_partial',
-                                    'progress': progress_value,
-                                    'message': display_message
-                                }) + '\n\n'
-                                last_update_time = current_time
-                        
-                        concepts = parse_json_response(
-                            text=accumulated_text,
-                            error_context=f"处理主体 '{topic}' 的节点生成结果时"
-                        )
+                        builder = relationship_builder(is_person)
+                        concepts = yield from stream_concepts(topic, count, is_person, builder, chunks, started_at)
                         
                         yield "data: " + json.dumps({
                             'status': 'generating_relationships',
@@ -355,7 +440,7 @@ def feedback():
                             'message': '正在分析节点关系...\n节点太多的话可能需时几分钟'
                         }) + '\n\n'
                         
-                        relationships = generate_relationships(concepts, is_person)
+                        relationships = builder.finish(concepts)
                         network_data = create_network_data(concepts, relationships)
                         
                         new_graph_id = DatabaseManager.save_knowledge_graph(
@@ -363,7 +448,8 @@ def feedback():
                             concept_count=count,
                             concepts=concepts,
                             relationships=relationships,
-                            is_person=is_person  # 保存is_person标记
+                            is_person=is_person,  # 保存is_person标记
+                            network_data=network_data
                         )
                         
                         DatabaseManager.record_user_view(user_id, new_graph_id)
@@ -388,7 +474,7 @@ def feedback():
                             'message': str(e)
                         }) + '\n\n'
                 
-                return Response(stream_with_context(generate()), mimetype='text/event-stream')
+                return Response(stream_with_context(regeneration_flights.join(uuid.uuid4().hex, generate)), mimetype='text/event-stream')
         return jsonify(result)
     except Exception as e:
         logging.error(f"处理 feedback 时出错: {str(e)}", exc_info=True)
@@ -414,7 +500,7 @@ def add_concept():
             try:
                 # 获取现有图谱记录
                 with Session() as session:
-                    graph = session.query(KnowledgeGraph).get(graph_id)
+                    graph = session.query(KnowledgeGraph).options(LOAD_CONCEPTS).get(graph_id)
                     if not graph:
                         yield "data: " + json.dumps({
                             'status': 'error',
@@ -477,7 +563,8 @@ def add_concept():
                     concept_count=len(updated_concepts),
                     concepts=updated_concepts,
                     relationships=updated_relationships,
-                    is_person=is_person  # 保存is_person到新的图谱
+                    is_person=is_person,  # 保存is_person到新的图谱
+                    network_data=network_data
                 )
     
                 yield "data: " + json.dumps({
@@ -516,11 +603,11 @@ def search_graph():
         except ValueError:
             return jsonify({'error': '图谱编号必须为整数'}), 400
 
-        with Session() as session:
-            graph = session.query(KnowledgeGraph).get(graph_id)
+        with ReadSession() as session:
+            graph = session.query(KnowledgeGraph).options(LOAD_PAYLOAD).get(graph_id)
             if not graph:
                 return jsonify({'error': f'未找到图谱，图谱编号: {graph_id}'}), 404
-            network_data = create_network_data(graph.concepts, graph.relationships)
+            network_data = DatabaseManager.get_network_data(graph.id)
             # 获取is_person值，如果不存在则默认为False
             is_person = getattr(graph, 'is_person', False)
             return jsonify({
@@ -543,8 +630,7 @@ def get_default_graph():
     try:
         graph = DatabaseManager.get_default_graph()
         if graph:
-            # 需要使用 create_network_data 函数来正确创建网络数据
-            network_data = create_network_data(graph["concepts"], graph["relationships"])
+            network_data = graph["network_data"]
             # 获取is_person值，如果不存在则默认为False
             is_person = graph.get('is_person', False)
             return jsonify({
@@ -564,14 +650,9 @@ def check_filter():
     data = request.json
     topic = data.get('topic', '').lower()
     
-    # 读取过滤词列表
-    filter_path = os.path.join(app.static_folder, 'filter.txt')
     try:
-        with open(filter_path, 'r', encoding='utf-8') as f:
-            filter_words = [line.strip().lower() for line in f if line.strip()]
-        
         # 检查主题是否包含任何过滤词
-        is_filtered = any(word in topic for word in filter_words)
+        is_filtered = check_content_filter(topic)
         return jsonify({'filtered': is_filtered})
     except Exception as e:
         logging.error(f"检查过滤词时出错: {str(e)}", exc_info=True)
@@ -586,8 +667,8 @@ def get_graph():
             return jsonify({"error": "缺少 graph_id 参数"}), 400
 
         # 查询数据库获取对应的图谱对象
-        with Session() as session:
-            graph = session.query(KnowledgeGraph).get(graph_id)
+        with ReadSession() as session:
+            graph = session.query(KnowledgeGraph).options(LOAD_CONCEPTS).get(graph_id)
             if not graph:
                 return jsonify({"error": f"图谱ID {graph_id} 不存在"}), 404
 
@@ -600,8 +681,8 @@ def get_graph():
             except Exception as e:
                 return jsonify({"error": f"解析图谱 concepts 错误：{str(e)}"}), 500
 
-            # 生成网络数据
-            network_data = create_network_data(graph.concepts, graph.relationships)
+            # 读取保存图谱时预先计算的网络数据
+            network_data = DatabaseManager.get_network_data(graph.id)
             
             # 获取is_person值，如果不存在则默认为False
             is_person = getattr(graph, 'is_person', False)
@@ -620,5 +701,87 @@ def get_graph():
         logging.error(f"获取图谱时出错: {str(e)}", exc_info=True)
         return jsonify({"error": str(e)}), 500
 
+# 图谱只读接口的响应格式版本，与网络数据规则版本一起决定ETag，任一变化都会让旧缓存失效
+GRAPH_FILE_VERSION = 1
+
+def encode_graph_file(graph_id: int):
+    """
+    查询图谱并编码为只读接口返回的JSON字节
+    :return: JSON字节；图谱不存在时返回None
+    """
+    graph = DatabaseManager.get_graph(graph_id)
+    if not graph:
+        return None
+    return json.dumps({
+        "data": {
+            "graph_id": graph["id"],
+            "topic": graph["topic"],
+            "concept_count": graph["concept_count"],
+            "concepts": graph["concepts"],
+            "relationships": graph["relationships"],
+            "network_data": graph["network_data"],
+            "is_person": graph.get("is_person", False)
+        }
+    }).encode('utf-8')
+
+@app.route('/graphs/<int:graph_id>.json', methods=['GET'])
+def graph_file(graph_id):
+    """
+    图谱只读接口：图谱保存后不再变化，响应可被浏览器、CDN或反向代理长期缓存
+    """
+    try:
+        # 按客户端支持的压缩方式选择响应版本，br 优先
+        encoding = 'identity'
+        for candidate in ('br', 'gzip'):
+            if request.accept_encodings[candidate]:
+                encoding = candidate
+                break
+        tag = f"graph-{graph_id}-v{GRAPH_FILE_VERSION}.{NETWORK_DATA_VERSION}"
+        headers = {
+            'Cache-Control': 'public, max-age=31536000, immutable',
+            'Vary': 'Accept-Encoding'
+        }
+
+        # 不同压缩版本使用不同的强ETag；客户端已有任一版本时返回304。
+        # ETag只由ID和版本号决定，返回304前仍需确认图谱存在：已在编码缓存中时无需查询数据库，否则只查询主键
+        for variant in ('br', 'gzip', 'identity'):
+            variant_tag = tag if variant == 'identity' else f"{tag}-{variant}"
+            if request.if_none_match.contains(variant_tag):
+                if graph_id not in graph_files and not DatabaseManager.graph_exists(graph_id):
+                    return jsonify({"error": f"图谱ID {graph_id} 不存在"}), 404
+                response = Response(status=304, headers=headers)
+                response.set_etag(variant_tag)
+                return response
+
+        variants = graph_files.get(graph_id, lambda: encode_graph_file(graph_id))
+        if variants is None:
+            return jsonify({"error": f"图谱ID {graph_id} 不存在"}), 404
+        if encoding not in variants:
+            encoding = 'gzip' if request.accept_encodings['gzip'] else 'identity'
+
+        response = Response(variants[encoding], mimetype='application/json', headers=headers)
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+            response.set_etag(f"{tag}-{encoding}")
+        else:
+            response.set_etag(tag)
+        return response
+    except Exception as e:
+        logging.error(f"获取图谱文件时出错: {str(e)}", exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/stats', methods=['GET'])
+def stats():
+    # 各类缓存的命中统计及模型健康状态
+    return jsonify({
+        'person_verdicts': person_cache.stats(),
+        'model_router': model_router.stats(),
+        'provider_limits': provider_limits.stats(),
+        'generation_flights': generation_flights.stats(),
+        'hot_graphs': hot_graphs.stats(),
+        'topic_index': topic_index.stats(),
+        'db_writer': DatabaseManager.writer_stats()
+    })
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=False)
\ No newline at end of file
@@ -0,0 +1,377 @@
+"""
+ASGI 服务入口：/generate_stream 与 /add_concept 由 async_engine 原生异步处理，
+其余路由转交给 Flask 应用（在线程池中运行）。
+启动：python asgi.py 或 uvicorn asgi:app
+"""
+import asyncio
+import io
+import json
+import logging
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator
+from app import app as flask_app, load_cached_graph_event
+from async_engine import pre_judge_person, generate_concepts, generate_relationships, generate_new_concept_detail
+from database import DatabaseManager
+from graph_cache import hot_graphs
+from models import Session, KnowledgeGraph, LOAD_CONCEPTS
+from single_flight import AsyncSingleFlight
+from stream_parser import ConceptStreamParser
+from topic_cache import normalize_topic
+from utils import create_network_data, parse_json_response
+
+# 运行 Flask 路由的线程池，与 asyncio 默认线程池（用于数据库操作）分开，避免长时间的SSE响应占满默认线程池
+_wsgi_executor = ThreadPoolExecutor(max_workers=64, thread_name_prefix="wsgi")
+
+# 相同 (规范化主题, 概念数量) 的新图谱生成共享一次LLM流水线
+generation_flights = AsyncSingleFlight()
+
+def sse(payload: dict) -> bytes:
+    return ("data: " + json.dumps(payload) + "\n\n").encode('utf-8')
+
+async def stream_concepts(topic: str, count: int, is_person: bool, result: dict) -> AsyncIterator[bytes]:
+    """
+    流式生成概念并产出SSE进度事件（同 app.stream_concepts），最终概念字典写入 result['concepts']
+    """
+    parser = ConceptStreamParser()
+    generated_concepts = []
+    new_concepts = {}
+    last_update_time = 0
+    dot_phase = 0
+
+    async for chunk in generate_concepts(topic, count, is_person):
+        for concept, description in parser.feed(chunk):
+            generated_concepts.append("✅" + concept)
+            new_concepts[concept] = description
+        current_time = time.time()
+        if new_concepts or current_time - last_update_time >= 0.3:
+            progress_value = min(30 + (len(generated_concepts) / count) * 40, 70)
+            dots = '.' * ((dot_phase % 3) + 1)
+            dot_phase += 1
+            yield sse({
+                'status': 'generating_concepts_partial',
+                'progress': progress_value,
+                'message': "正在生成节点:\n" + "\n".join(generated_concepts) + dots,
+                'new_concepts': new_concepts
+            })
+            new_concepts = {}
+            last_update_time = current_time
+
+    concepts = parser.result()
+    if concepts is None:
+        concepts = parse_json_response(parser.text, error_context=f"处理主体 '{topic}' 的节点生成结果时")
+    result['concepts'] = concepts
+
+async def generate_stream_events(topic: str, count: int) -> AsyncIterator[bytes]:
+    """
+    与 Flask 的 /generate_stream 产出相同的SSE事件
+    """
+    # 未启用后台写入时会直接写数据库，放到线程中执行，不阻塞事件循环
+    await asyncio.to_thread(DatabaseManager.record_topic_request, normalize_topic(topic), count)
+    try:
+        cached_event = hot_graphs.get(topic, count)
+        if cached_event is None:
+            cached_event = await asyncio.to_thread(hot_graphs.load, topic, count, lambda: load_cached_graph_event(topic, count))
+        if cached_event:
+            yield cached_event
+            return
+    except Exception as e:
+        logging.error(f"生成流程出错: {str(e)}", exc_info=True)
+        yield sse({
+            'status': 'error',
+            'message': str(e)
+        })
+        return
+
+    # 没有缓存时，相同主题和数量的并发请求共享同一次生成
+    async for event in generation_flights.join((normalize_topic(topic), count), lambda: generate_graph_events(topic, count)):
+        yield event
+
+async def generate_graph_events(topic: str, count: int) -> AsyncIterator[bytes]:
+    """
+    生成新图谱并产出SSE事件，由 generation_flights 中的 leader 运行
+    """
+    try:
+        is_person = await pre_judge_person(topic)
+        logging.info(f"主题 '{topic}' 是否为人物: {is_person}")
+
+        yield sse({
+            'status': 'generating_concepts',
+            'progress': 20,
+            'message': '正在初始化...\n接下来可能需要几分钟'
+        })
+
+        result = {}
+        async for event in stream_concepts(topic, count, is_person, result):
+            yield event
+        concepts = result['concepts']
+
+        yield sse({
+            'status': 'generating_relationships',
+            'progress': 70,
+            'message': '正在分析节点关系...\n节点太多的话可能需时几分钟'
+        })
+
+        relationships = await generate_relationships(concepts, is_person)
+        network_data = create_network_data(concepts, relationships)
+        graph_id = await asyncio.to_thread(
+            DatabaseManager.save_knowledge_graph,
+            topic=topic,
+            concept_count=count,
+            concepts=concepts,
+            relationships=relationships,
+            is_person=is_person,
+            network_data=network_data
+        )
+
+        yield sse({
+            'status': 'complete',
+            'progress': 100,
+            'message': '生成完成！',
+            'data': {
+                'graph_id': graph_id,
+                'concepts': concepts,
+                'relationships': relationships,
+                'network_data': network_data,
+                'is_person': is_person
+            }
+        })
+
+    except Exception as e:
+        logging.error(f"生成流程出错: {str(e)}", exc_info=True)
+        yield sse({
+            'status': 'error',
+            'message': str(e)
+        })
+
+def _load_graph(graph_id: int):
+    with Session() as session:
+        graph = session.query(KnowledgeGraph).options(LOAD_CONCEPTS).get(graph_id)
+        if not graph:
+            return None
+        return graph.topic, graph.concepts, graph.is_person
+
+async def add_concept_events(graph_id: int, new_concept_input: str) -> AsyncIterator[bytes]:
+    """
+    与 Flask 的 /add_concept 产出相同的SSE事件
+    """
+    try:
+        graph = await asyncio.to_thread(_load_graph, graph_id)
+        if not graph:
+            yield sse({
+                'status': 'error',
+                'message': f'图谱ID {graph_id} 不存在'
+            })
+            return
+        topic, existing_concepts, is_person = graph
+        if is_person is None:
+            is_person = await pre_judge_person(topic)
+            logging.info(f"预判主题 '{topic}' 是否为人物: {is_person}")
+
+        yield sse({
+            'status': 'initializing',
+            'progress': 10,
+            'message': '正在初始化...\n接下来可能需要几分钟'
+        })
+        yield sse({
+            'status': 'generating_new_concept',
+            'progress': 30,
+            'message': '正在生成新节点详细描述'
+        })
+        new_concept_detail = await generate_new_concept_detail(new_concept_input, is_person)
+
+        updated_concepts = existing_concepts.copy()
+        updated_concepts.update(new_concept_detail)
+        yield sse({
+            'status': 'merging_concepts',
+            'progress': 50,
+            'message': '正在合并节点'
+        })
+
+        yield sse({
+            'status': 'generating_relationships',
+            'progress': 70,
+            'message': '正在分析节点关系...\n节点太多的话可能需时几分钟'
+        })
+        updated_relationships = await generate_relationships(updated_concepts, is_person)
+
+        network_data = create_network_data(updated_concepts, updated_relationships)
+        yield sse({
+            'status': 'finalizing',
+            'progress': 90,
+            'message': '正在生成网络数据'
+        })
+
+        new_graph_id = await asyncio.to_thread(
+            DatabaseManager.save_knowledge_graph,
+            topic=topic,
+            concept_count=len(updated_concepts),
+            concepts=updated_concepts,
+            relationships=updated_relationships,
+            is_person=is_person,
+            network_data=network_data
+        )
+
+        yield sse({
+            'status': 'complete',
+            'progress': 100,
+            'message': '新增节点成功，图谱已更新',
+            'data': {
+                'graph_id': new_graph_id,
+                'concepts': updated_concepts,
+                'relationships': updated_relationships,
+                'network_data': network_data,
+                'is_person': is_person
+            }
+        })
+
+    except Exception as e:
+        logging.error(f"添加概念时出错: {str(e)}", exc_info=True)
+        yield sse({
+            'status': 'error',
+            'message': str(e)
+        })
+
+async def read_body(receive) -> bytes:
+    body = b''
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get('body', b'')
+        more_body = message.get('more_body', False)
+    return body
+
+async def send_json(send, status: int, payload: dict) -> None:
+    body = json.dumps(payload).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+async def send_event_stream(send, events: AsyncIterator[bytes]) -> None:
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [(b'content-type', b'text/event-stream; charset=utf-8'), (b'cache-control', b'no-cache')]
+    })
+    try:
+        async for event in events:
+            await send({'type': 'http.response.body', 'body': event, 'more_body': True})
+    finally:
+        # 客户端断开时关闭生成器，连带取消进行中的LLM流
+        await events.aclose()
+    await send({'type': 'http.response.body', 'body': b''})
+
+async def handle_generate_stream(scope, receive, send) -> None:
+    data = json.loads(await read_body(receive) or b'{}')
+    topic = data.get('topic')
+    count = data.get('count', 10)
+    if not topic:
+        return await send_json(send, 400, {'error': '请输入主体'})
+    if not 5 <= count <= 20:
+        return await send_json(send, 400, {'error': '节点数量必须在5到20之间'})
+    await send_event_stream(send, generate_stream_events(topic, count))
+
+async def handle_add_concept(scope, receive, send) -> None:
+    data = json.loads(await read_body(receive) or b'{}')
+    graph_id = data.get('graph_id')
+    new_concept_input = data.get('new_concept')
+    if not graph_id or not new_concept_input:
+        return await send_json(send, 400, {'error': '缺少必要参数'})
+    await send_event_stream(send, add_concept_events(graph_id, new_concept_input))
+
+async def wsgi_bridge(scope, receive, send) -> None:
+    """
+    在线程池中运行 Flask 应用处理其余路由，响应体逐块转发（SSE 路由同样适用）
+    """
+    body = await read_body(receive)
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+        'CONTENT_LENGTH': str(len(body))
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif name != 'CONTENT_LENGTH':
+            key = 'HTTP_' + name
+            environ[key] = environ[key] + ',' + value if key in environ else value
+
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+
+    def start_response(status, headers, exc_info=None):
+        loop.call_soon_threadsafe(queue.put_nowait, {
+            'type': 'http.response.start',
+            'status': int(status.split(' ', 1)[0]),
+            'headers': [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]
+        })
+        return lambda data: None
+
+    def run():
+        # 整个响应在同一个线程里迭代，保证 stream_with_context 的请求上下文有效
+        try:
+            result = flask_app(environ, start_response)
+            try:
+                for chunk in result:
+                    if chunk:
+                        loop.call_soon_threadsafe(queue.put_nowait, {'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            finally:
+                close = getattr(result, 'close', None)
+                if close:
+                    close()
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, None)
+
+    loop.run_in_executor(_wsgi_executor, run)
+    while True:
+        message = await queue.get()
+        if message is None:
+            break
+        await send(message)
+    await send({'type': 'http.response.body', 'body': b''})
+
+ROUTES = {
+    ('POST', '/generate_stream'): handle_generate_stream,
+    ('POST', '/add_concept'): handle_add_concept
+}
+
+async def app(scope, receive, send) -> None:
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+    if scope['type'] != 'http':
+        return
+    handler = ROUTES.get((scope['method'], scope['path']), wsgi_bridge)
+    await handler(scope, receive, send)
+
+if __name__ == '__main__':
+    try:
+        import uvicorn
+    except ImportError:
+        sys.exit("ASGI 模式需要安装 uvicorn：pip install uvicorn")
+    uvicorn.run(app, host='0.0.0.0', port=5000)
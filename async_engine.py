@@ -0,0 +1,175 @@
+"""
+基于 asyncio 的生成流程，与 utils 中的同步版本一一对应。
+等待LLM网络I/O时不占用线程，一个进程可以同时承载大量进行中的生成。
+"""
+import asyncio
+import time
+from functools import wraps
+from typing import Any, AsyncIterator, Callable
+from configs import async_client
+from content_filter import content_filter
+from model_router import model_router
+from rate_limit import provider_limits, estimate_tokens, RateLimitExceeded
+from topic_cache import person_cache
+from utils import parse_json_response, extract_relations, chat_request, prejudge_messages, parse_person_verdict, \
+    concept_messages, relationship_messages, new_concept_messages, settle_stream
+
+def async_retry_on_error(max_retries: int = 3, initial_delay: float = 1, max_delay: float = 8) -> Callable:
+    """
+    异步重试装饰器，处理API调用错误
+    :param max_retries: 最大重试次数
+    :param initial_delay: 初始延迟时间（秒）
+    :param max_delay: 最大延迟时间（秒）
+    """
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        async def wrapper(*args, **kwargs) -> Any:
+            delay = initial_delay
+            last_exception = None
+
+            for attempt in range(max_retries):
+                try:
+                    return await func(*args, **kwargs)
+                except Exception as e:
+                    last_exception = e
+                    if attempt < max_retries - 1:
+                        print(f"调用失败 (尝试 {attempt + 1}/{max_retries}): {str(e)}")
+                        print(f"等待 {delay} 秒后重试...")
+                        await asyncio.sleep(delay)
+                        delay = min(delay * 2, max_delay)  # 指数退避
+
+            print(f"达到最大重试次数 ({max_retries})，操作失败")
+            raise last_exception
+
+        return wrapper
+    return decorator
+
+@async_retry_on_error(max_retries=3)
+async def call_llm_api(messages: list, context: str, stream: bool = False):
+    """
+    异步调用LLM API，模型选择与限流切换逻辑同 utils.call_llm_api
+    :return: 若 stream 为 False，则返回完整响应文本；若为 True，则返回异步生成器逐块yield内容
+    """
+    tried = []
+    last_error = "没有可用的模型"
+    while True:
+        current_model = model_router.choose(exclude=tried)
+        if current_model is None:
+            raise Exception(f"{context}失败: {last_error}")
+        tried.append(current_model)
+        try:
+            permit = await provider_limits.acquire_async(current_model, messages)
+        except RateLimitExceeded as e:
+            model_router.release_probe(current_model)
+            print(f"模型 {current_model} 排队过久，尝试其他可用模型")
+            last_error = str(e)
+            continue
+        except BaseException:
+            model_router.release_probe(current_model)
+            raise
+        start = time.time()
+        try:
+            ai_client = async_client(current_model)
+            response = await ai_client.chat.completions.create(**chat_request(current_model, messages, stream))
+        except Exception as e:
+            permit.release()
+            rate_limited = "429" in str(e)
+            model_router.record_failure(current_model, rate_limited)
+            if rate_limited:
+                print(f"模型 {current_model} 遇到限流，尝试其他可用模型")
+                last_error = str(e)
+                continue
+            raise Exception(f"{context}失败: {str(e)}")
+        except BaseException:
+            # 客户端断开时任务被取消（asyncio.CancelledError 不属于 Exception）：归还服务商名额和探测机会
+            permit.release()
+            model_router.release_probe(current_model)
+            raise
+
+        if stream:
+            async def stream_generator():
+                received = []
+                completed, error = False, None
+                try:
+                    async for chunk in response:
+                        delta = chunk.choices[0].delta
+                        content = getattr(delta, "content", "")
+                        received.append(content or "")
+                        yield content
+                    completed = True
+                except Exception as e:
+                    error = e
+                    raise
+                finally:
+                    await response.close()
+                    permit.release(permit.prompt_tokens + estimate_tokens("".join(received)))
+                    settle_stream(current_model, start, completed, error)
+            return stream_generator()
+        else:
+            model_router.record_success(current_model, time.time() - start)
+            usage = getattr(response, "usage", None)
+            permit.release(usage.total_tokens if usage else None)
+            print(f"LLM回复: {response.choices[0].message.content}")
+            return response.choices[0].message.content
+
+async def pre_judge_person(topic: str) -> bool:
+    """
+    预判主题是否为人物，先查询主题预判缓存，未命中时才调用LLM
+    """
+    cached = await asyncio.to_thread(person_cache.get, topic)
+    if cached is not None:
+        return cached
+    response_text = await call_llm_api(
+        prejudge_messages(topic),
+        context="预判主题是否为人物"
+    )
+    is_person = parse_person_verdict(response_text)
+    await asyncio.to_thread(person_cache.set, topic, is_person)
+    return is_person
+
+async def generate_concepts(topic: str, count: int = 10, is_person: bool = False) -> AsyncIterator[str]:
+    """
+    流式生成概念，逐块yield生成的文本；命中过滤词时yield "[[CONTENT_FILTERED]]" 并结束
+    """
+    scanner = content_filter.scanner()
+    stream_gen = await call_llm_api(concept_messages(topic, count, is_person), f"生成主体 '{topic}' 相关的节点", stream=True)
+    try:
+        async for chunk in stream_gen:
+            if scanner.feed(chunk):
+                yield "[[CONTENT_FILTERED]]"
+                return
+            yield chunk
+    finally:
+        await stream_gen.aclose()
+
+async def generate_relationships(concepts: dict, is_person: bool = False) -> list:
+    """
+    生成关系
+    """
+    try:
+        response_text = await call_llm_api(
+            messages=relationship_messages(concepts, is_person),
+            context="生成概念关系"
+        )
+        print(f"关系生成原始响应: {response_text}")
+        return extract_relations(response_text, error_context="处理概念关系生成结果时")
+    except Exception as e:
+        raise ValueError(f"生成关系时出错: {str(e)}")
+
+@async_retry_on_error(max_retries=3)
+async def generate_new_concept_detail(new_concept_input: str, is_person: bool = False) -> dict:
+    """
+    根据用户输入的新概念生成详细描述
+    """
+    try:
+        response_text = await call_llm_api(
+            new_concept_messages(new_concept_input, is_person),
+            context=f"生成新概念 '{new_concept_input}' 的描述",
+            stream=False
+        )
+        return parse_json_response(
+            response_text,
+            error_context=f"处理新增概念 '{new_concept_input}' 的生成结果时"
+        )
+    except Exception as e:
+        raise Exception(f"新增概念 '{new_concept_input}' 生成失败: {str(e)}")
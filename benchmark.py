@@ -0,0 +1,1274 @@
+"""
+性能基准测试脚本
+用法：python benchmark.py <子命令> [参数]
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import re
+import string
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+def _random_words(n: int, rng: random.Random) -> list:
+    return [''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 10))) for _ in range(n)]
+
+def bench_filter(args) -> None:
+    """
+    过滤词引擎：比较旧的逐chunk读文件+全文扫描与增量自动机扫描的每token耗时
+    """
+    from content_filter import ContentFilter
+
+    rng = random.Random(42)
+    chunk = "深度学习是机器学习的一个分支，" * 2
+
+    def legacy_check(path, text):
+        with open(path, 'r', encoding='utf-8') as f:
+            filter_words = [line.strip().lower() for line in f if line.strip()]
+        text_lower = text.lower()
+        return any(word in text_lower for word in filter_words)
+
+    print(f"{'词表大小':>8} {'token数':>8} {'旧实现 us/token':>16} {'新实现 us/token':>16}")
+    for word_count in args.words:
+        with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False, encoding='utf-8') as f:
+            f.write('\n'.join(_random_words(word_count, rng)))
+            path = f.name
+        try:
+            engine = ContentFilter(path)
+            for tokens in args.tokens:
+                legacy_tokens = min(tokens, args.legacy_limit)
+                accumulated = ""
+                start = time.perf_counter()
+                for _ in range(legacy_tokens):
+                    accumulated += chunk
+                    legacy_check(path, chunk) or legacy_check(path, accumulated)
+                legacy_us = (time.perf_counter() - start) / legacy_tokens * 1e6
+
+                scanner = engine.scanner()
+                start = time.perf_counter()
+                for _ in range(tokens):
+                    scanner.feed(chunk)
+                engine_us = (time.perf_counter() - start) / tokens * 1e6
+                print(f"{word_count:>8} {tokens:>8} {legacy_us:>16.1f} {engine_us:>16.1f}")
+        finally:
+            os.unlink(path)
+
+def bench_stream_parse(args) -> None:
+    """
+    概念流解析：比较每次全文正则重扫与增量解析器处理全部chunk的总耗时
+    """
+    from stream_parser import ConceptStreamParser
+
+    key_pattern = re.compile(r'"([^"]+)"\s*:')
+    print(f"{'概念数':>8} {'chunk数':>8} {'正则重扫 ms':>12} {'增量解析 ms':>12}")
+    for count in args.concepts:
+        concepts = {f"概念{i} (Concept {i})": "这是一段大约一百二十字的介绍，" * 8 for i in range(count)}
+        text = json.dumps(concepts, ensure_ascii=False, indent=4)
+        chunks = [text[i:i + args.chunk_size] for i in range(0, len(text), args.chunk_size)]
+
+        start = time.perf_counter()
+        accumulated_text = ""
+        generated_concepts = []
+        for chunk in chunks:
+            accumulated_text += chunk
+            for key in key_pattern.findall(accumulated_text):
+                if "✅" + key not in generated_concepts:
+                    generated_concepts.append("✅" + key)
+        legacy_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        parser = ConceptStreamParser()
+        for chunk in chunks:
+            parser.feed(chunk)
+        assert parser.result() == concepts
+        parser_ms = (time.perf_counter() - start) * 1000
+        print(f"{count:>8} {len(chunks):>8} {legacy_ms:>12.1f} {parser_ms:>12.1f}")
+
+def _install_fake_llm(concept_count: int, token_delay: float, relation_base: float, relation_per_edge: float) -> None:
+    """
+    用按脚本延迟返回的假LLM替换 utils.call_llm_api
+    """
+    import utils
+
+    def fake_call_llm_api(messages, context, stream=False):
+        content = messages[0]["content"]
+        if stream:
+            concepts = {f"概念{i} (Concept {i})": f"介绍{i}：" + "这是一段大约一百二十字的介绍，" * 8 for i in range(concept_count)}
+            text = json.dumps(concepts, ensure_ascii=False)
+
+            def stream_generator():
+                for i in range(0, len(text), 8):
+                    time.sleep(token_delay)
+                    yield text[i:i + 8]
+            return stream_generator()
+        if "不同分组" in content:
+            # 跨分组合并调用：只输出相邻分组之间的关系
+            groups = json.loads(content.split("概念分组为：")[1].split("已有的关联关系为：")[0])
+            relations = [[groups[i][-1], groups[i + 1][0], "相关"] for i in range(len(groups) - 1)]
+        else:
+            names = list(dict.fromkeys(re.findall(r'"(概念\d+ \(Concept \d+\))"', content)))
+            relations = [[names[i], names[i + 1], "相关"] for i in range(len(names) - 1)]
+        # 延迟主要由输出长度决定
+        time.sleep(relation_base + relation_per_edge * len(relations))
+        return json.dumps({"relations": relations}, ensure_ascii=False)
+
+    utils.call_llm_api = fake_call_llm_api
+
+def bench_pipeline(args) -> None:
+    """
+    关系生成策略：用假LLM比较顺序生成与流水线生成的端到端耗时
+    """
+    from stream_parser import ConceptStreamParser
+    from utils import generate_concepts
+    from pipeline import relationship_builder
+
+    _install_fake_llm(args.concepts, args.token_delay, args.relation_base, args.relation_per_edge)
+    print(f"{'策略':>12} {'概念数':>8} {'总耗时 s':>10} {'关系数':>8}")
+    for strategy in ("sequential", "pipelined"):
+        start = time.perf_counter()
+        builder = relationship_builder(strategy=strategy)
+        parser = ConceptStreamParser()
+        for chunk in generate_concepts("benchmark", args.concepts, False, True):
+            for concept, description in parser.feed(chunk):
+                builder.add(concept, description)
+        relationships = builder.finish(parser.result())
+        elapsed = time.perf_counter() - start
+        print(f"{strategy:>12} {args.concepts:>8} {elapsed:>10.2f} {len(relationships):>8}")
+
+def bench_prejudge(args) -> None:
+    """
+    人物预判：用假LLM比较阻塞预判、投机执行与缓存命中时的首个节点耗时
+    """
+    import utils
+    from stream_parser import ConceptStreamParser
+
+    def fake_call_llm_api(messages, context, stream=False):
+        content = messages[0]["content"]
+        if not stream:
+            time.sleep(args.prejudge_delay)
+            return json.dumps({"result": "1" if "person" in content else "0"})
+
+        def stream_generator():
+            time.sleep(args.first_token_delay)
+            text = json.dumps({f"概念{i} (Concept {i})": "这是一段介绍，" * 20 for i in range(5)}, ensure_ascii=False)
+            for i in range(0, len(text), 8):
+                time.sleep(args.token_delay)
+                yield text[i:i + 8]
+        return stream_generator()
+
+    utils.call_llm_api = fake_call_llm_api
+
+    def time_to_first_concept(topic, speculative):
+        start = time.perf_counter()
+        is_person, chunks = utils.judge_and_generate_concepts(topic, 5, speculative=speculative)
+        parser = ConceptStreamParser()
+        for chunk in chunks:
+            if parser.feed(chunk):
+                return time.perf_counter() - start
+        return float("nan")
+
+    print(f"{'场景':>24} {'首个节点耗时 s':>14}")
+    for label, topic, speculative in (
+        ("阻塞预判", "topic-a", False),
+        ("投机执行（命中）", "topic-b", True),
+        ("投机执行（人物，未命中）", "person-c", True),
+        ("缓存命中", "topic-a", True),
+    ):
+        print(f"{label:>24} {time_to_first_concept(topic, speculative):>14.2f}")
+
+    # 同时开始多个新主题的生成（超过旧的预判线程池大小 8）：投机执行不应比阻塞预判更慢
+    run_id = random.randrange(1 << 30)
+    for label, speculative in (("阻塞预判", False), ("投机执行", True)):
+        timings = []
+        threads = [threading.Thread(target=lambda i=i: timings.append(time_to_first_concept(f"{label}-{run_id}-{i}", speculative)))
+                   for i in range(args.concurrent)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        print(f"{label + f'（{args.concurrent} 个同时）':>24} {sum(timings) / len(timings):>14.2f}（平均），最慢 {max(timings):.2f}")
+
+def _start_stub_llm_server(latency: float = 0.0, stream_chunks: int = 20, status_for=None, chunk_delay: float = 0.0, on_done=None) -> str:
+    """
+    在本地启动一个兼容 OpenAI chat-completions 协议的假服务，返回其 base_url
+    :param latency: 每个请求返回前的延迟（秒）
+    :param stream_chunks: 流式请求返回的chunk数
+    :param status_for: 可选函数 model -> HTTP状态码，用于模拟限流等错误
+    :param chunk_delay: 流式请求每个chunk之间的延迟（秒）
+    :param on_done: 可选函数 HTTP状态码 -> None，每个请求处理完、开始返回响应时调用，用于统计服务端并发
+    """
+    import socket
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            super().setup()
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            model = body.get("model", "stub")
+            status = status_for(model) if status_for else 200
+            time.sleep(latency)
+            if on_done:
+                on_done(status)
+            self.respond(body, model, status)
+
+        def respond(self, body, model, status):
+            if status != 200:
+                payload = json.dumps({"error": {"message": "stub error", "type": "rate_limit", "code": status}}).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+                return
+            base = {"id": "stub", "created": int(time.time()), "model": model}
+            if body.get("stream"):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                pieces = ['{"概念 (Concept)": "'] + ["介绍"] * stream_chunks + ['"}']
+                for piece in pieces:
+                    time.sleep(chunk_delay)
+                    event = dict(base, object="chat.completion.chunk", choices=[{"index": 0, "delta": {"content": piece}, "finish_reason": None}])
+                    data = f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode()
+                    self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                done = b"data: [DONE]\n\n"
+                self.wfile.write(f"{len(done):x}\r\n".encode() + done + b"\r\n0\r\n\r\n")
+                return
+            prompt = body.get("messages", [{}])[0].get("content", "")
+            if '"relations"' in prompt:
+                content = json.dumps({"relations": [["概念 (Concept)", "概念 (Concept)", "相关"]]}, ensure_ascii=False)
+            else:
+                content = '{"result": "0"}'
+            payload = json.dumps(dict(
+                base,
+                object="chat.completion",
+                choices=[{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                usage={"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15}
+            )).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    ThreadingHTTPServer.request_queue_size = 1024
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+def bench_client(args) -> None:
+    """
+    LLM客户端：比较每次调用新建 OpenAI 客户端与复用连接池客户端的单次调用耗时
+    """
+    from openai import OpenAI
+    from configs.client import get_client
+
+    base_url = _start_stub_llm_server()
+    messages = [{"role": "user", "content": "ping"}]
+
+    def run(make_client):
+        start = time.perf_counter()
+        for _ in range(args.calls):
+            make_client().chat.completions.create(model="stub", messages=messages)
+        return (time.perf_counter() - start) / args.calls * 1000
+
+    fresh_ms = run(lambda: OpenAI(api_key="stub", base_url=base_url))
+    pooled_ms = run(lambda: get_client("stub", base_url, "stub"))
+    print(f"{'客户端':>10} {'ms/调用':>10}")
+    print(f"{'每次新建':>10} {fresh_ms:>10.2f}")
+    print(f"{'连接池复用':>10} {pooled_ms:>10.2f}")
+
+def bench_router(args) -> None:
+    """
+    模型路由：首选模型在一段时间内持续限流，多线程并发调用，统计成功数以及恢复后是否切回首选模型
+    """
+    import utils
+    import model_router
+    from configs.client import PROVIDERS
+
+    start = time.time()
+    outage_end = start + args.outage
+
+    def status_for(model):
+        return 429 if model == "stub-a" and time.time() < outage_end else 200
+
+    base_url = _start_stub_llm_server(latency=args.latency, status_for=status_for)
+    PROVIDERS["stub"] = {"models": ["stub-a", "stub-b"], "api_key_env": "STUB_API_KEY", "base_url": base_url}
+    os.environ["STUB_API_KEY"] = "stub"
+    model_router.breaker_rate_limit_cooldown = args.cooldown
+    utils.model_router = model_router.ModelRouter("stub-a", ["stub-b"])
+
+    counts = {"ok": 0, "failed": 0}
+    lock = threading.Lock()
+    messages = [{"role": "user", "content": "ping"}]
+
+    def worker():
+        while time.time() - start < args.duration:
+            try:
+                utils.call_llm_api(messages, "基准测试")
+                with lock:
+                    counts["ok"] += 1
+            except Exception:
+                with lock:
+                    counts["failed"] += 1
+
+    threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    elapsed = time.time() - start
+    print(f"成功 {counts['ok']} 次，失败 {counts['failed']} 次，吞吐 {counts['ok'] / elapsed:.1f} 次/秒")
+    for name, stat in utils.model_router.stats().items():
+        print(f"{name}: 状态 {stat['state']}，总请求 {stat['total_requests']}，失败 {stat['total_errors']}，"
+              f"最近窗口平均延迟 {stat['avg_latency'] or 0:.3f}s")
+
+def bench_async_load(args) -> None:
+    """
+    异步生成引擎：在一个进程内并发发起大量 /generate_stream 请求（直接调用ASGI应用），
+    统计同时进行中的流数量、总耗时与使用的线程数
+    """
+    import asyncio
+    import model_router
+    import configs.client
+    from configs.client import PROVIDERS
+
+    base_url = _start_stub_llm_server(latency=args.latency, stream_chunks=args.chunks, chunk_delay=args.chunk_delay)
+    PROVIDERS["stub"] = {"models": ["stub"], "api_key_env": "STUB_API_KEY", "base_url": base_url}
+    os.environ["STUB_API_KEY"] = "stub"
+    configs.client.max_connections = args.streams
+    configs.client.max_keepalive_connections = args.streams
+
+    import asgi
+    import async_engine
+    async_engine.model_router = model_router.ModelRouter("stub", [])
+
+    in_flight = 0
+    peak = 0
+    completed = 0
+
+    async def one_request(i):
+        nonlocal in_flight, peak, completed
+        body = json.dumps({"topic": f"load-{time.time()}-{i}", "count": 5}).encode()
+        sent = False
+
+        async def receive():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            await asyncio.sleep(3600)
+
+        chunks = []
+
+        async def send(message):
+            if message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        in_flight += 1
+        peak = max(peak, in_flight)
+        scope = {"type": "http", "method": "POST", "path": "/generate_stream", "headers": [], "query_string": b""}
+        await asgi.app(scope, receive, send)
+        in_flight -= 1
+        if b'"complete"' in b"".join(chunks):
+            completed += 1
+
+    async def main():
+        await asyncio.gather(*(one_request(i) for i in range(args.streams)))
+
+    start = time.perf_counter()
+    asyncio.run(main())
+    elapsed = time.perf_counter() - start
+    single = args.latency * 3 + args.chunk_delay * (args.chunks + 2)
+    print(f"并发流 {args.streams}，完成 {completed}，峰值同时进行 {peak}，总耗时 {elapsed:.2f}s"
+          f"（单个请求理论耗时约 {single:.2f}s），进程线程数 {threading.active_count()}")
+
+def bench_hot_graph(args) -> None:
+    """
+    热门图谱缓存：比较缓存图谱请求每次查询数据库并编码与命中进程内缓存的耗时
+    """
+    os.chdir(tempfile.mkdtemp())
+    from app import app
+    from database import DatabaseManager
+    from graph_cache import hot_graphs
+
+    concepts = {f"概念{i} (Concept {i})": "这是一段介绍，" * 20 for i in range(args.concepts)}
+    relationships = [[f"概念{i} (Concept {i})", f"概念{(i * 7 + 1) % args.concepts} (Concept {(i * 7 + 1) % args.concepts})", "关联"]
+                     for i in range(args.concepts)]
+    for _ in range(args.rows):
+        DatabaseManager.save_knowledge_graph("hot-topic", args.concepts, concepts, relationships)
+    client = app.test_client()
+
+    def run(clear):
+        start = time.perf_counter()
+        for _ in range(args.requests):
+            if clear:
+                hot_graphs.clear()
+            client.post('/generate_stream', json={"topic": "hot-topic", "count": args.concepts}).get_data()
+        return (time.perf_counter() - start) / args.requests * 1000
+
+    uncached_ms = run(True)
+    cached_ms = run(False)
+    print(f"{'场景':>10} {'ms/请求':>10}")
+    print(f"{'查询数据库':>10} {uncached_ms:>10.2f}")
+    print(f"{'缓存命中':>10} {cached_ms:>10.2f}")
+    print(hot_graphs.stats())
+
+def bench_network_data(args) -> None:
+    """
+    网络数据：比较旧的逐节点扫描全部关系与一次遍历度数索引的 create_network_data 耗时（合成图，关系数为节点数的 --edge-ratio 倍）
+    """
+    import utils
+
+    def legacy_level(node_id, relationships):
+        targets = set(rel[1] for rel in relationships)
+        sources = set(rel[0] for rel in relationships)
+        if node_id not in targets:
+            return "root"
+        elif node_id not in sources:
+            return "level5"
+        in_degree = sum(1 for rel in relationships if rel[1] == node_id)
+        out_degree = sum(1 for rel in relationships if rel[0] == node_id)
+        if in_degree > out_degree:
+            return "level4"
+        elif in_degree == out_degree:
+            return "level3"
+        return "level2"
+
+    rng = random.Random(42)
+    print(f"{'节点数':>8} {'关系数':>8} {'旧实现 ms':>12} {'度数索引 ms':>12}")
+    for count in args.nodes:
+        concepts = {f"概念{i} (Concept {i})": "介绍" for i in range(count)}
+        names = list(concepts)
+        relationships = [[rng.choice(names), rng.choice(names), "关联"] for _ in range(int(count * args.edge_ratio))]
+
+        legacy_ms = float("nan")
+        if count <= args.legacy_limit:
+            start = time.perf_counter()
+            legacy = [legacy_level(name, relationships) for name in names]
+            utils.create_network_data(concepts, relationships)
+            legacy_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        result = utils.create_network_data(concepts, relationships)
+        index_ms = (time.perf_counter() - start) * 1000
+        if count <= args.legacy_limit:
+            assert [node['color']['background'] for node in result['nodes']] == [result['color_scheme'][level] for level in legacy]
+
+        print(f"{count:>8} {len(relationships):>8} {legacy_ms:>12.1f} {index_ms:>12.1f}")
+
+def bench_db_query(args) -> None:
+    """
+    数据库查询：在预置大量图谱和查看记录的数据库上，比较补建索引前后 get_best_graph、get_top_n_graphs、get_viewed_count 的耗时
+    """
+    os.chdir(tempfile.mkdtemp())
+    from database import DatabaseManager
+    from models import engine, ensure_indexes, KnowledgeGraph, UserView
+
+    new_indexes = [index for table in (KnowledgeGraph.__table__, UserView.__table__) for index in table.indexes
+                   if index.name != 'ix_user_views_user_id' and index.name != 'ix_knowledge_graphs_topic']
+    for index in new_indexes:
+        index.drop(engine)
+
+    rng = random.Random(42)
+    topics = [f"topic-{i}" for i in range(args.topics)]
+    concepts = {"概念 (Concept)": "介绍"}
+    relationships = []
+    start = time.perf_counter()
+    with engine.begin() as connection:
+        for offset in range(0, args.rows, 50000):
+            connection.execute(KnowledgeGraph.__table__.insert(), [{
+                "topic": rng.choice(topics),
+                "concept_count": rng.randint(5, 20),
+                "concepts": concepts,
+                "relationships": relationships,
+                "likes": 0,
+                "dislikes": 0,
+                "score": rng.randint(0, 50),
+                "is_person": 0
+            } for _ in range(min(50000, args.rows - offset))])
+        for offset in range(0, args.views, 50000):
+            connection.execute(UserView.__table__.insert(), [{
+                "user_id": f"user-{rng.randrange(args.users)}",
+                "graph_id": rng.randint(1, args.rows)
+            } for _ in range(min(50000, args.views - offset))])
+    print(f"已预置 {args.rows} 个图谱、{args.views} 条查看记录，耗时 {time.perf_counter() - start:.1f}s")
+
+    lookups = [(rng.choice(topics), rng.randint(5, 20), f"user-{rng.randrange(args.users)}") for _ in range(args.queries)]
+    for topic, count, _ in lookups:
+        DatabaseManager.get_best_graph(topic, count)  # 预先生成网络数据，避免计入查询耗时
+
+    def run():
+        results = {}
+        for name, query in (
+            ("get_best_graph", lambda topic, count, user: DatabaseManager.get_best_graph(topic, count)),
+            ("get_top_n_graphs", lambda topic, count, user: DatabaseManager.get_top_n_graphs(topic, count, user)),
+            ("get_viewed_count", lambda topic, count, user: DatabaseManager.get_viewed_count(topic, count, user)),
+        ):
+            start = time.perf_counter()
+            for topic, count, user in lookups:
+                query(topic, count, user)
+            results[name] = (time.perf_counter() - start) / len(lookups) * 1000
+        return results
+
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        before = run()
+        ensure_indexes()
+        after = run()
+    print(f"{'查询':>18} {'无复合索引 ms':>14} {'复合索引 ms':>12}")
+    for name in before:
+        print(f"{name:>18} {before[name]:>14.2f} {after[name]:>12.2f}")
+
+def bench_db_load(args) -> None:
+    """
+    数据库并发负载：读线程持续查询最佳图谱，写线程持续点赞/记录查看，
+    比较默认SQLite设置（回滚日志、每次请求直接写入）与WAL加后台合并写入时的读写延迟
+    """
+    if args.mode is None:
+        for mode in ('legacy', 'tuned'):
+            subprocess.run([sys.executable, os.path.abspath(__file__), 'db-load', '--mode', mode,
+                            '--readers', str(args.readers), '--writers', str(args.writers),
+                            '--duration', str(args.duration), '--graphs', str(args.graphs)], check=True)
+        return
+
+    os.chdir(tempfile.mkdtemp())
+    import configs
+    if args.mode == 'legacy':
+        configs.sqlite_journal_mode = "DELETE"
+        configs.sqlite_synchronous = "FULL"
+        configs.background_writes = False
+    from database import DatabaseManager
+
+    concepts = {f"概念{i} (Concept {i})": "这是一段介绍，" * 20 for i in range(12)}
+    names = list(concepts)
+    relationships = [[names[i], names[(i + 1) % len(names)], "关联"] for i in range(len(names))]
+    graph_ids = [DatabaseManager.save_knowledge_graph(f"topic-{i % 20}", 12, concepts, relationships) for i in range(args.graphs)]
+
+    stop = time.monotonic() + args.duration
+    read_latencies = []
+    write_latencies = []
+    errors = []
+
+    def reader(i):
+        rng = random.Random(i)
+        while time.monotonic() < stop:
+            start = time.perf_counter()
+            DatabaseManager.get_best_graph(f"topic-{rng.randrange(20)}", 12)
+            read_latencies.append(time.perf_counter() - start)
+
+    def writer(i):
+        rng = random.Random(1000 + i)
+        while time.monotonic() < stop:
+            start = time.perf_counter()
+            try:
+                if rng.random() < 0.5:
+                    DatabaseManager.update_feedback(rng.choice(graph_ids), rng.random() < 0.8)
+                else:
+                    DatabaseManager.record_user_view(f"user-{i}-{rng.randrange(1000)}", rng.choice(graph_ids), wait=True)
+            except Exception as e:
+                errors.append(str(e))
+            write_latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(args.readers)]
+    threads += [threading.Thread(target=writer, args=(i,)) for i in range(args.writers)]
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def percentile(values, p):
+        values = sorted(values)
+        return values[min(int(len(values) * p), len(values) - 1)] * 1000 if values else float("nan")
+
+    print(f"[{args.mode}] 读 {len(read_latencies) / args.duration:.0f}/s p50 {percentile(read_latencies, 0.5):.1f}ms "
+          f"p99 {percentile(read_latencies, 0.99):.1f}ms max {percentile(read_latencies, 1):.1f}ms | "
+          f"写 {len(write_latencies) / args.duration:.0f}/s p50 {percentile(write_latencies, 0.5):.1f}ms "
+          f"p99 {percentile(write_latencies, 0.99):.1f}ms | 错误 {len(errors)}")
+
+def bench_feedback(args) -> None:
+    """
+    点赞并发正确性：多线程同时对同一图谱点赞，检查最终点赞数是否等于点赞次数，
+    比较旧的读-改-写、原子增量直接写入、后台合并写入与内存合并定期写入
+    """
+    os.chdir(tempfile.mkdtemp())
+    from concurrent.futures import ThreadPoolExecutor
+    import database
+    from database import DatabaseManager
+    from models import Session, KnowledgeGraph
+
+    concepts = {f"概念{i} (Concept {i})": "这是一段介绍，" * 200 for i in range(20)}
+    names = list(concepts)
+    relationships = [[names[i], names[(i + 1) % len(names)], "关联"] for i in range(len(names))]
+
+    def read_modify_write(graph_id, is_like):
+        # 旧实现：读出整行（含图谱内容）后在 Python 中加一再写回
+        with Session() as session:
+            graph = session.get(KnowledgeGraph, graph_id)
+            if is_like:
+                graph.likes += 1
+            else:
+                graph.dislikes += 1
+            graph.score = graph.likes
+            session.commit()
+
+    def configure(mode):
+        database.background_writes = mode == 'batched'
+        database.feedback_flush_interval = args.flush_interval if mode == 'aggregated' else 0
+        database._feedback.interval = args.flush_interval
+
+    print(f"{'方式':>18} {'点赞/s':>10} {'p99 ms':>8} {'最终点赞数':>10} {'错误':>6}  结果")
+    for mode in ('read-modify-write', 'direct', 'batched', 'aggregated'):
+        configure(mode)
+        with contextlib.redirect_stdout(open(os.devnull, 'w')):
+            graph_id = DatabaseManager.save_knowledge_graph(f"topic-{mode}", 20, concepts, relationships)
+        like = read_modify_write if mode == 'read-modify-write' else DatabaseManager.update_feedback
+        latencies = []
+        errors = []
+
+        def send(_):
+            start = time.perf_counter()
+            try:
+                like(graph_id, True)
+            except Exception as e:
+                errors.append(str(e))
+            latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(args.threads) as pool:
+            list(pool.map(send, range(args.likes)))
+        elapsed = time.perf_counter() - start
+        database._feedback.flush_now()
+        with Session() as session:
+            likes = session.query(KnowledgeGraph.likes).filter(KnowledgeGraph.id == graph_id).scalar()
+        latencies.sort()
+        p99 = latencies[min(int(len(latencies) * 0.99), len(latencies) - 1)] * 1000
+        result = "OK" if likes == args.likes else f"丢失 {args.likes - likes}"
+        print(f"{mode:>18} {args.likes / elapsed:>10.0f} {p99:>8.1f} {likes:>10} {len(errors):>6}  {result}")
+
+def bench_db_payload(args) -> None:
+    """
+    图谱内容延迟加载：在每个主题有大量大图谱的数据库上，比较查询时总是加载图谱内容（旧方式）
+    与只按ID排序计数、只为返回的图谱加载内容时，每次请求的耗时和内存峰值
+    """
+    os.chdir(tempfile.mkdtemp())
+    import tracemalloc
+    from sqlalchemy import desc, func
+    import database
+    from database import DatabaseManager
+    from models import engine, ReadSession, KnowledgeGraph, LOAD_PAYLOAD
+
+    concepts = {f"概念{i} (Concept {i})": "这是一段介绍，" * (args.payload_kb * 512 // 12 // 7) for i in range(12)}
+    names = list(concepts)
+    relationships = [[names[i], names[(i + 1) % len(names)], "关联"] for i in range(len(names))]
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        graph_id = DatabaseManager.save_knowledge_graph("人工智能", 12, concepts, relationships)
+    with engine.begin() as connection:
+        connection.execute(KnowledgeGraph.__table__.insert(), [{
+            "topic": "人工智能",
+            "concept_count": 12,
+            "concepts": concepts,
+            "relationships": relationships,
+            "likes": 0,
+            "dislikes": 0,
+            "score": i % 50,
+            "is_person": 0
+        } for i in range(args.graphs - 1)])
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        DatabaseManager.backfill_network_data()
+
+    def legacy_best_graph(topic, concept_count):
+        # 旧实现：排序和窗口计数时每一行都带着图谱内容
+        with ReadSession() as session:
+            query = session.query(KnowledgeGraph).options(LOAD_PAYLOAD)\
+                .filter(KnowledgeGraph.topic == topic)\
+                .filter(KnowledgeGraph.concept_count == concept_count)
+            row = database._with_network_data(query.add_columns(func.count().over().label('total_available')))\
+                .order_by(desc(KnowledgeGraph.score))\
+                .first()
+            result = database._graph_dict(session, row[0])
+            result['total_available'] = row[1]
+            return result
+
+    def legacy_default_graph():
+        with ReadSession() as session:
+            graph = session.query(KnowledgeGraph).options(LOAD_PAYLOAD)\
+                .filter(KnowledgeGraph.topic == "人工智能")\
+                .filter(KnowledgeGraph.concept_count == 12)\
+                .order_by(desc(KnowledgeGraph.score))\
+                .first()
+            return database._graph_dict(session, graph)
+
+    def legacy_network_data():
+        with ReadSession() as session:
+            graph = session.get(KnowledgeGraph, graph_id, options=[LOAD_PAYLOAD])
+            return database._network_data(session, graph)
+
+    cases = [
+        ("get_best_graph", lambda: legacy_best_graph("人工智能", 12), lambda: DatabaseManager.get_best_graph("人工智能", 12)),
+        ("get_default_graph", legacy_default_graph, DatabaseManager.get_default_graph),
+        ("get_network_data", legacy_network_data, lambda: DatabaseManager.get_network_data(graph_id)),
+    ]
+
+    def measure(call):
+        start = time.perf_counter()
+        for _ in range(args.requests):
+            call()
+        elapsed = (time.perf_counter() - start) / args.requests * 1000
+        tracemalloc.start()
+        call()
+        peak = tracemalloc.get_traced_memory()[1] / 1024
+        tracemalloc.stop()
+        return elapsed, peak
+
+    print(f"{args.graphs} 个图谱，每个内容约 {args.payload_kb} KB")
+    print(f"{'查询':>18} {'旧 ms':>8} {'旧 KB':>8} {'延迟加载 ms':>12} {'延迟加载 KB':>12}")
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        results = [(name, measure(legacy), measure(deferred)) for name, legacy, deferred in cases]
+    for name, (legacy_ms, legacy_kb), (deferred_ms, deferred_kb) in results:
+        print(f"{name:>18} {legacy_ms:>8.2f} {legacy_kb:>8.0f} {deferred_ms:>12.2f} {deferred_kb:>12.0f}")
+
+def _random_topic(rng: random.Random) -> str:
+    if rng.random() < 0.5:
+        return ''.join(chr(0x4e00 + rng.randrange(3000)) for _ in range(rng.randint(2, 6)))
+    return ' '.join(_random_words(rng.randint(1, 3), rng)).title()
+
+def _topic_variant(topic: str, rng: random.Random) -> str:
+    """
+    模拟用户输入同一主题时的常见差异：原样、大小写、首尾或中间空白、标点、全角、少打一个字母
+    """
+    kind = rng.randrange(6)
+    if kind == 1:
+        return topic.lower() if rng.random() < 0.5 else topic.upper()
+    if kind == 2:
+        return " " + topic + "  "
+    if kind == 3:
+        return topic.replace(" ", "-") + ("?" if rng.random() < 0.5 else "")
+    if kind == 4:
+        return ''.join(chr(ord(ch) + 0xFEE0) if '!' <= ch <= '~' else ch for ch in topic)
+    if kind == 5 and len(topic) > 8 and topic.isascii():
+        i = rng.randrange(1, len(topic) - 1)
+        return topic[:i] + topic[i + 1:]
+    return topic
+
+def bench_topic_index(args) -> None:
+    """
+    相近主题索引：回放主题查询日志比较只按 topic.lower() 精确匹配与加上相近主题匹配的缓存命中率，
+    并测量索引中有大量主题时的查找耗时
+    """
+    os.chdir(tempfile.mkdtemp())
+    import resource
+    from topic_cache import TopicIndex
+
+    rng = random.Random(42)
+    if args.log:
+        # 每行一个主题，可用制表符附带节点数量
+        queries = []
+        with open(args.log, encoding='utf-8') as f:
+            for line in f:
+                topic, _, count = line.rstrip('\n').partition('\t')
+                if topic.strip():
+                    queries.append((topic, int(count) if count else 12))
+    else:
+        popular = [_random_topic(rng) for _ in range(args.distinct)]
+        weights = [1 / (rank + 1) for rank in range(len(popular))]
+        queries = [(_topic_variant(topic, rng), rng.choice([8, 12, 16]))
+                   for topic in rng.choices(popular, weights, k=args.queries)]
+
+    index = TopicIndex(threshold=args.threshold)
+    seen = set()
+    exact_hits = similar_hits = 0
+    for topic, count in queries:
+        if (topic.lower(), count) in seen:
+            exact_hits += 1
+        elif index.match(topic, count) is not None:
+            similar_hits += 1
+        else:
+            # 未命中时生成新图谱
+            seen.add((topic.lower(), count))
+            index.add(topic.lower(), count)
+    print(f"回放 {len(queries)} 条查询{'' if args.log else '（合成日志）'}，相似度阈值 {args.threshold}")
+    print(f"精确匹配命中率 {exact_hits / len(queries):.1%}，加上相近主题匹配 {(exact_hits + similar_hits) / len(queries):.1%}")
+
+    index = TopicIndex(threshold=args.threshold)
+    stored = [_random_topic(rng) for _ in range(args.topics)]
+    start = time.perf_counter()
+    for topic in stored:
+        index.add(topic.lower(), rng.choice([8, 12, 16]))
+    build = time.perf_counter() - start
+    lookups = [_topic_variant(rng.choice(stored), rng) if rng.random() < 0.5 else _random_topic(rng) for _ in range(args.lookups)]
+    latencies = []
+    for topic in lookups:
+        start = time.perf_counter()
+        index.match(topic, 12)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    print(f"{args.topics} 个主题：建索引 {build:.1f}s，进程内存峰值 {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB，"
+          f"查找 平均 {sum(latencies) / len(latencies) * 1000:.3f}ms p99 {latencies[int(len(latencies) * 0.99)] * 1000:.3f}ms")
+
+def bench_derive(args) -> None:
+    """
+    派生较小图谱：每个主题只有一个20个节点的图谱时，请求较少节点数量的首个请求耗时（派生并保存），
+    以及派生图谱是否保留根概念、是否连通、保留了多少关系
+    """
+    os.chdir(tempfile.mkdtemp())
+    from app import app
+    from database import DatabaseManager
+    from network import derive_graph
+
+    rng = random.Random(42)
+    graphs = []
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        for i in range(args.topics):
+            names = [f"主题{i} (Topic {i})"] + [f"概念{i}-{j} (Concept {j})" for j in range(19)]
+            concepts = {name: "这是一段介绍，" * 20 for name in names}
+            # 根概念指向若干一级概念，其余概念挂在已有概念之下，再加一些随机的交叉关系
+            relationships = [[names[0], names[j], "包含"] for j in range(1, 5)]
+            relationships += [[names[rng.randrange(1, j)], names[j], "包含"] for j in range(5, 20)]
+            relationships += [[rng.choice(names[1:]), rng.choice(names[1:]), "相关"] for _ in range(10)]
+            DatabaseManager.save_knowledge_graph(f"topic {i}", 20, concepts, relationships)
+            graphs.append((f"topic {i}", concepts, relationships))
+    client = app.test_client()
+
+    latencies = []
+    for topic, _, _ in graphs:
+        count = rng.randint(5, 15)
+        start = time.perf_counter()
+        body = client.post('/generate_stream', json={"topic": topic, "count": count}).get_data(as_text=True)
+        latencies.append(time.perf_counter() - start)
+        assert json.loads(body.strip().split('\n\n')[-1][6:])['status'] == 'complete'
+    latencies.sort()
+
+    kept_root = connected = 0
+    kept_relationships = []
+    for topic, concepts, relationships in graphs:
+        derived_concepts, derived_relationships = derive_graph(concepts, relationships, 8, topic)
+        kept_root += next(iter(concepts)) in derived_concepts
+        reached = {next(iter(derived_concepts))}
+        for _ in derived_concepts:
+            reached |= {target for source, target, _ in derived_relationships if source in reached}
+            reached |= {source for source, target, _ in derived_relationships if target in reached}
+        connected += len(reached) == len(derived_concepts)
+        kept_relationships.append(len(derived_relationships))
+    print(f"{args.topics} 个主题，首个请求（派生并保存）平均 {sum(latencies) / len(latencies) * 1000:.1f}ms "
+          f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f}ms")
+    print(f"20 -> 8 个节点：保留根概念 {kept_root / len(graphs):.0%}，连通 {connected / len(graphs):.0%}，"
+          f"平均保留 {sum(kept_relationships) / len(kept_relationships):.1f} 条关系")
+
+def bench_prewarm(args) -> None:
+    """
+    图谱预生成：用假LLM服务运行一批预生成任务，检查并发和服务商每分钟请求数上限是否生效，
+    以及重新运行时是否按检查点跳过已完成的任务
+    """
+    os.chdir(tempfile.mkdtemp())
+    import utils
+    import model_router
+    from configs.client import PROVIDERS
+    from prewarm import PrewarmWorker
+    from rate_limit import provider_limits
+
+    base_url = _start_stub_llm_server(latency=args.latency)
+    PROVIDERS["stub"] = {"models": ["stub-a"], "api_key_env": "STUB_API_KEY", "base_url": base_url}
+    os.environ["STUB_API_KEY"] = "stub"
+    utils.model_router = model_router.ModelRouter("stub-a", [])
+    provider_limits.configure("stub", args.rpm)
+
+    calls = []
+    call_llm_api = utils.call_llm_api
+
+    def counted_call_llm_api(*a, **kw):
+        calls.append(time.monotonic())
+        return call_llm_api(*a, **kw)
+    utils.call_llm_api = counted_call_llm_api
+
+    jobs = [(f"topic {i}", 10) for i in range(args.jobs)]
+    worker = PrewarmWorker(concurrency=args.concurrency, checkpoint="prewarm.checkpoint.jsonl")
+    start = time.monotonic()
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        counts = worker.run(jobs)
+    elapsed = time.monotonic() - start
+    # 令牌桶允许一秒额度的突发，实际速率按首个请求一秒之后的调用计算
+    steady = [t for t in calls if t > calls[0] + 1]
+    rate = (len(steady) - 1) / (steady[-1] - steady[0]) * 60 if len(steady) > 1 else float("nan")
+    print(f"{args.jobs} 个任务，并发 {args.concurrency}，上限 {args.rpm} 次/分钟：耗时 {elapsed:.1f}s，"
+          f"LLM调用 {len(calls)} 次，实际 {rate:.0f} 次/分钟，{counts}")
+
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        counts = PrewarmWorker(concurrency=args.concurrency, checkpoint="prewarm.checkpoint.jsonl").run(jobs)
+    print(f"按检查点重新运行：{counts}")
+
+def _start_stub_batch_server(latency: float = 0.0, fail_rate: float = 0.0, seed: int = 0, fail_for=None) -> tuple:
+    """
+    在本地启动一个兼容 OpenAI /files 与 /batches 协议的假批处理服务
+    概念请求返回提示词要求数量的概念，关系请求把提示词中的概念依次相连，人物预判总是返回非人物
+    :param latency: 批处理从创建到完成的时间（秒）
+    :param fail_rate: 单个请求失败（写入错误文件）的概率
+    :param fail_for: 可选函数 批处理请求 -> 是否失败，用于让指定的请求失败
+    :return: (base_url, 各接口的请求次数, 每个已创建批处理的请求ID列表)
+    """
+    import email.parser
+    import socket
+    import uuid
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    rng = random.Random(seed)
+    files, batches = {}, {}
+    calls = {}
+    submitted = []
+    lock = threading.Lock()
+
+    def answer(prompt):
+        if '"result"' in prompt:
+            return '{"result": "0"}'
+        if '"relations"' in prompt:
+            names = re.findall(r'"(概念\d+ \(Concept \d+\))"', prompt)
+            return json.dumps({"relations": [[a, b, "相关"] for a, b in zip(names, names[1:])]}, ensure_ascii=False)
+        count = int(re.search(r"生成(\d+)个", prompt).group(1))
+        return json.dumps({f"概念{i} (Concept {i})": "介绍" * 60 for i in range(count)}, ensure_ascii=False)
+
+    def process(batch):
+        time.sleep(latency)
+        output, errors = [], []
+        for line in files[batch["input_file_id"]].decode().splitlines():
+            request = json.loads(line)
+            if rng.random() < fail_rate or (fail_for and fail_for(request)):
+                errors.append({"id": uuid.uuid4().hex, "custom_id": request["custom_id"], "response": {
+                    "status_code": 500, "request_id": "stub", "body": {"error": {"message": "stub error"}}}, "error": None})
+                continue
+            content = answer(request["body"]["messages"][0]["content"])
+            output.append({"id": uuid.uuid4().hex, "custom_id": request["custom_id"], "error": None, "response": {
+                "status_code": 200, "request_id": "stub", "body": {
+                    "id": "stub", "object": "chat.completion", "created": int(time.time()), "model": request["body"]["model"],
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}]}}})
+        with lock:
+            for kind, records in (("output_file_id", output), ("error_file_id", errors)):
+                if records:
+                    file_id = f"file-{uuid.uuid4().hex}"
+                    files[file_id] = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records).encode()
+                    batch[kind] = file_id
+            batch["request_counts"] = {"total": len(output) + len(errors), "completed": len(output), "failed": len(errors)}
+            batch["status"] = "completed"
+            batch["completed_at"] = int(time.time())
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            super().setup()
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        def log_message(self, *args):
+            pass
+
+        def reply(self, payload, content_type="application/json"):
+            body = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            with lock:
+                calls[self.path] = calls.get(self.path, 0) + 1
+            if self.path == "/v1/files":
+                message = email.parser.BytesParser().parsebytes(
+                    f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode() + body)
+                upload = next(part for part in message.get_payload() if part.get_filename())
+                file_id = f"file-{uuid.uuid4().hex}"
+                files[file_id] = upload.get_payload(decode=True)
+                self.reply({"id": file_id, "object": "file", "bytes": len(files[file_id]), "created_at": int(time.time()),
+                            "filename": upload.get_filename(), "purpose": "batch", "status": "processed"})
+            else:
+                request = json.loads(body)
+                batch = {"id": f"batch_{uuid.uuid4().hex}", "object": "batch", "endpoint": request["endpoint"],
+                         "input_file_id": request["input_file_id"], "completion_window": request["completion_window"],
+                         "status": "in_progress", "created_at": int(time.time()), "metadata": request.get("metadata"),
+                         "request_counts": {"total": 0, "completed": 0, "failed": 0}}
+                batches[batch["id"]] = batch
+                submitted.append([json.loads(line)["custom_id"] for line in files[batch["input_file_id"]].decode().splitlines()])
+                threading.Thread(target=process, args=(batch,), daemon=True).start()
+                self.reply(batch)
+
+        def do_GET(self):
+            path = self.path.split("?")[0]
+            with lock:
+                key = "/v1/files/content" if path.endswith("/content") else "/v1/batches/retrieve"
+                calls[key] = calls.get(key, 0) + 1
+                if path.endswith("/content"):
+                    self.reply(files[path.split("/")[-2]], "application/jsonl")
+                else:
+                    self.reply(batches[path.split("/")[-1]])
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}/v1", calls, submitted
+
+def bench_batch(args) -> None:
+    """
+    批处理预生成：用假批处理服务为一批主题生成图谱，统计HTTP请求数、失败任务，
+    以及批量写入与逐条保存的耗时（失败记录和中断后继续的正确性见 tests/test_batch_prewarm.py）
+    """
+    os.chdir(tempfile.mkdtemp())
+    from configs.client import PROVIDERS
+    from database import DatabaseManager
+    from prewarm import BatchPrewarm
+
+    base_url, calls, _ = _start_stub_batch_server(latency=args.latency, fail_rate=args.fail_rate)
+    PROVIDERS["stub-batch"] = {"models": ["stub-batch"], "api_key_env": "STUB_API_KEY", "base_url": base_url}
+    os.environ["STUB_API_KEY"] = "stub"
+
+    jobs = [(f"topic {i}", args.count) for i in range(args.jobs)]
+    start = time.monotonic()
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        counts = BatchPrewarm(model="stub-batch", poll_interval=args.poll_interval, state="batch.json",
+                              checkpoint="batch.checkpoint.jsonl").run(jobs)
+    elapsed = time.monotonic() - start
+    print(f"{args.jobs} 个任务（每个需要 3 次LLM请求）：耗时 {elapsed:.1f}s，HTTP请求 {sum(calls.values())} 次 {dict(calls)}，{counts}")
+
+    graphs = [dict(topic=f"ingest {i}", concept_count=args.count,
+                   concepts={f"概念{j} (Concept {j})": "介绍" * 60 for j in range(args.count)},
+                   relationships=[[f"概念{j} (Concept {j})", f"概念{j + 1} (Concept {j + 1})", "相关"] for j in range(args.count - 1)])
+              for i in range(args.jobs)]
+    start = time.perf_counter()
+    for graph in graphs:
+        DatabaseManager.save_knowledge_graph(**graph)
+    single = time.perf_counter() - start
+    start = time.perf_counter()
+    DatabaseManager.save_knowledge_graphs(graphs)
+    bulk = time.perf_counter() - start
+    print(f"写入 {args.jobs} 个图谱：逐条保存 {single * 1000:.0f}ms，批量保存 {bulk * 1000:.0f}ms")
+
+def bench_rate_limit(args) -> None:
+    """
+    服务商准入控制：假服务按滚动窗口限制每秒请求数和同时进行的请求数，超出时返回429。
+    对比不做准入控制（只在429后切换模型、重试）和按服务商限额主动排队时的成功吞吐与429次数，
+    并检查排队中的生成是否收到排队位置事件
+    """
+    import utils
+    import model_router
+    from configs.client import PROVIDERS
+    from rate_limit import provider_limits
+    from single_flight import SingleFlight
+
+    lock = threading.Lock()
+    window = []
+    server = {"in_flight": 0, "max_in_flight": 0, "429": 0}
+
+    def status_for(model):
+        now = time.monotonic()
+        with lock:
+            while window and window[0] < now - 1:
+                window.pop(0)
+            if len(window) >= args.server_rps or server["in_flight"] >= args.server_concurrency:
+                server["429"] += 1
+                return 429
+            window.append(now)
+            server["in_flight"] += 1
+            server["max_in_flight"] = max(server["max_in_flight"], server["in_flight"])
+        return 200
+
+    def on_done(status):
+        if status == 200:
+            with lock:
+                server["in_flight"] -= 1
+
+    base_url = _start_stub_llm_server(latency=args.latency, status_for=status_for, on_done=on_done)
+    PROVIDERS["stub"] = {"models": ["stub-a"], "api_key_env": "STUB_API_KEY", "base_url": base_url}
+    os.environ["STUB_API_KEY"] = "stub"
+    model_router.breaker_rate_limit_cooldown = 1
+    messages = [{"role": "user", "content": "ping"}]
+
+    def run(label):
+        utils.model_router = model_router.ModelRouter("stub-a", [])
+        server["429"] = server["max_in_flight"] = 0
+        counts = {"ok": 0, "failed": 0}
+        start = time.monotonic()
+
+        def worker():
+            while time.monotonic() - start < args.duration:
+                try:
+                    utils.call_llm_api(messages, "基准测试")
+                    result = "ok"
+                except Exception:
+                    result = "failed"
+                with lock:
+                    counts[result] += 1
+
+        with contextlib.redirect_stdout(open(os.devnull, 'w')):
+            threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        elapsed = time.monotonic() - start
+        print(f"{label:>10}: 成功 {counts['ok'] / elapsed:6.1f} 次/秒，失败 {counts['failed']} 次，"
+              f"收到429 {server['429']} 次，服务端最大并发 {server['max_in_flight']}")
+
+    run("不限流")
+    # 限额留出一成余量，吸收请求到达服务端时的时间抖动
+    provider_limits.configure("stub", rpm=int(args.server_rps * 60 * 0.9), max_in_flight=args.server_concurrency)
+    run("准入控制")
+
+    # 并发名额为1时，同时开始的多个生成中排在后面的应收到排队位置事件
+    provider_limits.configure("stub", rpm=args.server_rps * 60, max_in_flight=1)
+    flights = SingleFlight("bench")
+
+    def producer():
+        for chunk in utils.call_llm_api(messages, "基准测试", stream=True):
+            pass
+        yield "data: " + json.dumps({"status": "complete", "progress": 100}) + "\n\n"
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        streams = [flights.join(i, producer) for i in range(args.flights)]
+        events = [[json.loads(event[5:]) for event in stream] for stream in streams]
+    positions = [[e["queue_position"] for e in flight if e["status"] == "queued"] for flight in events]
+    print(f"{args.flights} 个同时开始的生成，并发名额 1：各自收到的排队位置 {positions}")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="TermsAI 性能基准测试")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    p = subparsers.add_parser('filter', help='过滤词引擎每token耗时')
+    p.add_argument('--words', type=int, nargs='+', default=[10, 1000, 10000])
+    p.add_argument('--tokens', type=int, nargs='+', default=[100, 1000, 5000])
+    p.add_argument('--legacy-limit', type=int, default=500, help='旧实现最多测量的token数')
+    p.set_defaults(func=bench_filter)
+
+    p = subparsers.add_parser('stream-parse', help='概念流增量解析耗时')
+    p.add_argument('--concepts', type=int, nargs='+', default=[20, 200, 2000])
+    p.add_argument('--chunk-size', type=int, default=4)
+    p.set_defaults(func=bench_stream_parse)
+
+    p = subparsers.add_parser('pipeline', help='顺序与流水线关系生成的端到端耗时')
+    p.add_argument('--concepts', type=int, default=20)
+    p.add_argument('--token-delay', type=float, default=0.02, help='假LLM每个流式chunk的延迟（秒）')
+    p.add_argument('--relation-base', type=float, default=1.0, help='假LLM关系调用的固定延迟（秒）')
+    p.add_argument('--relation-per-edge', type=float, default=0.15, help='假LLM每输出一条关系的延迟（秒）')
+    p.set_defaults(func=bench_pipeline)
+
+    p = subparsers.add_parser('prejudge', help='投机执行人物预判前后的首个节点耗时')
+    p.add_argument('--prejudge-delay', type=float, default=1.5, help='假LLM预判调用的延迟（秒）')
+    p.add_argument('--first-token-delay', type=float, default=0.8, help='假LLM流式首个chunk的延迟（秒）')
+    p.add_argument('--token-delay', type=float, default=0.01)
+    p.add_argument('--concurrent', type=int, default=32, help='同时开始生成的新主题数')
+    p.set_defaults(func=bench_prejudge)
+
+    p = subparsers.add_parser('client', help='LLM客户端连接复用前后的单次调用开销')
+    p.add_argument('--calls', type=int, default=200)
+    p.set_defaults(func=bench_client)
+
+    p = subparsers.add_parser('router', help='首选模型限流时的并发吞吐与恢复')
+    p.add_argument('--threads', type=int, default=16)
+    p.add_argument('--duration', type=float, default=6.0)
+    p.add_argument('--outage', type=float, default=2.0, help='首选模型持续返回429的时长（秒）')
+    p.add_argument('--cooldown', type=float, default=1.0, help='限流后的熔断冷却时间（秒）')
+    p.add_argument('--latency', type=float, default=0.05)
+    p.set_defaults(func=bench_router)
+
+    p = subparsers.add_parser('async-load', help='异步生成引擎单进程可承载的并发流数量')
+    p.add_argument('--streams', type=int, default=300)
+    p.add_argument('--latency', type=float, default=0.2, help='假LLM每个请求的首字节延迟（秒）')
+    p.add_argument('--chunks', type=int, default=20)
+    p.add_argument('--chunk-delay', type=float, default=0.1)
+    p.set_defaults(func=bench_async_load)
+
+    p = subparsers.add_parser('hot-graph', help='热门图谱缓存命中前后的缓存图谱请求耗时')
+    p.add_argument('--concepts', type=int, default=20)
+    p.add_argument('--rows', type=int, default=50, help='同一主题已保存的图谱数')
+    p.add_argument('--requests', type=int, default=500)
+    p.set_defaults(func=bench_hot_graph)
+
+    p = subparsers.add_parser('network-data', help='create_network_data 在不同规模合成图上的耗时')
+    p.add_argument('--nodes', type=int, nargs='+', default=[20, 200, 2000, 20000, 50000])
+    p.add_argument('--edge-ratio', type=float, default=2.0)
+    p.add_argument('--legacy-limit', type=int, default=2000, help='旧实现最多测量的节点数')
+    p.set_defaults(func=bench_network_data)
+
+    p = subparsers.add_parser('db-query', help='补建索引前后图谱查询的耗时')
+    p.add_argument('--rows', type=int, default=1000000, help='预置的图谱数')
+    p.add_argument('--views', type=int, default=1000000, help='预置的查看记录数')
+    p.add_argument('--topics', type=int, default=1000, help='主题数，越少则每个主题的图谱越多')
+    p.add_argument('--users', type=int, default=20000)
+    p.add_argument('--queries', type=int, default=200)
+    p.set_defaults(func=bench_db_query)
+
+    p = subparsers.add_parser('db-load', help='并发读写下默认SQLite设置与WAL加后台合并写入的读写延迟')
+    p.add_argument('--mode', choices=['legacy', 'tuned'], help='只运行一种设置（默认两种都运行）')
+    p.add_argument('--readers', type=int, default=8)
+    p.add_argument('--writers', type=int, default=16)
+    p.add_argument('--duration', type=float, default=5.0)
+    p.add_argument('--graphs', type=int, default=200)
+    p.set_defaults(func=bench_db_load)
+
+    p = subparsers.add_parser('feedback', help='大量并发点赞后最终点赞数是否正确及吞吐')
+    p.add_argument('--likes', type=int, default=5000)
+    p.add_argument('--threads', type=int, default=64)
+    p.add_argument('--flush-interval', type=float, default=0.05, help='内存合并方式的写入周期（秒）')
+    p.set_defaults(func=bench_feedback)
+
+    p = subparsers.add_parser('db-payload', help='图谱内容延迟加载前后每次请求的耗时和内存峰值')
+    p.add_argument('--graphs', type=int, default=500)
+    p.add_argument('--payload-kb', type=int, default=100, help='每个图谱内容的大致大小（KB）')
+    p.add_argument('--requests', type=int, default=50)
+    p.set_defaults(func=bench_db_payload)
+
+    p = subparsers.add_parser('topic-index', help='相近主题匹配的缓存命中率提升和大量主题下的查找耗时')
+    p.add_argument('--log', help='主题查询日志（每行一个主题，可用制表符附带节点数量），默认使用合成日志')
+    p.add_argument('--queries', type=int, default=50000, help='合成日志的查询数')
+    p.add_argument('--distinct', type=int, default=5000, help='合成日志的不同主题数')
+    p.add_argument('--threshold', type=float, default=0.8)
+    p.add_argument('--topics', type=int, default=1000000)
+    p.add_argument('--lookups', type=int, default=2000)
+    p.set_defaults(func=bench_topic_index)
+
+    p = subparsers.add_parser('derive', help='从较大图谱派生较小图谱的首个请求耗时和派生结果')
+    p.add_argument('--topics', type=int, default=200)
+    p.set_defaults(func=bench_derive)
+
+    p = subparsers.add_parser('prewarm', help='预生成任务的并发、服务商限速与检查点')
+    p.add_argument('--jobs', type=int, default=30)
+    p.add_argument('--concurrency', type=int, default=8)
+    p.add_argument('--rpm', type=int, default=300)
+    p.add_argument('--latency', type=float, default=0.05)
+    p.set_defaults(func=bench_prewarm)
+
+    p = subparsers.add_parser('batch', help='批处理预生成的HTTP请求数和批量写入')
+    p.add_argument('--jobs', type=int, default=500)
+    p.add_argument('--count', type=int, default=10)
+    p.add_argument('--latency', type=float, default=0.5, help='假批处理服务完成一个批处理的时间（秒）')
+    p.add_argument('--fail-rate', type=float, default=0.02)
+    p.add_argument('--poll-interval', type=float, default=0.2)
+    p.set_defaults(func=bench_batch)
+
+    p = subparsers.add_parser('rate-limit', help='服务商准入控制前后的成功吞吐、429次数和排队位置事件')
+    p.add_argument('--duration', type=float, default=10)
+    p.add_argument('--threads', type=int, default=32)
+    p.add_argument('--latency', type=float, default=0.1)
+    p.add_argument('--server-rps', type=int, default=50, help='假服务每秒允许的请求数')
+    p.add_argument('--server-concurrency', type=int, default=8, help='假服务允许的同时请求数')
+    p.add_argument('--flights', type=int, default=4)
+    p.set_defaults(func=bench_rate_limit)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == '__main__':
+    main()
@@ -1,19 +1,115 @@
 from dotenv import load_dotenv
 load_dotenv()
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI, DefaultHttpxClient, DefaultAsyncHttpxClient, Timeout
+import asyncio
+import httpx
 import os
+import threading
+
+# 各服务商的配置：支持的模型、API KEY 对应的环境变量、接口地址（None 表示使用 OpenAI 默认地址）
+PROVIDERS = {
+    "deepseek": {
+        "models": ["deepseek-reasoner", "deepseek-chat"],
+        "api_key_env": "deepseek_API_KEY",
+        "base_url": "https://api.deepseek.com"
+    },
+    "openai": {
+        "models": ["gpt-4o", "gpt-4o-mini"],
+        "api_key_env": "OpenAI_API_KEY",
+        "base_url": None
+    },
+    "siliconflow": {
+        "models": ["deepseek-ai/DeepSeek-V3", "Qwen/Qwen2.5-72B-Instruct", "Pro/deepseek-ai/DeepSeek-V3"],
+        "api_key_env": "silconflow_API_KEY",
+        "base_url": "https://api.siliconflow.cn/v1"
+    },
+    "dashscope": {
+        "models": ["deepseek-v3"],
+        "api_key_env": "DASHSCOPE_API_KEY",
+        "base_url": "https://dashscope.aliyuncs.com/compatible-mode/v1"
+    }
+}
+
+# 连接池设置：每个客户端的最大连接数、最大保活连接数及保活时长（秒）
+max_connections = 100
+max_keepalive_connections = 20
+keepalive_expiry = 60
+# 超时设置（秒）：流式生成可能持续数分钟，读超时针对的是两个chunk之间的间隔
+connect_timeout = 10
+read_timeout = 120
+# SDK内部的重试次数：限流和错误交给 utils 中的模型路由与重试装饰器处理，避免在被限流的模型上反复等待
+max_retries = 0
+
+_clients = {}
+_async_clients = {}
+_clients_lock = threading.Lock()
+
+def resolve_provider(model):
+    for name, provider in PROVIDERS.items():
+        if model in provider["models"]:
+            return name
+    raise ValueError(f"Unsupported model: {model}")
+
+def get_client(provider, base_url, api_key):
+    """
+    获取 (服务商, 接口地址, KEY) 对应的长连接客户端，同一进程内所有线程共享同一个连接池
+    """
+    key = (provider, base_url, api_key)
+    ai_client = _clients.get(key)
+    if ai_client is None:
+        with _clients_lock:
+            ai_client = _clients.get(key)
+            if ai_client is None:
+                http_client = DefaultHttpxClient(
+                    limits=httpx.Limits(
+                        max_connections=max_connections,
+                        max_keepalive_connections=max_keepalive_connections,
+                        keepalive_expiry=keepalive_expiry
+                    )
+                )
+                ai_client = OpenAI(
+                    api_key=api_key,
+                    base_url=base_url,
+                    timeout=Timeout(read_timeout, connect=connect_timeout),
+                    max_retries=max_retries,
+                    http_client=http_client
+                )
+                _clients[key] = ai_client
+    return ai_client
 
 def client(model):
-    if model in ["deepseek-reasoner","deepseek-chat"]:
-        return OpenAI(
-            api_key=os.environ.get("deepseek_API_KEY"),
-            base_url="https://api.deepseek.com"
-        )
-    elif model in ["gpt-4o","gpt-4o-mini"]:
-        return OpenAI(api_key=os.environ.get("OpenAI_API_KEY"))
-    elif model in ["deepseek-ai/DeepSeek-V3","Qwen/Qwen2.5-72B-Instruct","Pro/deepseek-ai/DeepSeek-V3"]:
-        return OpenAI(api_key=os.environ.get("silconflow_API_KEY"), base_url="https://api.siliconflow.cn/v1")
-    elif model in ["deepseek-v3"]:
-        return OpenAI(api_key=os.environ.get("DASHSCOPE_API_KEY"), base_url="https://dashscope.aliyuncs.com/compatible-mode/v1")
-    else:
-        raise ValueError(f"Unsupported model: {model}")
\ No newline at end of file
+    provider = resolve_provider(model)
+    config = PROVIDERS[provider]
+    return get_client(provider, config["base_url"], os.environ.get(config["api_key_env"]))
+
+def get_async_client(provider, base_url, api_key):
+    """
+    异步版本的 get_client：异步连接池与事件循环绑定，因此按当前事件循环分别缓存
+    """
+    key = (asyncio.get_running_loop(), provider, base_url, api_key)
+    ai_client = _async_clients.get(key)
+    if ai_client is None:
+        with _clients_lock:
+            ai_client = _async_clients.get(key)
+            if ai_client is None:
+                http_client = DefaultAsyncHttpxClient(
+                    limits=httpx.Limits(
+                        max_connections=max_connections,
+                        max_keepalive_connections=max_keepalive_connections,
+                        keepalive_expiry=keepalive_expiry
+                    )
+                )
+                ai_client = AsyncOpenAI(
+                    api_key=api_key,
+                    base_url=base_url,
+                    timeout=Timeout(read_timeout, connect=connect_timeout),
+                    max_retries=max_retries,
+                    http_client=http_client
+                )
+                _async_clients[key] = ai_client
+    return ai_client
+
+def async_client(model):
+    provider = resolve_provider(model)
+    config = PROVIDERS[provider]
+    return get_async_client(provider, config["base_url"], os.environ.get(config["api_key_env"]))
\ No newline at end of file
@@ -1,4 +1,61 @@
 # 选择模型
 model = "Pro/deepseek-ai/DeepSeek-V3"
 # 达到Rate limit时的备选模型
-backup_models = ["Pro/deepseek-ai/DeepSeek-V3", "deepseek-v3", "Qwen/Qwen2.5-72B-Instruct"]
\ No newline at end of file
+backup_models = ["Pro/deepseek-ai/DeepSeek-V3", "deepseek-v3", "Qwen/Qwen2.5-72B-Instruct"]
+# 图谱生成策略："sequential" 概念全部生成后再生成关系；"pipelined" 概念流式生成的同时分批生成关系
+generation_strategy = "sequential"
+# 流水线模式下每批用于推断关系的概念数量
+pipeline_batch_size = 6
+# 是否在人物预判的同时投机地开始生成（非人物）概念，预判结果不一致时取消重来
+speculative_prejudge = True
+# 主题人物预判结果的缓存有效期（秒）和进程内缓存条目数
+person_verdict_ttl = 30 * 24 * 3600
+person_verdict_cache_size = 10000
+# 相近主题匹配：没有该主题的图谱时，复用字符二元组相似度（Dice系数）不低于阈值的已有主题的图谱，设为 0 关闭；主题索引从数据库增量刷新的间隔（秒）
+topic_similarity_threshold = 0.8
+topic_index_refresh_interval = 5
+# 没有该节点数量的图谱时，是否从同一主题节点更多的图谱中选出最核心的概念派生出较小的图谱，以及是否把派生的图谱保存为新图谱
+# （保存时只在单个进程内避免重复保存，多进程部署下并发未命中仍可能各保存一份）
+derive_smaller_graphs = True
+save_derived_graphs = False
+# 各服务商的准入控制（服务商名称见 configs/client.py 中的 PROVIDERS），未列出的服务商不限制：
+# 每分钟请求数、每分钟token数、同时进行的请求数（流式请求在流结束前一直占用）
+provider_rpm = {}
+provider_tpm = {}
+provider_max_in_flight = {}
+# 超出限额的请求排队等待的最长时间（秒），超过时改用其他服务商的模型；估算token数时预计的回复长度
+rate_limit_max_wait = 30
+estimated_completion_tokens = 1000
+# 批处理预生成（prewarm.py batch）使用的模型、轮询批处理状态的间隔（秒）和服务商的完成时限
+batch_model = model
+batch_poll_interval = 60
+batch_completion_window = "24h"
+# 模型熔断设置：连续失败多少次后熔断，限流/错误后的冷却时间（秒），半开探测失败后冷却时间翻倍的上限（秒）
+breaker_failure_threshold = 3
+breaker_rate_limit_cooldown = 30
+breaker_error_cooldown = 60
+breaker_max_cooldown = 600
+# 热门图谱缓存：进程内缓存的 (主题, 节点数量) 条目数和有效期（秒）
+hot_graph_cache_size = 1000
+hot_graph_ttl = 300
+# 图谱只读接口 /graphs/<id>.json 进程内缓存的已编码（含压缩版本）图谱数
+graph_file_cache_size = 2000
+# 数据库设置：SQLite 日志模式、同步级别、忙等待超时（毫秒），连接池大小与溢出连接数
+sqlite_journal_mode = "WAL"
+sqlite_synchronous = "NORMAL"
+sqlite_busy_timeout = 5000
+db_pool_size = 20
+db_max_overflow = 40
+# 查看记录与点赞/点踩是否经后台写入线程合并提交，每批最多额外等待的时间（秒，0 表示只合并已在排队的写入）和条数
+background_writes = True
+write_batch_interval = 0
+write_batch_size = 500
+# 点赞/点踩在内存中合并后定期写入的周期（秒），0 表示不合并、每条反馈等待写入提交后返回最新计数
+feedback_flush_interval = 0
+# 数据库连接：主库URL（可用环境变量 DATABASE_URL 覆盖）、只读副本URL列表（可用环境变量 DATABASE_REPLICA_URLS 以逗号分隔覆盖），非SQLite连接的回收时间（秒）
+database_url = "sqlite:///knowledge_graphs.db"
+database_replica_urls = []
+db_pool_recycle = 1800
+# 新保存的图谱内容是否使用紧凑二进制编码（见 graph_codec），以及压缩方式（"zlib"，安装 zstandard 后可用 "zstd"）
+compact_graph_payload = False
+graph_payload_codec = "zlib"
\ No newline at end of file
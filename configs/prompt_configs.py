@@ -118,3 +118,55 @@ NEW_ORG_PROMPT_TEMPLATE = '''
     "特斯拉 (Tesla, Inc., TSLA)": "特斯拉是Elon Musk最著名的公司之一，专注于电动汽车和清洁能源。它不仅是电动汽车领域的领头羊，还生产太阳能板和家用储能设备。特斯拉就像汽车界的苹果，用科技和创新颠覆了传统汽车行业。"
 }}
 '''
+
+CROSS_RELATIONSHIP_PROMPT_TEMPLATE = '''
+下面的概念被分成了若干组，每组内部的关联关系已经构造完成。
+请补充不同分组的概念之间所有合理且重要的关联关系，每个关联关系以三元组形式呈现。
+
+概念分组为：
+{groups_json}
+
+已有的关联关系为：
+{relations_json}
+
+请返回如下格式的 JSON：
+{{
+    "relations": [
+        ["人工智能 (Artificial Intelligence, AI)", "机器学习 (Machine Learning, ML)", "包含"],
+        ...
+    ]
+}}
+
+要求：
+1. 每个关系必须是一个包含三个元素的数组：[源概念, 目标概念, 关系描述]
+2. 源概念和目标概念必须来自不同分组，且不要重复已有的关联关系
+3. 关系描述应该简短精确
+4. 只返回 JSON 数据，不要包含其他说明文字
+5. 务必确保每个字符串内部的双引号（如有）均已转义。
+'''
+
+CROSS_RELATIONSHIP_ORG_PROMPT_TEMPLATE = '''
+下面的人物/组织被分成了若干组，每组内部的关联关系已经构造完成。
+请补充不同分组的人物/组织之间所有合理且重要的关联关系，每个关联关系以三元组形式呈现。
+
+人物/组织分组为：
+{groups_json}
+
+已有的关联关系为：
+{relations_json}
+
+请返回如下格式的 JSON：
+{{
+    "relations": [
+        ["埃隆·马斯克 (Elon Musk)", "特斯拉 (Tesla, Inc., TSLA)", "创始人"],
+        ...
+    ]
+}}
+
+要求：
+1. 每个关系必须是一个包含三个元素的数组：[源人物/组织, 目标人物/组织, 关系描述]
+2. 源和目标必须来自不同分组，且不要重复已有的关联关系
+3. 关系描述应该简短精确
+4. 只返回 JSON 数据，不要包含其他说明文字
+5. 务必确保每个字符串内部的双引号（如有）均已转义。
+'''
@@ -0,0 +1,136 @@
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_FILTER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'filter.txt')
+
+class _Automaton:
+    """
+    Aho-Corasick 多模式匹配自动机，一次扫描即可判断文本是否包含任意过滤词
+    """
+    def __init__(self, words: List[str]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.hit: List[bool] = [False]
+
+        for word in words:
+            state = 0
+            for ch in word:
+                nxt = self.goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[state][ch] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.hit.append(False)
+                state = nxt
+            self.hit[state] = True
+
+        # 广度优先构造失败指针，并把命中标记沿失败链向下传递
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self.goto[state].items():
+                queue.append(nxt)
+                f = self.fail[state]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                self.hit[nxt] = self.hit[nxt] or self.hit[self.fail[nxt]]
+
+    def step(self, state: int, text: str) -> Tuple[int, bool]:
+        """
+        从给定状态开始扫描文本
+        :return: (扫描结束时的状态, 是否命中过滤词)
+        """
+        goto, fail, hit = self.goto, self.fail, self.hit
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if hit[state]:
+                return state, True
+        return state, False
+
+class ContentFilter:
+    """
+    过滤词引擎：只加载一次词表并编译为自动机，文件修改时间变化时自动热加载
+    """
+    def __init__(self, path: str = DEFAULT_FILTER_PATH, reload_interval: float = 1.0):
+        """
+        :param path: 过滤词文件路径
+        :param reload_interval: 检查文件修改时间的最小间隔（秒），避免每个token都访问磁盘
+        """
+        self.path = path
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._automaton = _Automaton([])
+        self._mtime: Optional[float] = None
+        self._last_check = 0.0
+        self.version = 0
+        self._maybe_reload(force=True)
+
+    def _maybe_reload(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now - self._last_check < self.reload_interval:
+            return
+        with self._lock:
+            if not force and now - self._last_check < self.reload_interval:
+                return
+            self._last_check = now
+            try:
+                mtime = os.stat(self.path).st_mtime
+                if mtime == self._mtime:
+                    return
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    words = [line.strip().lower() for line in f if line.strip()]
+                self._automaton = _Automaton(words)
+                self._mtime = mtime
+                self.version += 1
+            except Exception as e:
+                print(f"Error loading content filters: {e}")
+
+    @property
+    def automaton(self) -> _Automaton:
+        self._maybe_reload()
+        return self._automaton
+
+    def contains(self, text: str) -> bool:
+        """
+        检查文本是否包含过滤词
+        """
+        if not text:
+            return False
+        return self.automaton.step(0, text.lower())[1]
+
+    def scanner(self) -> 'StreamScanner':
+        """
+        创建一个用于流式文本的增量扫描器
+        """
+        return StreamScanner(self)
+
+class StreamScanner:
+    """
+    流式增量扫描器：在chunk之间保留自动机状态，每次只扫描新到达的文本。
+    扫描器固定使用创建时的自动机：热加载前已丢弃的文本无法用新词表补扫（新增的词可能更长），
+    新词表从下一个扫描器开始生效。
+    """
+    def __init__(self, content_filter: ContentFilter):
+        self._automaton = content_filter.automaton
+        self._state = 0
+        self.matched = False
+
+    def feed(self, chunk: str) -> bool:
+        """
+        送入新的文本块
+        :return: 到目前为止的累积文本是否包含过滤词
+        """
+        if self.matched or not chunk:
+            return self.matched
+        self._state, self.matched = self._automaton.step(self._state, chunk.lower())
+        return self.matched
+
+# 进程内共享的过滤引擎
+content_filter = ContentFilter()
@@ -1,28 +1,259 @@
-from sqlalchemy import desc
-from models import Session, KnowledgeGraph, UserView
+import json
+import time
+from sqlalchemy import desc, func, update
+from sqlalchemy.dialects import postgresql, sqlite
+from models import Session, ReadSession, KnowledgeGraph, UserView, TopicClassification, TopicDemand, GraphNetworkData, LOAD_PAYLOAD
+from graph_cache import hot_graphs
+from network import NETWORK_DATA_VERSION, build_network_graph, with_style
+from db_writer import BackgroundWriter, FeedbackAggregator
+from graph_codec import encode_payload, decode_payload
+from topic_text import normalize_topic
+from configs import background_writes, write_batch_interval, write_batch_size, feedback_flush_interval, compact_graph_payload, graph_payload_codec
 from typing import Optional, List, Dict, Any
+from concurrent.futures import Future
 from datetime import datetime, timezone
 
+def _insert(session, model):
+    """
+    按数据库方言构造支持 ON CONFLICT 的 insert 语句
+    """
+    if session.get_bind().dialect.name == 'postgresql':
+        return postgresql.insert(model)
+    return sqlite.insert(model)
+
+def _network_data(session, graph: KnowledgeGraph) -> Dict[str, Any]:
+    """
+    读取图谱预先计算的网络数据；没有或版本过旧时重新计算并保存
+    """
+    record = session.get(GraphNetworkData, graph.id)
+    if record is None or record.version != NETWORK_DATA_VERSION:
+        data = build_network_graph(graph.concepts, graph.relationships)
+        # 读取可能来自只读副本，计算结果写回主库
+        with Session() as primary:
+            primary.merge(GraphNetworkData(
+                graph_id=graph.id,
+                version=NETWORK_DATA_VERSION,
+                data=data
+            ))
+            primary.commit()
+        return with_style(data)
+    return with_style(record.data)
+
+def _with_network_data(query):
+    """
+    在同一条SQL中一并取出图谱的网络数据；取出的记录进入会话的身份映射，_network_data 读取时不再查询
+    """
+    return query.add_entity(GraphNetworkData)\
+        .outerjoin(GraphNetworkData, GraphNetworkData.graph_id == KnowledgeGraph.id)
+
+def _best_graph(session, query) -> Optional[Dict[str, Any]]:
+    """
+    一条SQL取出评分最高的图谱：子查询只按ID和评分排序选出一个ID（窗口函数同时给出符合条件的图谱总数），
+    再连接回图谱表和网络数据表，只读取这一个图谱的内容，排序和计数时不读取任何图谱内容
+    """
+    ranked = query.with_entities(KnowledgeGraph.id.label('id'), func.count().over().label('total_available'))\
+        .order_by(desc(KnowledgeGraph.score))\
+        .limit(1)\
+        .subquery()
+    row = _with_network_data(session.query(KnowledgeGraph).options(LOAD_PAYLOAD))\
+        .join(ranked, KnowledgeGraph.id == ranked.c.id)\
+        .add_columns(ranked.c.total_available)\
+        .one_or_none()
+    if row is None:
+        return None
+    graph, _, total_available = row
+    result = _graph_dict(session, graph)
+    result['total_available'] = total_available
+    return result
+
+def _graph_dict(session, graph: KnowledgeGraph) -> Dict[str, Any]:
+    result = graph.to_dict()
+    result['network_data'] = _network_data(session, graph)
+    return result
+
+def _apply_writes(batch: list) -> None:
+    """
+    在一个事务中执行一批查看记录、主题请求计数和点赞/点踩写入，并设置每条写入的 Future 结果
+    :param batch: [(写入类型 'view'、'demand' 或 'feedback', 参数, Future)]
+    """
+    views = {}
+    demand = {}
+    feedback = {}
+    for kind, args, future in batch:
+        if kind == 'view':
+            views.setdefault(args, []).append(future)
+        elif kind == 'demand':
+            demand.setdefault(args, []).append(future)
+        else:
+            graph_id, is_like = args
+            feedback.setdefault(graph_id, []).append((is_like, future))
+
+    with Session() as session:
+        if views:
+            session.execute(
+                _insert(session, UserView).on_conflict_do_nothing(index_elements=['user_id', 'graph_id']),
+                [{'user_id': user_id, 'graph_id': graph_id, 'viewed_at': datetime.utcnow()} for user_id, graph_id in views]
+            )
+        if demand:
+            statement = _insert(session, TopicDemand)
+            session.execute(
+                statement.on_conflict_do_update(
+                    index_elements=['topic', 'concept_count'],
+                    set_={
+                        'requests': TopicDemand.requests + statement.excluded.requests,
+                        'last_requested_at': statement.excluded.last_requested_at
+                    }
+                ),
+                [{'topic': topic, 'concept_count': concept_count, 'requests': len(futures), 'last_requested_at': datetime.utcnow()}
+                 for (topic, concept_count), futures in demand.items()]
+            )
+
+        counters = _increment_feedback(session, {
+            graph_id: (sum(1 for is_like, _ in items if is_like), sum(1 for is_like, _ in items if not is_like))
+            for graph_id, items in feedback.items()
+        })
+        session.commit()
+        _invalidate_feedback(counters)
+
+        for futures in list(views.values()) + list(demand.values()):
+            for future in futures:
+                future.set_result(None)
+        for graph_id, items in feedback.items():
+            result = counters.get(graph_id)
+            for _, future in items:
+                if result is None:
+                    future.set_exception(ValueError(f"Graph with id {graph_id} not found"))
+                else:
+                    future.set_result(result)
+
+def _increment_feedback(session, counts: Dict[int, tuple]) -> Dict[int, Dict[str, Any]]:
+    """
+    在数据库中原子累加点赞/点踩数，只更新计数列并只取回计数，不读取图谱内容；
+    多个线程、进程或节点同时写入也不会丢失。调用方负责提交事务并调用 _invalidate_feedback
+    :param counts: {图谱ID: (点赞数, 点踩数)}
+    :return: {图谱ID: 更新后的计数}，不存在的图谱不在结果中
+    """
+    counters = {}
+    for graph_id, (likes, dislikes) in counts.items():
+        row = session.execute(
+            update(KnowledgeGraph)
+            .where(KnowledgeGraph.id == graph_id)
+            .values(
+                likes=KnowledgeGraph.likes + likes,
+                dislikes=KnowledgeGraph.dislikes + dislikes,
+                score=KnowledgeGraph.likes + likes,  # - dislikes 可调整，目前只取like数
+                created_at=datetime.now(timezone.utc)
+            )
+            .returning(KnowledgeGraph.id, KnowledgeGraph.topic, KnowledgeGraph.concept_count,
+                       KnowledgeGraph.likes, KnowledgeGraph.dislikes, KnowledgeGraph.score)
+        ).first()
+        if row is None:
+            continue
+        counters[graph_id] = {
+            'id': row.id,
+            'likes': row.likes,
+            'dislikes': row.dislikes,
+            'score': row.score,
+            '_key': (row.topic, row.concept_count)
+        }
+    return counters
+
+def _invalidate_feedback(counters: Dict[int, Dict[str, Any]]) -> None:
+    """
+    计数提交后使对应主题的热点缓存失效（分数变化可能改变该主题的最佳图谱），并去掉内部使用的缓存键
+    """
+    for counter in counters.values():
+        hot_graphs.invalidate(*counter.pop('_key'))
+
+def _flush_feedback(counts: Dict[int, tuple]) -> None:
+    """
+    写入内存中合并的点赞/点踩数
+    """
+    with Session() as session:
+        counters = _increment_feedback(session, counts)
+        session.commit()
+    _invalidate_feedback(counters)
+    for graph_id in set(counts) - set(counters):
+        print(f"忽略不存在的图谱 {graph_id} 的点赞/点踩")
+
+# 后台写入线程，查看记录和点赞/点踩经它合并提交
+_writer = BackgroundWriter(_apply_writes, interval=write_batch_interval, batch_size=write_batch_size)
+
+def _write(kind: str, args: tuple) -> Future:
+    """
+    提交一条小写入：启用 background_writes 时交给后台写入线程，否则在当前线程直接执行
+    """
+    if background_writes:
+        return _writer.submit(kind, args)
+    future = Future()
+    _apply_writes([(kind, args, future)])
+    return future
+
+# 点赞/点踩内存合并，feedback_flush_interval 大于 0 时启用
+_feedback = FeedbackAggregator(_flush_feedback, interval=feedback_flush_interval)
+
 class DatabaseManager:
     @staticmethod
-    def save_knowledge_graph(topic: str, concept_count: int, concepts: dict, relationships: list, is_person: int = 0) -> int:
+    def save_knowledge_graph(topic: str, concept_count: int, concepts: dict, relationships: list, is_person: int = 0, network_data: dict = None) -> int:
+        """
+        保存图谱，同时保存预先计算的网络数据
+        :param network_data: 调用方已计算好的网络数据，未提供时在此计算
+        """
+        return DatabaseManager.save_knowledge_graphs([dict(
+            topic=topic,
+            concept_count=concept_count,
+            concepts=concepts,
+            relationships=relationships,
+            is_person=is_person,
+            network_data=network_data
+        )])[0]
+
+    @staticmethod
+    def save_knowledge_graphs(graphs: List[Dict[str, Any]]) -> List[int]:
+        """
+        在一个事务中批量保存图谱（批量预生成时使用）
+        :param graphs: 每项包含 save_knowledge_graph 的参数
+        :return: 与 graphs 顺序一致的图谱ID
+        """
         with Session() as session:
-            graph = KnowledgeGraph(
-                topic=topic.lower(),
-                concept_count=concept_count,
-                concepts=concepts,
-                relationships=relationships,
-                is_person=is_person  # 保存是否为人物的标记
-            )
-            session.add(graph)
+            rows = []
+            for item in graphs:
+                concepts, relationships = item['concepts'], item['relationships']
+                network_data = item.get('network_data')
+                payload = encode_payload(concepts, relationships, graph_payload_codec) if compact_graph_payload else None
+                graph = KnowledgeGraph(
+                    topic=normalize_topic(item['topic']),
+                    concept_count=item['concept_count'],
+                    concepts=concepts if payload is None else {},
+                    relationships=relationships if payload is None else [],
+                    payload=payload,
+                    is_person=item.get('is_person', 0)  # 保存是否为人物的标记
+                )
+                network_graph = {
+                    'nodes': network_data['nodes'],
+                    'edges': network_data['edges']
+                } if network_data else build_network_graph(concepts, relationships)
+                rows.append((graph, network_graph))
+            session.add_all([graph for graph, _ in rows])
+            session.flush()
+            session.add_all([
+                GraphNetworkData(graph_id=graph.id, version=NETWORK_DATA_VERSION, data=network_graph)
+                for graph, network_graph in rows
+            ])
             session.commit()
-            return graph.id
+            # topic_cache 依赖本模块，在此延迟导入
+            from topic_cache import topic_index
+            for item in graphs:
+                hot_graphs.invalidate(item['topic'], item['concept_count'])
+                # 本进程保存的主题立即可供相近主题匹配，不必等下次增量加载
+                topic_index.add(normalize_topic(item['topic']), item['concept_count'])
+            return [graph.id for graph, _ in rows]
 
     @staticmethod
     def get_best_graph(topic: str, concept_count: int, exclude_ids: List[int] = None) -> Optional[Dict[str, Any]]:
-        with Session() as session:
+        with ReadSession() as session:
             query = session.query(KnowledgeGraph)\
-                .filter(KnowledgeGraph.topic == topic.lower())\
+                .filter(KnowledgeGraph.topic == normalize_topic(topic))\
                 .filter(KnowledgeGraph.concept_count == concept_count)
             
             # 如果有需要排除的图谱ID，确保它们是整数列表
@@ -30,50 +261,219 @@ class DatabaseManager:
                 exclude_ids = [int(id) for id in exclude_ids]
                 query = query.filter(~KnowledgeGraph.id.in_(exclude_ids))
             
-            total_available = query.count()
-            if total_available == 0:
+            return _best_graph(session, query)
+
+    @staticmethod
+    def get_best_larger_graph(topic: str, concept_count: int) -> Optional[Dict[str, Any]]:
+        """
+        获取同一主题节点数量更多的图谱中评分最高的（评分相同时取节点较少的），用于派生较小的图谱；不含网络数据
+        """
+        with ReadSession() as session:
+            graph_id = session.query(KnowledgeGraph.id)\
+                .filter(KnowledgeGraph.topic == normalize_topic(topic))\
+                .filter(KnowledgeGraph.concept_count > concept_count)\
+                .order_by(desc(KnowledgeGraph.score), KnowledgeGraph.concept_count)\
+                .limit(1)\
+                .scalar()
+            if graph_id is None:
                 return None
-            
-            graph = query.order_by(desc(KnowledgeGraph.score)).first()
-            if graph:
-                result = graph.to_dict()
-                result['total_available'] = total_available
-                return result
-            
-            return None
+            return session.get(KnowledgeGraph, graph_id, options=[LOAD_PAYLOAD]).to_dict()
 
     @staticmethod
-    def update_feedback(graph_id: int, is_like: bool) -> Dict[str, Any]:
-        with Session() as session:
-            graph = session.query(KnowledgeGraph).get(graph_id)
+    def get_graph(graph_id: int) -> Optional[Dict[str, Any]]:
+        """
+        按ID获取图谱（含预先计算的网络数据）
+        """
+        with ReadSession() as session:
+            graph = session.get(KnowledgeGraph, graph_id, options=[LOAD_PAYLOAD])
             if not graph:
-                raise ValueError(f"Graph with id {graph_id} not found")
-            
-            if is_like:
-                graph.likes += 1
-            else:
-                graph.dislikes += 1
-            
-            graph.score = graph.likes # - graph.dislikes 可调整，目前只取like数
-            graph.created_at = datetime.now(timezone.utc)
-            session.commit()
-            return graph.to_dict()
+                return None
+            return _graph_dict(session, graph)
+
+    @staticmethod
+    def graph_exists(graph_id: int) -> bool:
+        """
+        图谱是否存在，只查询主键
+        """
+        with ReadSession() as session:
+            return session.query(KnowledgeGraph.id).filter(KnowledgeGraph.id == graph_id).first() is not None
+
+    @staticmethod
+    def get_network_data(graph_id: int) -> Optional[Dict[str, Any]]:
+        """
+        获取图谱预先计算的网络数据
+        """
+        with ReadSession() as session:
+            graph = session.get(KnowledgeGraph, graph_id)
+            if not graph:
+                return None
+            return _network_data(session, graph)
 
     @staticmethod
-    def record_user_view(user_id: str, graph_id: int) -> None:
+    def backfill_network_data(batch_size: int = 500, force: bool = False) -> int:
         """
-        记录用户对某个图谱的查看
+        为没有网络数据或版本过旧的图谱计算并保存网络数据
+        :param force: 是否重新计算所有图谱
+        :return: 计算的图谱数
         """
+        updated = 0
+        last_id = 0
         with Session() as session:
-            # 为避免重复记录，这里可以先检查是否已存在记录
-            exists_view = session.query(UserView).filter(
-                UserView.user_id == user_id,
-                UserView.graph_id == graph_id
-            ).first()
-            if not exists_view:
-                view = UserView(user_id=user_id, graph_id=graph_id)
-                session.add(view)
+            while True:
+                graphs = session.query(KnowledgeGraph)\
+                    .options(LOAD_PAYLOAD)\
+                    .filter(KnowledgeGraph.id > last_id)\
+                    .order_by(KnowledgeGraph.id)\
+                    .limit(batch_size)\
+                    .all()
+                if not graphs:
+                    return updated
+                last_id = graphs[-1].id
+                records = {record.graph_id: record for record in session.query(GraphNetworkData)
+                           .filter(GraphNetworkData.graph_id.in_([graph.id for graph in graphs]))}
+                for graph in graphs:
+                    record = records.get(graph.id)
+                    if force or record is None or record.version != NETWORK_DATA_VERSION:
+                        session.merge(GraphNetworkData(
+                            graph_id=graph.id,
+                            version=NETWORK_DATA_VERSION,
+                            data=build_network_graph(graph.concepts, graph.relationships)
+                        ))
+                        updated += 1
                 session.commit()
+                session.expunge_all()
+
+    @staticmethod
+    def normalize_topics(batch_size: int = 1000) -> int:
+        """
+        把以旧方式（只转小写）保存的图谱主题改为 normalize_topic 规范化后的主题，
+        与主题请求计数、热门图谱缓存使用同一种规范化
+        :return: 修改的图谱数
+        """
+        updated = 0
+        last_id = 0
+        with Session() as session:
+            while True:
+                rows = session.query(KnowledgeGraph.id, KnowledgeGraph.topic)\
+                    .filter(KnowledgeGraph.id > last_id)\
+                    .order_by(KnowledgeGraph.id)\
+                    .limit(batch_size)\
+                    .all()
+                if not rows:
+                    return updated
+                last_id = rows[-1].id
+                changed = [{'id': graph_id, 'topic': normalize_topic(topic)} for graph_id, topic in rows if normalize_topic(topic) != topic]
+                if changed:
+                    session.execute(update(KnowledgeGraph), changed)
+                    session.commit()
+                    updated += len(changed)
+
+    @staticmethod
+    def compact_payloads(batch_size: int = 500, dry_run: bool = False) -> Dict[str, Any]:
+        """
+        把以JSON保存的图谱内容改为紧凑编码，并统计两种格式的存储大小和解码耗时
+        :param dry_run: 只统计，不修改数据库
+        :return: {'graphs': 可编码的图谱数, 'skipped': 无法编码的图谱数, 'already_compact': 已是紧凑编码的图谱数,
+                  'json_bytes', 'compact_bytes', 'json_decode_ms', 'compact_decode_ms'}
+        """
+        stats = dict.fromkeys(('graphs', 'skipped', 'already_compact', 'json_bytes', 'compact_bytes'), 0)
+        stats.update(json_decode_ms=0.0, compact_decode_ms=0.0)
+        last_id = 0
+        with Session() as session:
+            while True:
+                graphs = session.query(KnowledgeGraph)\
+                    .options(LOAD_PAYLOAD)\
+                    .filter(KnowledgeGraph.id > last_id)\
+                    .order_by(KnowledgeGraph.id)\
+                    .limit(batch_size)\
+                    .all()
+                if not graphs:
+                    return stats
+                last_id = graphs[-1].id
+                for graph in graphs:
+                    if graph.payload is not None:
+                        stats['already_compact'] += 1
+                        continue
+                    payload = encode_payload(graph.concepts, graph.relationships, graph_payload_codec)
+                    if payload is None:
+                        stats['skipped'] += 1
+                        continue
+                    # 与JSON列的序列化方式一致，得到原来的存储大小
+                    stored = [json.dumps(graph.concepts), json.dumps(graph.relationships)]
+                    start = time.perf_counter()
+                    for text in stored:
+                        json.loads(text)
+                    stats['json_decode_ms'] += (time.perf_counter() - start) * 1000
+                    start = time.perf_counter()
+                    decode_payload(payload)
+                    stats['compact_decode_ms'] += (time.perf_counter() - start) * 1000
+                    stats['graphs'] += 1
+                    stats['json_bytes'] += sum(len(text.encode('utf-8')) for text in stored)
+                    stats['compact_bytes'] += len(payload)
+                    if not dry_run:
+                        graph.payload = payload
+                        graph.concepts = {}
+                        graph.relationships = []
+                session.commit()
+                session.expunge_all()
+
+    @staticmethod
+    def update_feedback(graph_id: int, is_like: bool) -> Dict[str, Any]:
+        """
+        记录点赞/点踩，等待写入提交后返回更新后的计数 {'id', 'likes', 'dislikes', 'score'}；
+        启用内存合并（feedback_flush_interval > 0）时只计入内存立即返回 {'id', 'pending': True}，
+        计数在下一次定期写入后可见，不存在的图谱在写入时被忽略
+        """
+        if feedback_flush_interval > 0:
+            _feedback.add(graph_id, is_like)
+            return {'id': graph_id, 'pending': True}
+        return _write('feedback', (graph_id, is_like)).result()
+
+    @staticmethod
+    def record_user_view(user_id: str, graph_id: int, wait: bool = False) -> None:
+        """
+        记录用户对某个图谱的查看（依赖 (user_id, graph_id) 唯一索引，重复记录会被忽略）
+        :param wait: 是否等待写入提交；随后需要读到这条记录的调用方应传 True
+        """
+        future = _write('view', (user_id, graph_id))
+        if wait:
+            future.result()
+
+    @staticmethod
+    def record_topic_request(topic: str, concept_count: int) -> None:
+        """
+        记录一次主题生成请求（不等待写入），用于按需求生成预热清单
+        :param topic: 规范化后的主题
+        """
+        _write('demand', (topic, concept_count))
+
+    @staticmethod
+    def get_warm_list(limit: int = 100, min_graphs: int = 1) -> List[tuple]:
+        """
+        获取请求次数最多、但已有图谱少于 min_graphs 个的 (主题, 节点数量)
+        :return: [(主题, 节点数量, 请求次数, 已有图谱数)]，按请求次数从多到少
+        """
+        with ReadSession() as session:
+            cached = session.query(func.count(KnowledgeGraph.id))\
+                .filter(KnowledgeGraph.topic == TopicDemand.topic)\
+                .filter(KnowledgeGraph.concept_count == TopicDemand.concept_count)\
+                .correlate(TopicDemand)\
+                .scalar_subquery()
+            return [tuple(row) for row in session.query(TopicDemand.topic, TopicDemand.concept_count, TopicDemand.requests, cached)
+                    .filter(cached < min_graphs)
+                    .order_by(desc(TopicDemand.requests))
+                    .limit(limit)]
+
+    @staticmethod
+    def count_graphs(topic: str, concept_count: int) -> int:
+        """
+        获取主题和节点数量对应的已有图谱数
+        """
+        with ReadSession() as session:
+            return session.query(func.count(KnowledgeGraph.id))\
+                .filter(KnowledgeGraph.topic == normalize_topic(topic))\
+                .filter(KnowledgeGraph.concept_count == concept_count)\
+                .scalar()
 
     @staticmethod
     def get_user_best_graph(topic: str, concept_count: int, user_id: str) -> Optional[Dict[str, Any]]:
@@ -84,21 +484,11 @@ class DatabaseManager:
             # 查询该用户已查看的图谱ID列表
             subquery = session.query(UserView.graph_id).filter(UserView.user_id == user_id)
             query = session.query(KnowledgeGraph)\
-                .filter(KnowledgeGraph.topic == topic.lower())\
+                .filter(KnowledgeGraph.topic == normalize_topic(topic))\
                 .filter(KnowledgeGraph.concept_count == concept_count)\
                 .filter(~KnowledgeGraph.id.in_(subquery))
             
-            total_available = query.count()
-            if total_available == 0:
-                return None
-            
-            graph = query.order_by(desc(KnowledgeGraph.score)).first()
-            if graph:
-                result = graph.to_dict()
-                result['total_available'] = total_available
-                return result
-            
-            return None
+            return _best_graph(session, query)
 
     @staticmethod
     def get_top_n_graphs(topic: str, concept_count: int, user_id: str, n: int = 3) -> List[Dict[str, Any]]:
@@ -106,26 +496,19 @@ class DatabaseManager:
         获取用户未查看过的前N个最佳图谱
         """
         with Session() as session:
-            # 首先检查该主题和概念数量的总图谱数
-            total_graphs = session.query(KnowledgeGraph)\
-                .filter(KnowledgeGraph.topic == topic.lower())\
-                .filter(KnowledgeGraph.concept_count == concept_count)\
-                .count()
-            print(f"总共找到 {total_graphs} 个符合条件的图谱")
-
             viewed_ids = session.query(UserView.graph_id)\
                 .filter(UserView.user_id == user_id)\
                 .scalar_subquery()
             
             query = session.query(KnowledgeGraph)\
-                .filter(KnowledgeGraph.topic == topic.lower())\
+                .options(LOAD_PAYLOAD)\
+                .filter(KnowledgeGraph.topic == normalize_topic(topic))\
                 .filter(KnowledgeGraph.concept_count == concept_count)\
                 .filter(~KnowledgeGraph.id.in_(viewed_ids))\
                 .order_by(desc(KnowledgeGraph.score))
             
-            graphs = query.limit(n).all()
-            print(f"找到 {len(graphs)} 个未查看的图谱")
-            return [graph.to_dict() for graph in graphs]
+            rows = _with_network_data(query).limit(n).all()
+            return [_graph_dict(session, graph) for graph, _ in rows]
 
     @staticmethod
     def get_viewed_count(topic: str, concept_count: int, user_id: str) -> int:
@@ -135,18 +518,22 @@ class DatabaseManager:
         with Session() as session:
             viewed_graphs = session.query(UserView.graph_id)\
                 .join(KnowledgeGraph, UserView.graph_id == KnowledgeGraph.id)\
-                .filter(KnowledgeGraph.topic == topic.lower())\
+                .filter(KnowledgeGraph.topic == normalize_topic(topic))\
                 .filter(KnowledgeGraph.concept_count == concept_count)\
                 .filter(UserView.user_id == user_id)\
                 .count()
             return viewed_graphs
 
+    @staticmethod
+    def writer_stats() -> Dict[str, Any]:
+        return dict(_writer.stats(), feedback=_feedback.stats())
+
     @staticmethod
     def get_default_graph() -> Optional[Dict[str, Any]]:
         """
-        获取默认的知识图谱（主题为"人工智能"，概念数量为20，评分最高的）
+        获取默认的知识图谱（主题为"人工智能"，概念数量为20，评分最高的），只含网络数据，不含图谱内容
         """
-        with Session() as session:
+        with ReadSession() as session:
             print("正在查询默认图谱...")  # 添加调试日志
             graph = session.query(KnowledgeGraph)\
                 .filter(KnowledgeGraph.topic == "人工智能")\
@@ -157,9 +544,63 @@ class DatabaseManager:
             print(f"查询结果: {'找到图谱' if graph else '未找到图谱'}")  # 添加调试日志
             
             if graph:
-                return graph.to_dict()
+                return _graph_dict(session, graph)
             return None
 
+    @staticmethod
+    def get_graph_topics(after_id: int = 0, limit: int = 10000) -> List[tuple]:
+        """
+        按ID顺序获取图谱的主题和节点数量，供相近主题索引增量加载
+        :param after_id: 只返回ID大于该值的图谱
+        :return: [(图谱ID, 主题, 节点数量)]
+        """
+        with ReadSession() as session:
+            return [tuple(row) for row in session.query(KnowledgeGraph.id, KnowledgeGraph.topic, KnowledgeGraph.concept_count)
+                    .filter(KnowledgeGraph.id > after_id)
+                    .order_by(KnowledgeGraph.id)
+                    .limit(limit)]
+
+    @staticmethod
+    def get_topic_classification(topic: str) -> Optional[Dict[str, Any]]:
+        """
+        获取规范化主题的人物预判记录；没有记录时尝试沿用已有图谱上保存的is_person
+        """
+        with ReadSession() as session:
+            row = session.query(TopicClassification).get(topic)
+            if row:
+                return {
+                    'is_person': bool(row.is_person),
+                    'source': row.source,
+                    'updated_at': row.updated_at
+                }
+            is_person = session.query(KnowledgeGraph.is_person)\
+                .filter(KnowledgeGraph.topic == normalize_topic(topic))\
+                .order_by(desc(KnowledgeGraph.score))\
+                .limit(1)\
+                .scalar()
+            if is_person is None:
+                return None
+            return {
+                'is_person': bool(is_person),
+                'source': 'graph',
+                'updated_at': None
+            }
+
+    @staticmethod
+    def save_topic_classification(topic: str, is_person: bool, source: str = 'llm') -> None:
+        """
+        保存规范化主题的人物预判结果，人工指定的结果不会被模型预判覆盖
+        """
+        with Session() as session:
+            row = session.query(TopicClassification).get(topic)
+            if row is None:
+                session.add(TopicClassification(topic=topic, is_person=int(is_person), source=source))
+            elif source == 'manual' or row.source != 'manual':
+                row.is_person = int(is_person)
+                row.source = source
+                row.updated_at = datetime.utcnow()
+            session.commit()
+
 # 在模块末尾创建数据库表
 from models import Base, engine
 Base.metadata.create_all(engine) 
\ No newline at end of file
@@ -0,0 +1,175 @@
+import atexit
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Tuple
+
+class BackgroundWriter:
+    """
+    后台写入线程：把并发请求提交的小写入（查看记录、点赞/点踩）合并到同一个事务中提交，
+    多个请求线程不再各自争抢数据库写锁。每次提交返回一个 Future，需要读到自己写入结果的调用方可以等待它。
+    """
+    def __init__(self, apply_batch: Callable[[List[Tuple[str, tuple, Future]]], None], interval: float = 0.02, batch_size: int = 500):
+        """
+        :param apply_batch: 在一个事务中执行一批写入的函数，负责设置每个 Future 的结果
+        :param interval: 收到第一条写入后最多再等待多久凑成一批（秒）
+        :param batch_size: 每批最多的写入条数
+        """
+        self.apply_batch = apply_batch
+        self.interval = interval
+        self.batch_size = batch_size
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.writes = 0
+
+    def submit(self, kind: str, args: tuple) -> Future:
+        """
+        提交一条写入
+        :param kind: 写入类型，由 apply_batch 解释
+        :return: 写入提交后完成的 Future
+        """
+        future = Future()
+        self._ensure_started()
+        self._queue.put((kind, args, future))
+        return future
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True, name="db-writer")
+                self._thread.start()
+                atexit.register(self.close)
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.interval
+            stop = False
+            while len(batch) < self.batch_size:
+                # 等待时间用完后仍取走队列中已有的写入
+                timeout = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._apply(batch)
+            if stop:
+                return
+
+    def _apply(self, batch: List[Tuple[str, tuple, Future]]) -> None:
+        try:
+            self.apply_batch(batch)
+        except Exception as e:
+            print(f"批量写入失败: {str(e)}")
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        self.batches += 1
+        self.writes += len(batch)
+
+    def close(self) -> None:
+        """
+        写完队列中剩余的写入后停止后台线程
+        """
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    def stats(self) -> dict:
+        return {
+            'pending': self._queue.qsize(),
+            'batches': self.batches,
+            'writes': self.writes,
+            'avg_batch_size': self.writes / self.batches if self.batches else 0.0
+        }
+
+class FeedbackAggregator:
+    """
+    点赞/点踩的内存合并：短时间内对同一图谱的大量反馈先在内存中累加，
+    由后台线程每隔 interval 秒以一次原子增量写入，请求线程不等待数据库。
+    进程退出前写入剩余的计数，进程崩溃时最多丢失一个周期内的反馈。
+    """
+    def __init__(self, flush: Callable[[Dict[int, Tuple[int, int]]], None], interval: float = 1.0):
+        """
+        :param flush: 写入一批合并计数的函数，参数为 {图谱ID: (点赞数, 点踩数)}
+        :param interval: 写入周期（秒）
+        """
+        self.flush = flush
+        self.interval = interval
+        self._counts: Dict[int, List[int]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.flushes = 0
+        self.events = 0
+
+    def add(self, graph_id: int, is_like: bool) -> None:
+        """
+        计入一条点赞/点踩
+        """
+        self._ensure_started()
+        with self._lock:
+            counts = self._counts.setdefault(graph_id, [0, 0])
+            counts[0 if is_like else 1] += 1
+            self.events += 1
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True, name="feedback-flush")
+                self._thread.start()
+                atexit.register(self.close)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.flush_now()
+        self.flush_now()
+
+    def flush_now(self) -> None:
+        """
+        立即写入已合并的计数；写入失败时计数放回内存，下一周期重试
+        """
+        with self._lock:
+            counts, self._counts = self._counts, {}
+        if not counts:
+            return
+        try:
+            self.flush({graph_id: tuple(pair) for graph_id, pair in counts.items()})
+            self.flushes += 1
+        except Exception as e:
+            print(f"点赞/点踩写入失败: {str(e)}")
+            with self._lock:
+                for graph_id, (likes, dislikes) in counts.items():
+                    pending = self._counts.setdefault(graph_id, [0, 0])
+                    pending[0] += likes
+                    pending[1] += dislikes
+
+    def close(self) -> None:
+        """
+        写入剩余的计数后停止后台线程
+        """
+        if self._thread is not None and self._thread.is_alive():
+            self._stop.set()
+            self._thread.join()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'pending_graphs': len(self._counts),
+                'events': self.events,
+                'flushes': self.flushes
+            }
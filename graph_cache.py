@@ -0,0 +1,174 @@
+import gzip
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Set, Tuple
+from configs import hot_graph_cache_size, hot_graph_ttl, graph_file_cache_size
+from topic_text import normalize_topic
+
+try:
+    import brotli  # 可选依赖，安装后额外提供 br 压缩版本
+except ImportError:
+    brotli = None
+
+class HotGraphCache:
+    """
+    热门图谱缓存：按 (规范化主题, 节点数量) 缓存最佳图谱已编码好的SSE complete 事件字节，
+    命中时不查询数据库、也不再做JSON序列化。
+    图谱被点赞/点踩或同一主题保存了新图谱时失效，TTL 限制多进程部署下的陈旧时间。
+    缓存项的图谱来自其他主题或节点数量（相近主题、派生图谱）时记为该来源的别名，来源失效时一并失效。
+    """
+    def __init__(self, maxsize: int = hot_graph_cache_size, ttl: float = hot_graph_ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple[str, int], tuple]" = OrderedDict()  # key -> (payload, 过期时间戳, 来源key)
+        self._versions: Dict[Tuple[str, int], int] = {}  # 每次失效递增，防止失效前开始的加载写回旧数据
+        self._aliases: Dict[Tuple[str, int], Set[Tuple[str, int]]] = {}  # 来源key -> 使用其图谱的其他key
+        self._invalidations = 0  # 失效总次数，别名项加载期间有任何失效时不写回
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.hit_seconds = 0.0
+        self.miss_seconds = 0.0
+
+    @staticmethod
+    def _key(topic: str, concept_count: int) -> Tuple[str, int]:
+        # 与单飞合并键、人物预判缓存的规范化方式一致
+        return normalize_topic(topic), int(concept_count)
+
+    def _drop(self, key: Tuple[str, int]) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None and entry[2] != key:
+            aliases = self._aliases.get(entry[2])
+            if aliases is not None:
+                aliases.discard(key)
+                if not aliases:
+                    del self._aliases[entry[2]]
+
+    def get(self, topic: str, concept_count: int) -> Optional[bytes]:
+        """
+        只查询进程内缓存，未命中或已过期时返回None
+        """
+        start = time.perf_counter()
+        key = self._key(topic, concept_count)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            payload, expires_at, _ = entry
+            if expires_at <= time.time():
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.hit_seconds += time.perf_counter() - start
+            return payload
+
+    def load(self, topic: str, concept_count: int,
+             build: Callable[[], Tuple[Optional[bytes], Optional[Tuple[str, int]]]]) -> Optional[bytes]:
+        """
+        缓存未命中时调用 build 生成事件字节并写入缓存
+        :param build: 查询数据库并编码 complete 事件的函数，返回 (事件字节, 图谱所属的 (主题, 节点数量))，
+                      没有图谱时返回 (None, None)
+        """
+        start = time.perf_counter()
+        key = self._key(topic, concept_count)
+        with self._lock:
+            version = self._versions.get(key, 0)
+            invalidations = self._invalidations
+        payload, source = build()
+        with self._lock:
+            source_key = self._key(*source) if payload is not None else key
+            fresh = self._versions.get(key, 0) == version and (source_key == key or self._invalidations == invalidations)
+            if payload is not None and fresh:
+                self._drop(key)
+                self._entries[key] = (payload, time.time() + self.ttl, source_key)
+                if source_key != key:
+                    self._aliases.setdefault(source_key, set()).add(key)
+                while len(self._entries) > self.maxsize:
+                    self._drop(next(iter(self._entries)))
+            self.misses += 1
+            self.miss_seconds += time.perf_counter() - start
+        return payload
+
+    def fetch(self, topic: str, concept_count: int,
+              build: Callable[[], Tuple[Optional[bytes], Optional[Tuple[str, int]]]]) -> Optional[bytes]:
+        payload = self.get(topic, concept_count)
+        if payload is None:
+            payload = self.load(topic, concept_count, build)
+        return payload
+
+    def invalidate(self, topic: str, concept_count: int) -> None:
+        """
+        使 (主题, 节点数量) 及使用其图谱的别名缓存项失效
+        """
+        key = self._key(topic, concept_count)
+        with self._lock:
+            self._invalidations += 1
+            for stale in (key, *self._aliases.pop(key, ())):
+                self._drop(stale)
+                self._versions[stale] = self._versions.get(stale, 0) + 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._invalidations += 1
+            for key in self._entries:
+                self._versions[key] = self._versions.get(key, 0) + 1
+            self._entries.clear()
+            self._aliases.clear()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'avg_hit_ms': self.hit_seconds / self.hits * 1000 if self.hits else None,
+                'avg_miss_ms': self.miss_seconds / self.misses * 1000 if self.misses else None
+            }
+
+class EncodedGraphCache:
+    """
+    图谱只读接口的已编码响应缓存：图谱保存后内容不再变化，
+    按图谱ID缓存一次编码好的JSON字节及其 gzip / br 压缩版本，无需失效
+    """
+    def __init__(self, maxsize: int = graph_file_cache_size):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[int, Dict[str, bytes]]" = OrderedDict()  # 图谱ID -> {编码: 字节}
+        self._lock = threading.Lock()
+
+    def __contains__(self, graph_id: int) -> bool:
+        with self._lock:
+            return graph_id in self._entries
+
+    def get(self, graph_id: int, build: Callable[[], Optional[bytes]]) -> Optional[Dict[str, bytes]]:
+        """
+        :param build: 查询图谱并编码为JSON字节的函数，图谱不存在时返回None
+        :return: {'identity': 原始字节, 'gzip': ..., 'br': ...（仅安装 brotli 时）}；图谱不存在时返回None
+        """
+        with self._lock:
+            variants = self._entries.get(graph_id)
+            if variants is not None:
+                self._entries.move_to_end(graph_id)
+                return variants
+        body = build()
+        if body is None:
+            return None
+        variants = {
+            'identity': body,
+            'gzip': gzip.compress(body, compresslevel=9, mtime=0)
+        }
+        if brotli is not None:
+            variants['br'] = brotli.compress(body)
+        with self._lock:
+            self._entries[graph_id] = variants
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return variants
+
+# 进程内共享的热门图谱缓存
+hot_graphs = HotGraphCache()
+# 进程内共享的图谱只读接口响应缓存
+graph_files = EncodedGraphCache()
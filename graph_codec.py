@@ -0,0 +1,82 @@
+"""
+图谱内容（concepts、relationships）的紧凑二进制编码
+概念名称按顺序存为一张节点表，关系存为 (起点, 终点, 关系名) 的整数下标三元组，关系名同样去重，
+整体再用 zstd（安装 zstandard 时）或 zlib 压缩。关系中的每个概念名只存一次，不再逐条重复。
+"""
+import json
+import sys
+import zlib
+from array import array
+from typing import Optional, Tuple
+
+try:
+    import zstandard  # 可选依赖，安装后可使用 zstd 压缩
+except ImportError:
+    zstandard = None
+
+MAGIC = b'TKG'
+FORMAT_VERSION = 1
+
+def encode_payload(concepts: dict, relationships: list, codec: str = "zlib") -> Optional[bytes]:
+    """
+    编码图谱内容
+    :param codec: 压缩方式 "zlib" 或 "zstd"，未安装 zstandard 时使用 zlib
+    :return: 编码后的字节；关系不是由字符串组成的三元组时返回None（调用方应继续使用JSON保存）
+    """
+    names = list(concepts)
+    node_index = {name: i for i, name in enumerate(names)}
+    labels = []
+    label_index = {}
+    edges = array('I')
+    for relationship in relationships:
+        if len(relationship) != 3 or not all(isinstance(part, str) for part in relationship):
+            return None
+        source, target, relation = relationship
+        for name in (source, target):
+            if name not in node_index:
+                # 关系中出现但不在概念中的节点追加在节点表末尾
+                node_index[name] = len(names)
+                names.append(name)
+            edges.append(node_index[name])
+        if relation not in label_index:
+            label_index[relation] = len(labels)
+            labels.append(relation)
+        edges.append(label_index[relation])
+
+    header = json.dumps([names, list(concepts.values()), labels], ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    if sys.byteorder == 'big':
+        edges.byteswap()
+    body = len(header).to_bytes(4, 'little') + header + edges.tobytes()
+
+    if codec == "zstd" and zstandard is not None:
+        return MAGIC + bytes([FORMAT_VERSION]) + b's' + zstandard.ZstdCompressor(level=10).compress(body)
+    return MAGIC + bytes([FORMAT_VERSION]) + b'z' + zlib.compress(body, 9)
+
+def decode_payload(data: bytes) -> Tuple[dict, list]:
+    """
+    解码 encode_payload 的结果
+    :return: (concepts, relationships)
+    """
+    data = bytes(data)
+    if data[:3] != MAGIC or data[3] != FORMAT_VERSION:
+        raise ValueError("无法识别的图谱内容编码")
+    if data[4:5] == b's':
+        if zstandard is None:
+            raise RuntimeError("该图谱内容使用 zstd 压缩，需要安装 zstandard")
+        body = zstandard.ZstdDecompressor().decompress(data[5:])
+    else:
+        body = zlib.decompress(data[5:])
+
+    header_size = int.from_bytes(body[:4], 'little')
+    names, descriptions, labels = json.loads(body[4:4 + header_size].decode('utf-8'))
+    edges = array('I')
+    edges.frombytes(body[4 + header_size:])
+    if sys.byteorder == 'big':
+        edges.byteswap()
+
+    concepts = dict(zip(names, descriptions))
+    relationships = [
+        [names[edges[i]], names[edges[i + 1]], labels[edges[i + 2]]]
+        for i in range(0, len(edges), 3)
+    ]
+    return concepts, relationships
@@ -0,0 +1,118 @@
+"""
+服务商批处理接口（OpenAI 兼容的 /files 与 /batches）：把大量请求写成一个 JSONL 文件提交，
+服务商离线处理后一次取回结果，不占用在线请求的限额
+"""
+import json
+import time
+from typing import Dict, Optional, Tuple
+from configs import client, batch_completion_window
+from utils import chat_request
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+# 批处理的终止状态，其余状态（validating、in_progress、finalizing 等）需要继续等待
+FINISHED_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+def build_batch_file(requests: Dict[str, list], model: str) -> bytes:
+    """
+    构造批处理输入文件
+    :param requests: 请求ID -> 消息列表
+    :return: JSONL 文件内容，每行一个请求
+    """
+    lines = [
+        json.dumps({
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": BATCH_ENDPOINT,
+            "body": chat_request(model, messages)
+        }, ensure_ascii=False)
+        for custom_id, messages in requests.items()
+    ]
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+def submit_batch(requests: Dict[str, list], model: str, name: str = "batch") -> str:
+    """
+    上传输入文件并创建批处理
+    :param name: 输入文件名，便于在服务商后台辨认
+    :return: 批处理ID
+    """
+    ai_client = client(model)
+    input_file = ai_client.files.create(
+        file=(f"{name}.jsonl", build_batch_file(requests, model), "application/jsonl"),
+        purpose="batch"
+    )
+    batch = ai_client.batches.create(
+        input_file_id=input_file.id,
+        endpoint=BATCH_ENDPOINT,
+        completion_window=batch_completion_window,
+        metadata={"name": name}
+    )
+    print(f"已提交批处理 {batch.id}（{name}，{len(requests)} 个请求）")
+    return batch.id
+
+def wait_for_batch(batch_id: str, model: str, poll_interval: float = 60, timeout: Optional[float] = None):
+    """
+    轮询批处理状态直到结束
+    :param timeout: 最长等待时间（秒），为None时一直等待
+    :return: 结束时的批处理对象
+    """
+    ai_client = client(model)
+    deadline = time.time() + timeout if timeout is not None else None
+    last_status = None
+    while True:
+        batch = ai_client.batches.retrieve(batch_id)
+        counts = batch.request_counts
+        status = (batch.status, counts.completed, counts.failed) if counts else (batch.status,)
+        if status != last_status:
+            progress = f"，完成 {counts.completed}/{counts.total}，失败 {counts.failed}" if counts else ""
+            print(f"批处理 {batch_id}: {batch.status}{progress}")
+            last_status = status
+        if batch.status in FINISHED_STATUSES:
+            return batch
+        if deadline is not None and time.time() >= deadline:
+            raise TimeoutError(f"等待批处理 {batch_id} 超时")
+        time.sleep(poll_interval)
+
+def read_batch_results(batch, model: str) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """
+    下载批处理的输出文件和错误文件
+    :return: (请求ID -> 回复文本, 请求ID -> 错误信息)；没有出现在两者中的请求视为未完成
+    """
+    ai_client = client(model)
+    results, errors = {}, {}
+    for file_id in (batch.output_file_id, batch.error_file_id):
+        if not file_id:
+            continue
+        for line in ai_client.files.content(file_id).text.splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            custom_id = record["custom_id"]
+            response = record.get("response") or {}
+            if record.get("error"):
+                errors[custom_id] = record["error"].get("message", str(record["error"]))
+            elif response.get("status_code") != 200:
+                errors[custom_id] = f"HTTP {response.get('status_code')}: {response.get('body')}"
+            else:
+                results[custom_id] = response["body"]["choices"][0]["message"]["content"]
+    return results, errors
+
+def run_batch(requests: Dict[str, list], model: str, name: str = "batch", batch_id: Optional[str] = None,
+              poll_interval: float = 60, on_submit=None) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """
+    提交批处理（或继续等待已提交的批处理）并取回结果
+    :param batch_id: 已提交的批处理ID，中断后继续时传入，不再重复提交
+    :param on_submit: 提交后以批处理ID调用，用于记录进度
+    :return: 同 read_batch_results
+    """
+    if not requests:
+        return {}, {}
+    if batch_id is None:
+        batch_id = submit_batch(requests, model, name)
+        if on_submit:
+            on_submit(batch_id)
+    batch = wait_for_batch(batch_id, model, poll_interval)
+    results, errors = read_batch_results(batch, model)
+    for custom_id in requests:
+        if custom_id not in results and custom_id not in errors:
+            errors[custom_id] = f"批处理 {batch.status}，未返回结果"
+    return results, errors
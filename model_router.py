@@ -0,0 +1,133 @@
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterable, List, Optional
+from configs import model, backup_models, breaker_failure_threshold, breaker_rate_limit_cooldown, breaker_error_cooldown, breaker_max_cooldown
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class ModelHealth:
+    """
+    单个模型的健康状态：滚动窗口内的延迟与错误统计，以及熔断器状态
+    """
+    def __init__(self, name: str, window: int = 50):
+        self.name = name
+        self.samples = deque(maxlen=window)  # (延迟秒数, 是否成功, 是否限流)
+        self.state = CLOSED
+        self.open_until = 0.0
+        self.cooldown = 0.0
+        self.consecutive_failures = 0
+        self.probe_in_flight = False
+        self.total_requests = 0
+        self.total_errors = 0
+
+    def available(self, now: float) -> bool:
+        """
+        熔断器是否允许发出请求；冷却结束后进入半开状态，只放行一个探测请求
+        """
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and now >= self.open_until:
+            self.state = HALF_OPEN
+            self.probe_in_flight = False
+        if self.state == HALF_OPEN and not self.probe_in_flight:
+            return True
+        return False
+
+    def trip(self, cooldown: float, now: float) -> None:
+        # 半开探测失败时冷却时间翻倍
+        if self.state == HALF_OPEN:
+            cooldown = min(max(cooldown, self.cooldown * 2), breaker_max_cooldown)
+        self.state = OPEN
+        self.cooldown = cooldown
+        self.open_until = now + cooldown
+        self.probe_in_flight = False
+
+    def stats(self) -> Dict[str, object]:
+        total = len(self.samples)
+        latencies = [latency for latency, ok, _ in self.samples if ok]
+        return {
+            'state': self.state,
+            'requests': total,
+            'total_requests': self.total_requests,
+            'total_errors': self.total_errors,
+            'error_rate': sum(1 for _, ok, _ in self.samples if not ok) / total if total else 0.0,
+            'rate_limit_rate': sum(1 for _, _, limited in self.samples if limited) / total if total else 0.0,
+            'avg_latency': sum(latencies) / len(latencies) if latencies else None,
+            'open_for': max(self.open_until - time.time(), 0) if self.state == OPEN else 0
+        }
+
+class ModelRouter:
+    """
+    按请求选择模型：优先使用首选模型，熔断时按顺序使用备选模型，首选模型恢复后自动切回。
+    所有状态都在锁内更新，多个请求线程可以安全共享同一个路由器。
+    """
+    def __init__(self, preferred: str = model, backups: Iterable[str] = backup_models):
+        self.models: List[str] = list(dict.fromkeys([preferred, *backups]))
+        self._health = {name: ModelHealth(name) for name in self.models}
+        self._lock = threading.Lock()
+
+    def choose(self, exclude: Iterable[str] = ()) -> Optional[str]:
+        """
+        选择本次请求使用的模型
+        :param exclude: 本次请求已经尝试过的模型
+        :return: 模型名称；排除后没有可用模型时返回None
+        """
+        exclude = set(exclude)
+        now = time.time()
+        with self._lock:
+            candidates = [name for name in self.models if name not in exclude]
+            for name in candidates:
+                health = self._health[name]
+                if health.available(now):
+                    if health.state == HALF_OPEN:
+                        health.probe_in_flight = True
+                    return name
+            if exclude or not candidates:
+                return None
+            # 所有模型都在熔断中时，选择最早结束冷却的模型，而不是直接拒绝请求
+            return min(candidates, key=lambda name: self._health[name].open_until)
+
+    def record_success(self, name: str, latency: float) -> None:
+        with self._lock:
+            health = self._health[name]
+            health.samples.append((latency, True, False))
+            health.total_requests += 1
+            health.consecutive_failures = 0
+            if health.state != CLOSED:
+                print(f"模型 {name} 已恢复")
+            health.state = CLOSED
+            health.cooldown = 0.0
+            health.probe_in_flight = False
+
+    def record_failure(self, name: str, rate_limited: bool = False) -> None:
+        now = time.time()
+        with self._lock:
+            health = self._health[name]
+            health.samples.append((0.0, False, rate_limited))
+            health.total_requests += 1
+            health.total_errors += 1
+            health.consecutive_failures += 1
+            if rate_limited:
+                health.trip(breaker_rate_limit_cooldown, now)
+            elif health.state == HALF_OPEN or health.consecutive_failures >= breaker_failure_threshold:
+                health.trip(breaker_error_cooldown, now)
+
+    def release_probe(self, name: str) -> None:
+        """
+        选中的模型没有发出请求（如服务商排队超时、调用被取消）时调用：归还半开状态的探测机会，
+        否则该模型会一直处于半开状态而不再被选中
+        """
+        with self._lock:
+            health = self._health[name]
+            if health.state == HALF_OPEN:
+                health.probe_in_flight = False
+
+    def stats(self) -> Dict[str, Dict[str, object]]:
+        with self._lock:
+            return {name: self._health[name].stats() for name in self.models}
+
+# 进程内共享的模型路由器
+model_router = ModelRouter()
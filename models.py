@@ -1,34 +1,100 @@
+import itertools
+import os
 from datetime import datetime, timezone
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, JSON, Float
+from sqlalchemy import create_engine, event, Column, Integer, String, DateTime, JSON, Float, Index, LargeBinary, inspect, text
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, deferred, Load
+from sqlalchemy.orm.attributes import set_committed_value
 from typing import Dict, Any
+from graph_codec import decode_payload
+from configs import sqlite_journal_mode, sqlite_synchronous, sqlite_busy_timeout, db_pool_size, db_max_overflow, db_pool_recycle, database_url, database_replica_urls
 
 Base = declarative_base()
-engine = create_engine('sqlite:///knowledge_graphs.db')
+
+# 图谱内容等JSON列：PostgreSQL 上使用 JSONB，其余数据库使用通用JSON类型
+JSONType = JSON().with_variant(JSONB(), 'postgresql')
+
+DATABASE_URL = os.getenv('DATABASE_URL', database_url)
+DATABASE_REPLICA_URLS = [url for url in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if url] or database_replica_urls
+
+def _configure_sqlite(dbapi_connection, connection_record):
+    # WAL 模式下读不阻塞写、写不阻塞读；锁冲突时等待 busy_timeout 而不是立即报错
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={sqlite_journal_mode}")
+    cursor.execute(f"PRAGMA synchronous={sqlite_synchronous}")
+    cursor.execute(f"PRAGMA busy_timeout={sqlite_busy_timeout}")
+    cursor.close()
+
+def create_db_engine(url: str):
+    """
+    按数据库URL创建引擎，连接池按请求线程数设置，连接可在线程间复用
+    """
+    if url.startswith('sqlite'):
+        db_engine = create_engine(
+            url,
+            pool_size=db_pool_size,
+            max_overflow=db_max_overflow,
+            connect_args={'timeout': sqlite_busy_timeout / 1000, 'check_same_thread': False}
+        )
+        event.listen(db_engine, 'connect', _configure_sqlite)
+        return db_engine
+    return create_engine(
+        url,
+        pool_size=db_pool_size,
+        max_overflow=db_max_overflow,
+        pool_pre_ping=True,
+        pool_recycle=db_pool_recycle
+    )
+
+engine = create_db_engine(DATABASE_URL)
 Session = sessionmaker(bind=engine)
 
+# 只读副本：只用于可以容忍复制延迟的查询，未配置时使用主库
+read_engines = [create_db_engine(url) for url in DATABASE_REPLICA_URLS] or [engine]
+_read_sessionmakers = itertools.cycle([sessionmaker(bind=read_engine) for read_engine in read_engines])
+
+def ReadSession():
+    """
+    创建只读会话，多个只读副本之间轮流使用
+    """
+    return next(_read_sessionmakers)()
+
 class KnowledgeGraph(Base):
     __tablename__ = 'knowledge_graphs'
     
     id = Column(Integer, primary_key=True)
     topic = Column(String, index=True, nullable=False)
     concept_count = Column(Integer, nullable=False)
-    concepts = Column(JSON, nullable=False)
-    relationships = Column(JSON, nullable=False)
+    # 图谱内容体积大，默认不随查询加载；需要返回内容的查询用 LOAD_PAYLOAD 显式加载
+    concepts = deferred(Column(JSONType, nullable=False), group='payload')
+    relationships = deferred(Column(JSONType, nullable=False), group='payload')
+    # 紧凑编码的图谱内容（见 graph_codec），有值时 concepts、relationships 列只存空占位，加载时自动解码
+    payload = deferred(Column(LargeBinary, nullable=True), group='payload')
     likes = Column(Integer, default=0)
     dislikes = Column(Integer, default=0)
     score = Column(Float, default=0)  # likes - dislikes
     is_person = Column(Integer, default=0)  # 添加是否为人物的标记，0表示否，1表示是
     created_at = Column(DateTime, default=datetime.now(timezone.utc))
     
+    __table_args__ = (
+        # 所有图谱查询都按 (主题, 节点数量) 过滤并按评分排序
+        Index('ix_knowledge_graphs_topic_count_score', 'topic', 'concept_count', text('score DESC')),
+    )
+    
     def to_dict(self) -> Dict[str, Any]:
+        """
+        转为字典；图谱内容（concepts、relationships）只在查询时已加载的情况下包含，不会为此逐条补查
+        """
+        payload = {} if 'concepts' in inspect(self).unloaded else {
+            'concepts': self.concepts,
+            'relationships': self.relationships
+        }
         return {
             'id': self.id,
             'topic': self.topic,
             'concept_count': self.concept_count,
-            'concepts': self.concepts,
-            'relationships': self.relationships,
+            **payload,
             'likes': self.likes,
             'dislikes': self.dislikes,
             'score': self.score,
@@ -37,6 +103,22 @@ class KnowledgeGraph(Base):
             'is_like': bool(self.likes > self.dislikes) if hasattr(self, 'is_like') else None
         }
 
+@event.listens_for(KnowledgeGraph, 'load')
+@event.listens_for(KnowledgeGraph, 'refresh')
+def _decode_payload(graph, context, attrs=None):
+    # 加载到紧凑编码时解码为 concepts、relationships，不标记为已修改
+    if attrs is not None and 'payload' not in attrs:
+        return
+    if 'payload' in inspect(graph).unloaded or graph.payload is None:
+        return
+    concepts, relationships = decode_payload(graph.payload)
+    set_committed_value(graph, 'concepts', concepts)
+    set_committed_value(graph, 'relationships', relationships)
+
+# 查询选项：随图谱一并加载内容（concepts、relationships），或只加载概念
+LOAD_PAYLOAD = Load(KnowledgeGraph).undefer_group('payload')
+LOAD_CONCEPTS = Load(KnowledgeGraph).undefer(KnowledgeGraph.concepts).undefer(KnowledgeGraph.payload)
+
 class UserView(Base):
     __tablename__ = 'user_views'
     
@@ -44,6 +126,71 @@ class UserView(Base):
     user_id = Column(String, index=True, nullable=False)  # UUID
     graph_id = Column(Integer, nullable=False)
     viewed_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        # 同一用户对同一图谱只记录一次查看，记录时使用 upsert
+        Index('uq_user_views_user_graph', 'user_id', 'graph_id', unique=True),
+        Index('ix_user_views_graph_id', 'graph_id'),
+    )
+
+class TopicClassification(Base):
+    __tablename__ = 'topic_classifications'
+    
+    topic = Column(String, primary_key=True)  # 规范化后的主题
+    is_person = Column(Integer, nullable=False)  # 0表示否，1表示是
+    source = Column(String, nullable=False, default='llm')  # llm: 模型预判，graph: 来自已有图谱，manual: 人工指定（不过期）
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class TopicDemand(Base):
+    __tablename__ = 'topic_demand'
+    
+    topic = Column(String, primary_key=True)  # 规范化后的主题
+    concept_count = Column(Integer, primary_key=True)
+    requests = Column(Integer, nullable=False, default=0)  # 请求生成的次数（包括命中缓存的请求）
+    last_requested_at = Column(DateTime, default=datetime.utcnow)
+
+class GraphNetworkData(Base):
+    __tablename__ = 'graph_network_data'
+    
+    graph_id = Column(Integer, primary_key=True)  # 对应 knowledge_graphs.id
+    version = Column(Integer, nullable=False)  # 计算规则版本，见 network.NETWORK_DATA_VERSION
+    data = Column(JSONType, nullable=False)  # 预先计算的节点与边 {'nodes': [...], 'edges': [...]}
+
+def ensure_columns() -> None:
+    """
+    为已有数据库补建新增的可空列（create_all 不会修改已存在的表）
+    """
+    existing = {column['name'] for column in inspect(engine).get_columns(KnowledgeGraph.__tablename__)}
+    for column in KnowledgeGraph.__table__.columns:
+        if column.name in existing:
+            continue
+        print(f"正在添加列 {column.name}...")
+        with engine.begin() as connection:
+            connection.execute(text(
+                f"ALTER TABLE {KnowledgeGraph.__tablename__} ADD COLUMN {column.name} {column.type.compile(engine.dialect)}"
+            ))
+
+def ensure_indexes() -> None:
+    """
+    为已有数据库补建索引（create_all 只会为新建的表创建索引）；
+    建唯一索引前先删除重复的查看记录，只保留最早的一条
+    """
+    inspector = inspect(engine)
+    for table in (KnowledgeGraph.__table__, UserView.__table__):
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+            if index.name == 'uq_user_views_user_graph':
+                with engine.begin() as connection:
+                    connection.execute(text(
+                        "DELETE FROM user_views WHERE id NOT IN "
+                        "(SELECT MIN(id) FROM user_views GROUP BY user_id, graph_id)"
+                    ))
+            print(f"正在创建索引 {index.name}...")
+            index.create(engine)
 
 # 创建数据库表
-Base.metadata.create_all(engine) 
\ No newline at end of file
+Base.metadata.create_all(engine)
+ensure_columns()
+ensure_indexes() 
\ No newline at end of file
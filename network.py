@@ -0,0 +1,223 @@
+"""
+知识图谱的 vis-network 网络数据：节点、边与样式配置
+图谱保存后节点和边不再变化，由 database 在保存时计算一次并持久化
+"""
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+# 网络数据（节点与边）的计算规则版本，规则变化时递增，旧版本的持久化数据会被重新计算
+NETWORK_DATA_VERSION = 1
+
+# 定义层级颜色（使用 Google Material Design 配色）
+COLOR_SCHEME = {
+    "root": "#4285F4",     # Google Blue - 根节点
+    "level1": "#EA4335",   # Google Red - 一级节点
+    "level2": "#FBBC05",   # Google Yellow - 二级节点
+    "level3": "#34A853",   # Google Green - 三级节点
+    "level4": "#673AB7",   # Purple - 四级节点
+    "level5": "#FF7043"    # Deep Orange - 五级节点
+}
+
+# 网络配置选项，所有图谱共用
+NETWORK_OPTIONS = {
+    "nodes": {
+        "shape": "dot",
+        "size": 25,
+        "font": {
+            "face": "NotoSansHans-Regular",
+            "size": 14,
+            "multi": True
+        }
+    },
+    "edges": {
+        "font": {
+            "face": "NotoSansHans-Regular",
+            "size": 12
+        },
+        "smooth": {
+            "type": "curvedCW",
+            "roundness": 0.2
+        },
+        "width": 2
+    },
+    "physics": {
+        "barnesHut": {
+            "gravitationalConstant": -30000,
+            "springLength": 150,
+            "springConstant": 0.04,
+            "centralGravity": 0.3,
+            "damping": 0.09
+        }
+    },
+    "interaction": {
+        "hover": True,
+        "zoomView": True
+    },
+    "layout": {
+        "randomSeed": 42
+    }
+}
+
+def format_label(text: str) -> str:
+    """
+    格式化标签文本，如果存在括号，则处理括号内的英文部分
+    """
+    if " (" not in text:
+        return text
+
+    # 只拆分一次，避免额外的 " (" 导致多个元素
+    chinese, english_with_paren = text.split(" (", 1)
+    english = english_with_paren.rstrip(")")
+
+    # 以逗号拆分，若正好拆分为两个部分则进行特殊格式化，否则直接返回换行格式
+    parts = english.split(", ")
+    if len(parts) == 2:
+        full_english, abbr = parts
+        return f"{chinese} {abbr}\n{full_english}"
+    else:
+        # 如果拆分的部分不等于2，则直接返回 "中文\n英文"
+        return f"{chinese}\n{english}"
+
+def degree_index(relationships: list) -> Tuple[Dict[str, int], Dict[str, int]]:
+    """
+    一次遍历关系，统计每个节点的入度（被指向次数）和出度（指向其他节点次数）
+    :return: (入度字典, 出度字典)，未出现的节点不在字典中
+    """
+    in_degree = Counter(rel[1] for rel in relationships)
+    out_degree = Counter(rel[0] for rel in relationships)
+    return in_degree, out_degree
+
+def concept_names(concept: str) -> List[str]:
+    """
+    概念名称中的各个叫法（小写）："中文名称 (英文全称, 缩写)" -> [完整名称, 中文名称, 英文全称, 缩写]
+    """
+    names = [concept.lower(), concept.split(" (", 1)[0].lower()]
+    if " (" in concept:
+        names += [part.strip().lower() for part in concept.split(" (", 1)[1].rstrip(")").split(",")]
+    return names
+
+def pagerank(nodes: list, relationships: list, damping: float = 0.85, iterations: int = 50) -> Dict[str, float]:
+    """
+    在关系构成的无向图上计算各节点的 PageRank（图谱只有几十个节点，直接迭代）
+    """
+    neighbors = {node: set() for node in nodes}
+    for source, target, _ in relationships:
+        if source in neighbors and target in neighbors and source != target:
+            neighbors[source].add(target)
+            neighbors[target].add(source)
+    size = len(nodes)
+    rank = dict.fromkeys(nodes, 1 / size)
+    for _ in range(iterations):
+        # 没有关系的节点把得分平均分给所有节点
+        dangling = sum(rank[node] for node in nodes if not neighbors[node])
+        base = (1 - damping) / size + damping * dangling / size
+        rank = {node: base + damping * sum(rank[other] / len(neighbors[other]) for other in neighbors[node]) for node in nodes}
+    return rank
+
+def derive_graph(concepts: dict, relationships: list, count: int, topic: Optional[str] = None) -> Tuple[dict, list]:
+    """
+    从较大的图谱中派生出只有 count 个概念的图谱：保留主题本身对应的根概念，
+    按 PageRank 从高到低优先加入与已选概念有关系的概念，使派生的图谱保持连通，只保留所选概念之间的关系
+    :param topic: 主题，用于确定根概念；找不到对应概念时以 PageRank 最高的概念为根
+    :return: (concepts, relationships)，概念保持原有顺序
+    """
+    relationships = [rel for rel in relationships if len(rel) == 3 and rel[0] in concepts and rel[1] in concepts]
+    rank = pagerank(list(concepts), relationships)
+    ranked = sorted(concepts, key=lambda concept: -rank[concept])
+    root = ranked[0]
+    if topic is not None:
+        topic = topic.strip().lower()
+        root = next((concept for concept in concepts if topic in concept_names(concept)), root)
+
+    neighbors = {concept: set() for concept in concepts}
+    for source, target, _ in relationships:
+        neighbors[source].add(target)
+        neighbors[target].add(source)
+    order = {concept: i for i, concept in enumerate(concepts)}
+    selected = {root}
+    frontier = set(neighbors[root])
+    while len(selected) < min(count, len(concepts)):
+        # 图谱不连通时从剩余概念中取 PageRank 最高的
+        candidates = frontier - selected or set(concepts) - selected
+        chosen = max(candidates, key=lambda concept: (rank[concept], -order[concept]))
+        selected.add(chosen)
+        frontier |= neighbors[chosen]
+
+    return (
+        {concept: description for concept, description in concepts.items() if concept in selected},
+        [rel for rel in relationships if rel[0] in selected and rel[1] in selected]
+    )
+
+def build_network_graph(concepts: dict, relationships: list) -> Dict[str, list]:
+    """
+    计算图谱的节点和边（持久化的部分）
+    :return: {'nodes': [...], 'edges': [...]}
+    """
+    # 一次遍历关系建立入度/出度索引，再按度数确定节点层级
+    in_degree, out_degree = degree_index(relationships)
+
+    def determine_level(node_id):
+        in_count = in_degree.get(node_id, 0)
+        out_count = out_degree.get(node_id, 0)
+        if in_count == 0:  # 如果节点没有被指向，则为根节点
+            return "root"
+        elif out_count == 0:  # 如果节点不指向其他节点，则为最底层
+            return "level5"
+        elif in_count > out_count:
+            return "level4"
+        elif in_count == out_count:
+            return "level3"
+        else:
+            return "level2"
+
+    nodes = []
+    edges = []
+
+    # 创建节点
+    for concept, description in concepts.items():
+        level = determine_level(concept)
+        nodes.append({
+            'id': concept,
+            'label': format_label(concept),
+            'color': {
+                'background': COLOR_SCHEME[level],
+                'highlight': {
+                    'background': COLOR_SCHEME[level]
+                }
+            },
+            'explanation': description
+        })
+
+    # 创建边
+    for source, target, relation in relationships:
+        edges.append({
+            'from': source,
+            'to': target,
+            'label': relation,
+            'smooth': {
+                'type': 'curvedCW',
+                'roundness': 0.2
+            }
+        })
+
+    return {
+        'nodes': nodes,
+        'edges': edges
+    }
+
+def with_style(network_graph: Dict[str, list]) -> Dict[str, Any]:
+    """
+    为节点和边加上共用的网络配置与颜色方案，得到前端使用的完整网络数据
+    """
+    return {
+        'nodes': network_graph['nodes'],
+        'edges': network_graph['edges'],
+        'options': NETWORK_OPTIONS,
+        'color_scheme': COLOR_SCHEME  # 添加颜色方案以供前端使用
+    }
+
+def create_network_data(concepts: dict, relationships: list) -> Dict[str, Any]:
+    """
+    创建网络数据
+    """
+    return with_style(build_network_graph(concepts, relationships))
@@ -0,0 +1,105 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from configs import generation_strategy, pipeline_batch_size
+from utils import generate_relationships, generate_cross_relationships
+from typing import Dict, List
+
+# 流水线模式下后台推断关系的线程池，所有请求共享
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="relationships")
+
+class SequentialRelationships:
+    """
+    顺序策略：忽略流式到达的概念，在概念全部生成后一次性生成关系
+    """
+    def __init__(self, is_person: bool = False):
+        self.is_person = is_person
+
+    def add(self, concept: str, description: str) -> None:
+        pass
+
+    def finish(self, concepts: Dict[str, str]) -> list:
+        return generate_relationships(concepts, self.is_person)
+
+class PipelinedRelationships:
+    """
+    流水线策略：概念还在流式生成时，每凑满一批就提交到后台线程推断批内关系；
+    概念全部生成后补齐最后一批，并通过一次合并调用补充跨批次的关系。
+    """
+    def __init__(self, is_person: bool = False, batch_size: int = pipeline_batch_size):
+        self.is_person = is_person
+        self.batch_size = batch_size
+        self._pending: Dict[str, str] = {}
+        self._batches: List[List[str]] = []
+        self._futures = []
+
+    def add(self, concept: str, description: str) -> None:
+        """
+        接收一个已完整生成的概念，凑满一批后立即开始推断关系
+        """
+        self._pending[concept] = description
+        if len(self._pending) >= self.batch_size:
+            self._submit()
+
+    def _submit(self) -> None:
+        batch = self._pending
+        self._pending = {}
+        self._batches.append(list(batch))
+        # 线程池不会带上调用方的上下文，复制一份使排队通知（rate_limit.queue_listener）送到发起生成的请求
+        self._futures.append(_executor.submit(contextvars.copy_context().run, generate_relationships, batch, self.is_person))
+
+    def finish(self, concepts: Dict[str, str]) -> list:
+        """
+        等待所有批次完成并合并结果
+        :param concepts: 最终解析得到的完整概念字典
+        :return: 关系列表
+        """
+        # 增量解析失败时概念可能没有经过 add，这里补齐遗漏的概念
+        submitted = {name for batch in self._batches for name in batch}
+        for concept, description in concepts.items():
+            if concept not in submitted and concept not in self._pending:
+                self._pending[concept] = description
+        if self._pending:
+            # 剩余不足一批的概念作为最后一批提交
+            self._submit()
+
+        try:
+            batch_relations = [future.result() for future in self._futures]
+        except Exception as e:
+            print(f"分批生成关系失败，回退到顺序生成: {str(e)}")
+            return generate_relationships(concepts, self.is_person)
+
+        relationships = _merge_relations(concepts, [], *batch_relations)
+        if len(self._batches) > 1:
+            groups = [[name for name in batch if name in concepts] for batch in self._batches]
+            try:
+                cross = generate_cross_relationships(groups, relationships, self.is_person)
+                relationships = _merge_relations(concepts, relationships, cross)
+            except Exception as e:
+                print(f"补充跨批次关系失败，仅使用批内关系: {str(e)}")
+        return relationships
+
+def _merge_relations(concepts: Dict[str, str], base: list, *relation_lists: list) -> list:
+    """
+    合并关系列表，去掉端点不在概念字典中的关系以及重复的 (源, 目标) 对
+    """
+    merged = list(base)
+    seen = {(source, target) for source, target, _ in merged}
+    for relations in relation_lists:
+        for source, target, relation in relations:
+            if source not in concepts or target not in concepts or (source, target) in seen:
+                continue
+            seen.add((source, target))
+            merged.append([source, target, relation])
+    return merged
+
+def relationship_builder(is_person: bool = False, strategy: str = None):
+    """
+    根据配置的生成策略创建关系构建器
+    :param strategy: "sequential" 或 "pipelined"，默认使用 configs 中的 generation_strategy
+    """
+    strategy = strategy or generation_strategy
+    if strategy == "pipelined":
+        return PipelinedRelationships(is_person)
+    if strategy == "sequential":
+        return SequentialRelationships(is_person)
+    raise ValueError(f"Unsupported generation strategy: {strategy}")
@@ -0,0 +1,380 @@
+"""
+图谱预生成：在用户请求之前为热门主题生成图谱，首个用户不必等待几分钟
+用法：python prewarm.py <子命令> [参数]
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Set, Tuple
+from configs import batch_model, batch_poll_interval
+from database import DatabaseManager
+from llm_batch import run_batch
+from rate_limit import provider_limits
+from topic_cache import person_cache
+from utils import generate_concepts, generate_relationships, create_network_data, parse_json_response, pre_judge_person, check_content_filter, \
+    prejudge_messages, parse_person_verdict, concept_messages, relationship_messages, extract_relations
+
+def generate_and_save(topic: str, count: int) -> int:
+    """
+    使用与在线请求相同的流程生成图谱并保存
+    :return: 图谱ID
+    """
+    is_person = pre_judge_person(topic)
+    text = ''.join(generate_concepts(topic, count, is_person, True))
+    if "[[CONTENT_FILTERED]]" in text:
+        raise ValueError("生成内容被过滤")
+    concepts = parse_json_response(text, error_context=f"处理主体 '{topic}' 的节点生成结果时")
+    relationships = generate_relationships(concepts, is_person)
+    network_data = create_network_data(concepts, relationships)
+    return DatabaseManager.save_knowledge_graph(
+        topic=topic,
+        concept_count=count,
+        concepts=concepts,
+        relationships=relationships,
+        is_person=is_person,
+        network_data=network_data
+    )
+
+def read_jobs(path: str, default_count: int = 10) -> List[Tuple[str, int]]:
+    """
+    读取任务文件：每行一个主题，可用制表符附带节点数量，之后的列被忽略
+    """
+    jobs = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            columns = line.rstrip('\n').split('\t')
+            if columns[0].strip():
+                jobs.append((columns[0].strip(), int(columns[1]) if len(columns) > 1 and columns[1] else default_count))
+    return jobs
+
+class PrewarmWorker:
+    """
+    预生成任务执行器：有限并发地生成图谱，失败的任务按指数退避重试，
+    每个任务完成后追加写入检查点文件，中断后重新运行会跳过已完成的任务
+    """
+    def __init__(self, concurrency: int = 4, retries: int = 3, checkpoint: str = None, min_graphs: int = 1, force: bool = False, generate=generate_and_save):
+        """
+        :param concurrency: 同时进行的生成数
+        :param retries: 每个任务失败后的最多重试次数
+        :param checkpoint: 检查点文件路径（JSON Lines），为None时不记录
+        :param min_graphs: 已有图谱达到该数量的主题跳过
+        :param force: 是否不论已有多少图谱都生成
+        :param generate: 生成并保存图谱的函数 (主题, 节点数量) -> 图谱ID
+        """
+        self.concurrency = concurrency
+        self.retries = retries
+        self.checkpoint = checkpoint
+        self.min_graphs = min_graphs
+        self.force = force
+        self.generate = generate
+        self._lock = threading.Lock()
+        self.counts = {'done': 0, 'failed': 0, 'skipped': 0}
+
+    def completed(self) -> Set[Tuple[str, int]]:
+        """
+        读取检查点中已完成的任务
+        """
+        done = set()
+        if self.checkpoint and os.path.exists(self.checkpoint):
+            with open(self.checkpoint, encoding='utf-8') as f:
+                for line in f:
+                    record = json.loads(line)
+                    if record['status'] in ('done', 'skipped'):
+                        done.add((record['topic'], record['count']))
+        return done
+
+    def recently_failed(self, cooldown: float) -> Set[Tuple[str, int]]:
+        """
+        读取检查点中最近一次记录为失败（或主题被过滤）、且记录时间在 cooldown 秒之内的任务
+        """
+        failed = {}
+        since = time.time() - cooldown
+        if self.checkpoint and os.path.exists(self.checkpoint):
+            with open(self.checkpoint, encoding='utf-8') as f:
+                for line in f:
+                    record = json.loads(line)
+                    job = (record['topic'], record['count'])
+                    failed[job] = record.get('at', 0) >= since and (
+                        record['status'] == 'failed' or record.get('reason') == 'filtered')
+        return {job for job, recent in failed.items() if recent}
+
+    def _record(self, topic: str, count: int, status: str, **fields) -> None:
+        with self._lock:
+            self.counts[status] += 1
+            if self.checkpoint:
+                with open(self.checkpoint, 'a', encoding='utf-8') as f:
+                    record = dict(topic=topic, count=count, status=status, at=round(time.time()), **fields)
+                    f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        print(f"[{status}] {topic} ({count}) {fields.get('error', '')}")
+
+    def _run_job(self, topic: str, count: int) -> None:
+        if check_content_filter(topic.lower()):
+            self._record(topic, count, 'skipped', reason='filtered')
+            return
+        if not self.force and DatabaseManager.count_graphs(topic, count) >= self.min_graphs:
+            self._record(topic, count, 'skipped', reason='cached')
+            return
+        delay = 2
+        for attempt in range(1, self.retries + 2):
+            try:
+                graph_id = self.generate(topic, count)
+                self._record(topic, count, 'done', graph_id=graph_id, attempts=attempt)
+                return
+            except Exception as e:
+                if attempt > self.retries:
+                    self._record(topic, count, 'failed', attempts=attempt, error=str(e))
+                    return
+                time.sleep(delay)
+                delay = min(delay * 2, 60)
+
+    def run(self, jobs: Iterable[Tuple[str, int]], resume: bool = True) -> Dict[str, int]:
+        """
+        执行任务，跳过重复的任务
+        :param resume: 是否跳过检查点中已完成的任务
+        :return: 累计各状态的任务数
+        """
+        done = self.completed() if resume else set()
+        pending = list(dict.fromkeys(job for job in jobs if job not in done))
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="prewarm") as executor:
+            list(executor.map(lambda job: self._run_job(*job), pending))
+        return dict(self.counts)
+
+class BatchPrewarm(PrewarmWorker):
+    """
+    使用服务商批处理接口预生成：人物预判、概念、关系分三批依次提交（后一批依赖前一批的结果），
+    全部结束后一次写入数据库。任务列表和已提交的批处理ID保存在状态文件中，
+    中断后重新运行会继续等待已提交的批处理，不会重复提交；失败的任务记入检查点，可再用 run 逐个重试
+    """
+    def __init__(self, model: str = batch_model, poll_interval: float = batch_poll_interval, state: str = None,
+                 checkpoint: str = None, min_graphs: int = 1, force: bool = False):
+        """
+        :param model: 批处理使用的模型
+        :param poll_interval: 轮询批处理状态的间隔（秒）
+        :param state: 状态文件路径（JSON），为None时不保存
+        """
+        super().__init__(checkpoint=checkpoint, min_graphs=min_graphs, force=force)
+        self.model = model
+        self.poll_interval = poll_interval
+        self.state = state
+        self._state = {}
+        if state and os.path.exists(state):
+            with open(state, encoding='utf-8') as f:
+                self._state = json.load(f)
+
+    def _save_state(self) -> None:
+        if self.state:
+            with open(self.state, 'w', encoding='utf-8') as f:
+                json.dump(self._state, f, ensure_ascii=False)
+
+    def _stage(self, name: str, requests: Dict[str, list]) -> Tuple[Dict[str, str], Dict[str, str]]:
+        """
+        运行一批请求，已提交过的批处理只继续等待
+        """
+        def remember(batch_id):
+            self._state['batches'][name] = batch_id
+            self._save_state()
+        return run_batch(requests, self.model, name, self._state['batches'].get(name), self.poll_interval, remember)
+
+    def _recorded(self) -> Set[Tuple[str, int]]:
+        """
+        读取本次批处理开始后检查点中已记录结果（完成、跳过或失败）的任务，继续等待时不再重复处理和记录
+        """
+        recorded = set()
+        if self.checkpoint and os.path.exists(self.checkpoint):
+            with open(self.checkpoint, encoding='utf-8') as f:
+                f.seek(self._state.get('checkpoint_offset', 0))
+                for line in f:
+                    record = json.loads(line)
+                    recorded.add((record['topic'], record['count']))
+        return recorded
+
+    def _pending(self, jobs: Iterable[Tuple[str, int]], resume: bool) -> List[Tuple[str, int]]:
+        done = self.completed() if resume else set()
+        pending = []
+        for topic, count in dict.fromkeys(job for job in jobs if job not in done):
+            if check_content_filter(topic.lower()):
+                self._record(topic, count, 'skipped', reason='filtered')
+            elif not self.force and DatabaseManager.count_graphs(topic, count) >= self.min_graphs:
+                self._record(topic, count, 'skipped', reason='cached')
+            else:
+                pending.append((topic, count))
+        return pending
+
+    def run(self, jobs: Iterable[Tuple[str, int]], resume: bool = True) -> Dict[str, int]:
+        if not resume or 'jobs' not in self._state:
+            offset = os.path.getsize(self.checkpoint) if self.checkpoint and os.path.exists(self.checkpoint) else 0
+            self._state = {'jobs': [], 'batches': {}, 'checkpoint_offset': offset}
+            self._state['jobs'] = self._pending(jobs, resume)
+            self._save_state()
+        jobs = [tuple(job) for job in self._state['jobs']]
+        recorded = self._recorded()
+        active = [i for i, job in enumerate(jobs) if job not in recorded]
+
+        # 第一批：缓存中没有结论的主题预判是否为人物（请求ID为主题本身，继续等待时不受已缓存主题的影响）
+        topics = dict.fromkeys(jobs[i][0] for i in active if person_cache.get(jobs[i][0]) is None)
+        results, failed_topics = self._stage('prejudge', {topic: prejudge_messages(topic) for topic in topics})
+        for topic, text in results.items():
+            try:
+                person_cache.set(topic, parse_person_verdict(text))
+            except Exception as e:
+                failed_topics[topic] = str(e)
+
+        # 第二批：生成概念
+        verdicts = {}
+        for i in active:
+            topic, count = jobs[i]
+            if topic in failed_topics:
+                self._record(topic, count, 'failed', error=f"人物预判失败: {failed_topics[topic]}")
+            else:
+                verdicts[i] = person_cache.get(topic) or False
+        results, errors = self._stage('concepts', {
+            str(i): concept_messages(jobs[i][0], jobs[i][1], is_person) for i, is_person in verdicts.items()
+        })
+        # 继续等待已提交的批处理时，结果中可能有之前已记录过的任务
+        results = {custom_id: text for custom_id, text in results.items() if int(custom_id) in verdicts}
+        errors = {custom_id: error for custom_id, error in errors.items() if int(custom_id) in verdicts}
+        concepts = {}
+        for custom_id, text in results.items():
+            topic, count = jobs[int(custom_id)]
+            if check_content_filter(text):
+                self._record(topic, count, 'skipped', reason='filtered')
+                continue
+            try:
+                concepts[int(custom_id)] = parse_json_response(text, error_context=f"处理主体 '{topic}' 的节点生成结果时")
+            except Exception as e:
+                errors[custom_id] = str(e)
+        for custom_id, error in errors.items():
+            self._record(*jobs[int(custom_id)], 'failed', error=f"生成概念失败: {error}")
+
+        # 第三批：生成关系
+        results, errors = self._stage('relationships', {
+            str(i): relationship_messages(concepts[i], verdicts[i]) for i in concepts
+        })
+        results = {custom_id: text for custom_id, text in results.items() if int(custom_id) in concepts}
+        errors = {custom_id: error for custom_id, error in errors.items() if int(custom_id) in concepts}
+        graphs = []
+        for custom_id, text in results.items():
+            i = int(custom_id)
+            try:
+                relationships = extract_relations(text, error_context="处理概念关系生成结果时")
+            except Exception as e:
+                errors[custom_id] = str(e)
+                continue
+            graphs.append((i, dict(
+                topic=jobs[i][0],
+                concept_count=jobs[i][1],
+                concepts=concepts[i],
+                relationships=relationships,
+                is_person=verdicts[i],
+                network_data=create_network_data(concepts[i], relationships)
+            )))
+        for custom_id, error in errors.items():
+            self._record(*jobs[int(custom_id)], 'failed', error=f"生成关系失败: {error}")
+
+        graph_ids = DatabaseManager.save_knowledge_graphs([graph for _, graph in graphs])
+        for (i, _), graph_id in zip(graphs, graph_ids):
+            self._record(*jobs[i], 'done', graph_id=graph_id)
+        if self.state and os.path.exists(self.state):
+            os.remove(self.state)
+        self._state = {}
+        return dict(self.counts)
+
+def _configure_limits(rpm: List[str]) -> None:
+    for item in rpm or []:
+        provider, _, limit = item.partition('=')
+        provider_limits.configure(provider, int(limit))
+
+def _worker(args) -> PrewarmWorker:
+    _configure_limits(args.rpm)
+    return PrewarmWorker(concurrency=args.concurrency, retries=args.retries, checkpoint=args.checkpoint,
+                         min_graphs=args.min_graphs, force=args.force)
+
+def prewarm_run(args) -> None:
+    """
+    为任务文件中的主题生成图谱
+    """
+    counts = _worker(args).run(read_jobs(args.jobs, args.count))
+    print(f"完成 {counts['done']} 个，跳过 {counts['skipped']} 个，失败 {counts['failed']} 个")
+
+def prewarm_batch(args) -> None:
+    """
+    使用服务商批处理接口为任务文件中的主题生成图谱
+    """
+    worker = BatchPrewarm(model=args.model, poll_interval=args.poll_interval, state=args.state,
+                          checkpoint=args.checkpoint, min_graphs=args.min_graphs, force=args.force)
+    counts = worker.run(read_jobs(args.jobs, args.count))
+    print(f"完成 {counts['done']} 个，跳过 {counts['skipped']} 个，失败 {counts['failed']} 个")
+
+def prewarm_warm_list(args) -> None:
+    """
+    输出请求次数最多、已有图谱不足的主题，格式与任务文件相同
+    """
+    for topic, count, requests, cached in DatabaseManager.get_warm_list(args.limit, args.min_graphs):
+        print(f"{topic}\t{count}" + (f"\t# 请求 {requests} 次，已有 {cached} 个图谱" if args.verbose else ""))
+
+def prewarm_watch(args) -> None:
+    """
+    后台常驻：定期按需求生成预热清单并生成图谱
+    """
+    worker = _worker(args)
+    while True:
+        # 最近失败或被过滤的主题在冷却时间内不再重试，避免每轮都以完整的退避重试同一个失败任务
+        failed = worker.recently_failed(args.failure_cooldown)
+        jobs = [(topic, count) for topic, count, _, _ in DatabaseManager.get_warm_list(args.limit, args.min_graphs)
+                if (topic, count) not in failed]
+        if jobs:
+            # 清单只含图谱不足的主题，已完成过的主题再次出现说明需要更多图谱
+            counts = worker.run(jobs, resume=False)
+            print(f"累计完成 {counts['done']} 个，跳过 {counts['skipped']} 个，失败 {counts['failed']} 个")
+        time.sleep(args.interval)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="TermsAI 图谱预生成")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    def add_worker_arguments(p):
+        p.add_argument('--concurrency', type=int, default=4, help='同时进行的生成数')
+        p.add_argument('--retries', type=int, default=3, help='失败后的最多重试次数')
+        p.add_argument('--rpm', action='append', metavar='服务商=次数', help='服务商每分钟请求数上限，可重复，如 --rpm siliconflow=60')
+        p.add_argument('--checkpoint', default='prewarm.checkpoint.jsonl', help='检查点文件，中断后重新运行会跳过已完成的任务')
+        p.add_argument('--min-graphs', type=int, default=1, help='已有图谱少于该数量的主题才生成')
+        p.add_argument('--force', action='store_true', help='不论已有多少图谱都生成')
+
+    p = subparsers.add_parser('run', help='为任务文件中的主题生成图谱')
+    p.add_argument('jobs', help='任务文件：每行一个主题，可用制表符附带节点数量')
+    p.add_argument('--count', type=int, default=10, help='未指定节点数量时使用的数量')
+    add_worker_arguments(p)
+    p.set_defaults(func=prewarm_run)
+
+    p = subparsers.add_parser('batch', help='使用服务商批处理接口为任务文件中的主题生成图谱（适合大量主题）')
+    p.add_argument('jobs', help='任务文件：每行一个主题，可用制表符附带节点数量')
+    p.add_argument('--count', type=int, default=10, help='未指定节点数量时使用的数量')
+    p.add_argument('--model', default=batch_model, help='批处理使用的模型')
+    p.add_argument('--poll-interval', type=float, default=batch_poll_interval, help='轮询批处理状态的间隔（秒）')
+    p.add_argument('--state', default='prewarm.batch.json', help='状态文件，中断后重新运行会继续等待已提交的批处理')
+    p.add_argument('--checkpoint', default='prewarm.checkpoint.jsonl', help='检查点文件，失败的任务可再用 run 重试')
+    p.add_argument('--min-graphs', type=int, default=1, help='已有图谱少于该数量的主题才生成')
+    p.add_argument('--force', action='store_true', help='不论已有多少图谱都生成')
+    p.set_defaults(func=prewarm_batch)
+
+    p = subparsers.add_parser('warm-list', help='按请求次数输出已有图谱不足的主题（可作为 run 的任务文件）')
+    p.add_argument('--limit', type=int, default=100)
+    p.add_argument('--min-graphs', type=int, default=1, help='已有图谱少于该数量的主题才列出')
+    p.add_argument('--verbose', action='store_true', help='附带请求次数和已有图谱数')
+    p.set_defaults(func=prewarm_warm_list)
+
+    p = subparsers.add_parser('watch', help='后台常驻，定期为需求最多、已有图谱不足的主题生成图谱')
+    p.add_argument('--interval', type=float, default=600, help='两次检查之间的间隔（秒）')
+    p.add_argument('--limit', type=int, default=50, help='每次最多生成的主题数')
+    p.add_argument('--failure-cooldown', type=float, default=86400, help='失败或被过滤的主题在该时间（秒）内不再重试')
+    add_worker_arguments(p)
+    p.set_defaults(func=prewarm_watch)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == '__main__':
+    main()
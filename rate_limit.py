@@ -0,0 +1,339 @@
+import asyncio
+import contextvars
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Optional
+from configs import resolve_provider, provider_rpm, provider_tpm, provider_max_in_flight, rate_limit_max_wait, estimated_completion_tokens
+
+# 当前请求的排队通知函数 (在队列中的位置, 等待速率额度的秒数)，由单飞生成的 leader 设置，用于在SSE进度中显示排队位置
+queue_listener: contextvars.ContextVar[Optional[Callable[[int, float], None]]] = contextvars.ContextVar('queue_listener', default=None)
+
+class RateLimitExceeded(Exception):
+    """
+    服务商排队等待超过上限，调用方应改用其他服务商的模型或返回错误
+    """
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗略估计文本的token数：中文约每字一个token，英文约每四个字符一个token，这里按每两个字符一个token折中估计
+    """
+    return len(text) // 2 + 1
+
+class TokenBucket:
+    """
+    令牌桶：按固定速率补充令牌，容量限制突发请求数。
+    reserve 立即预订令牌并返回需要等待的时间，同步和异步调用方各自等待。
+    """
+    def __init__(self, rate: float, capacity: float):
+        """
+        :param rate: 每秒补充的令牌数
+        :param capacity: 令牌桶容量（允许的最大突发量）
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.acquired = 0
+        self.waited = 0.0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, tokens: float = 1.0) -> float:
+        """
+        预订令牌
+        :return: 需要等待的秒数（令牌不足时余额为负，之后的请求顺延）
+        """
+        with self._lock:
+            self._refill()
+            self._tokens -= tokens
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            self.acquired += 1
+            self.waited += wait
+            return wait
+
+    def refund(self, tokens: float) -> None:
+        """
+        归还预订后没有用掉的令牌；tokens 为负数时补扣多用的令牌
+        """
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens + tokens)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'rate_per_minute': self.rate * 60,
+                'acquired': self.acquired,
+                'avg_wait': self.waited / self.acquired if self.acquired else 0.0
+            }
+
+class Permit:
+    """
+    一次获准的模型调用：调用结束（流式调用为流关闭）后 release，归还并发名额并按实际token数结算
+    """
+    def __init__(self, limiter: Optional['ProviderLimiter'] = None, tokens: int = 0, prompt_tokens: int = 0):
+        """
+        :param tokens: 预订的token数（提示词加预计的回复长度）
+        :param prompt_tokens: 其中提示词的token数，流式调用结束时加上实际回复长度结算
+        """
+        self._limiter = limiter
+        self.tokens = tokens
+        self.prompt_tokens = prompt_tokens
+        self._released = False
+
+    def release(self, used_tokens: Optional[int] = None) -> None:
+        """
+        :param used_tokens: 实际使用的token数，未知时保持预估值
+        """
+        if self._released or self._limiter is None:
+            return
+        self._released = True
+        self._limiter.release(self.tokens, used_tokens)
+
+class ProviderLimiter:
+    """
+    单个服务商的准入控制：每分钟请求数、每分钟token数和同时进行的请求数（流式请求在流关闭前一直占用名额）。
+    超出并发上限的请求按先来后到排队，预计等待超过 max_wait 时拒绝，由调用方换用其他服务商的模型
+    """
+    def __init__(self, provider: str, rpm: Optional[int] = None, tpm: Optional[int] = None,
+                 max_in_flight: Optional[int] = None, max_wait: float = rate_limit_max_wait):
+        """
+        :param rpm: 每分钟请求数上限，None 表示不限
+        :param tpm: 每分钟token数上限，None 表示不限
+        :param max_in_flight: 同时进行的请求数上限，None 表示不限
+        :param max_wait: 排队最长等待时间（秒）
+        """
+        self.provider = provider
+        # 请求均匀分布、不允许突发，任意时间窗口内的请求数都不超过限额；token额度允许一秒的突发
+        self.requests = TokenBucket(rpm / 60, 1.0) if rpm else None
+        self.tokens = TokenBucket(tpm / 60, max(1.0, tpm / 60)) if tpm else None
+        self.max_in_flight = max_in_flight
+        self.max_wait = max_wait
+        self.in_flight = 0
+        self._queue = deque()
+        self._condition = threading.Condition()
+        self.admitted = 0
+        self.rejected = 0
+        self.max_queue_length = 0
+
+    def _enqueue(self) -> object:
+        ticket = object()
+        with self._condition:
+            self._queue.append(ticket)
+            self.max_queue_length = max(self.max_queue_length, len(self._queue))
+        return ticket
+
+    def _try_admit(self, ticket: object) -> int:
+        """
+        轮到该请求且有空闲名额时占用名额
+        :return: 0 表示已获准，否则为在队列中的位置（从1开始）
+        """
+        with self._condition:
+            position = self._queue.index(ticket)
+            if position == 0 and (self.max_in_flight is None or self.in_flight < self.max_in_flight):
+                self._queue.popleft()
+                self.in_flight += 1
+                self._condition.notify_all()
+                return 0
+            return position + 1
+
+    def _leave(self, ticket: object, rejected: bool = True) -> None:
+        """
+        排队中的请求离开队列（等待超时被拒绝，或调用方被取消）
+        """
+        with self._condition:
+            self._queue.remove(ticket)
+            if rejected:
+                self.rejected += 1
+            self._condition.notify_all()
+
+    def _reserve(self, tokens: int, deadline: float) -> float:
+        """
+        预订请求数和token额度，预计等待超过截止时间时归还额度并拒绝
+        :return: 需要等待的秒数
+        """
+        wait = max(
+            self.requests.reserve() if self.requests else 0.0,
+            self.tokens.reserve(tokens) if self.tokens else 0.0
+        )
+        if time.monotonic() + wait > deadline:
+            if self.requests:
+                self.requests.refund(1)
+            if self.tokens:
+                self.tokens.refund(tokens)
+            self.release(0, 0)
+            with self._condition:
+                self.rejected += 1
+            raise RateLimitExceeded(f"服务商 {self.provider} 请求过多，预计等待 {wait:.0f} 秒，超过上限 {self.max_wait:.0f} 秒")
+        with self._condition:
+            self.admitted += 1
+        return wait
+
+    def _report(self, position: int, wait: float, last: tuple) -> tuple:
+        listener = queue_listener.get()
+        if listener is not None and (position, round(wait)) != last:
+            listener(position, wait)
+        return position, round(wait)
+
+    def acquire(self, tokens: int) -> Permit:
+        """
+        等待并发名额和速率额度
+        :param tokens: 本次调用预计使用的token数
+        :return: 名额，调用结束后需要 release
+        :raises RateLimitExceeded: 预计等待超过 max_wait
+        """
+        deadline = time.monotonic() + self.max_wait
+        ticket = self._enqueue()
+        last = (0, 0)
+        try:
+            with self._condition:
+                while True:
+                    position = self._try_admit(ticket)
+                    if position == 0:
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._leave(ticket)
+                        raise RateLimitExceeded(f"服务商 {self.provider} 同时进行的请求过多，排队超过 {self.max_wait:.0f} 秒")
+                    last = self._report(position, 0.0, last)
+                    self._condition.wait(min(remaining, 1.0))
+        except RateLimitExceeded:
+            raise
+        except BaseException:
+            # 排队中被中断时离开队列，否则队首的失效请求会一直挡住后面的请求
+            self._leave(ticket, rejected=False)
+            raise
+        wait = self._reserve(tokens, deadline)
+        if wait > 0:
+            self._report(0, wait, last)
+            try:
+                time.sleep(wait)
+            except BaseException:
+                self.release(tokens, 0)
+                raise
+        return Permit(self, tokens)
+
+    async def acquire_async(self, tokens: int) -> Permit:
+        """
+        acquire 的异步版本：排队时轮询名额，不阻塞事件循环
+        """
+        deadline = time.monotonic() + self.max_wait
+        ticket = self._enqueue()
+        last = (0, 0)
+        try:
+            while True:
+                position = self._try_admit(ticket)
+                if position == 0:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._leave(ticket)
+                    raise RateLimitExceeded(f"服务商 {self.provider} 同时进行的请求过多，排队超过 {self.max_wait:.0f} 秒")
+                last = self._report(position, 0.0, last)
+                await asyncio.sleep(0.05)
+        except RateLimitExceeded:
+            raise
+        except BaseException:
+            # 客户端断开时等待的任务被取消，离开队列，否则队首的失效请求会一直挡住后面的请求
+            self._leave(ticket, rejected=False)
+            raise
+        wait = self._reserve(tokens, deadline)
+        if wait > 0:
+            self._report(0, wait, last)
+            try:
+                await asyncio.sleep(wait)
+            except BaseException:
+                # 已获准后被取消：归还并发名额，预订的额度视为未使用
+                self.release(tokens, 0)
+                raise
+        return Permit(self, tokens)
+
+    def release(self, tokens: int, used_tokens: Optional[int] = None) -> None:
+        """
+        归还并发名额，按实际token数多退少补
+        """
+        if self.tokens and used_tokens is not None:
+            self.tokens.refund(tokens - used_tokens)
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def stats(self) -> dict:
+        with self._condition:
+            stats = {
+                'in_flight': self.in_flight,
+                'max_in_flight': self.max_in_flight,
+                'queued': len(self._queue),
+                'max_queue_length': self.max_queue_length,
+                'admitted': self.admitted,
+                'rejected': self.rejected
+            }
+        if self.requests:
+            stats['requests'] = self.requests.stats()
+        if self.tokens:
+            stats['tokens'] = self.tokens.stats()
+        return stats
+
+class ProviderRateLimits:
+    """
+    按服务商（configs.resolve_provider）进行准入控制，同一服务商的不同模型共用限额；
+    没有配置限制的服务商不受限
+    """
+    def __init__(self, rpm: Optional[Dict[str, int]] = None, tpm: Optional[Dict[str, int]] = None,
+                 max_in_flight: Optional[Dict[str, int]] = None):
+        self._limiters: Dict[str, ProviderLimiter] = {}
+        rpm, tpm, max_in_flight = rpm or {}, tpm or {}, max_in_flight or {}
+        for provider in {*rpm, *tpm, *max_in_flight}:
+            self.configure(provider, rpm.get(provider), tpm.get(provider), max_in_flight.get(provider))
+
+    def configure(self, provider: str, rpm: Optional[int] = None, tpm: Optional[int] = None,
+                  max_in_flight: Optional[int] = None, max_wait: float = rate_limit_max_wait) -> None:
+        """
+        设置服务商的限额，未传入的限额沿用已有设置
+        """
+        current = self._limiters.get(provider)
+        if current is not None:
+            rpm = rpm if rpm is not None else current.requests and round(current.requests.rate * 60)
+            tpm = tpm if tpm is not None else current.tokens and round(current.tokens.rate * 60)
+            max_in_flight = max_in_flight if max_in_flight is not None else current.max_in_flight
+        self._limiters[provider] = ProviderLimiter(provider, rpm, tpm, max_in_flight, max_wait)
+
+    def _limiter(self, model: str) -> Optional[ProviderLimiter]:
+        return self._limiters.get(resolve_provider(model)) if self._limiters else None
+
+    def acquire(self, model: str, messages: list) -> Permit:
+        """
+        在调用模型前等待所属服务商的名额和额度，预订的token数为提示词加上预计的回复长度
+        :return: 名额，调用结束（流式调用为流关闭）后需要 release
+        :raises RateLimitExceeded: 排队等待超过上限
+        """
+        limiter = self._limiter(model)
+        if limiter is None:
+            return Permit()
+        prompt_tokens = sum(estimate_tokens(message.get("content") or "") for message in messages)
+        permit = limiter.acquire(prompt_tokens + estimated_completion_tokens)
+        permit.prompt_tokens = prompt_tokens
+        return permit
+
+    async def acquire_async(self, model: str, messages: list) -> Permit:
+        """
+        acquire 的异步版本
+        """
+        limiter = self._limiter(model)
+        if limiter is None:
+            return Permit()
+        prompt_tokens = sum(estimate_tokens(message.get("content") or "") for message in messages)
+        permit = await limiter.acquire_async(prompt_tokens + estimated_completion_tokens)
+        permit.prompt_tokens = prompt_tokens
+        return permit
+
+    def stats(self) -> Dict[str, dict]:
+        return {provider: limiter.stats() for provider, limiter in self._limiters.items()}
+
+# 进程内共享的服务商准入控制
+provider_limits = ProviderRateLimits(provider_rpm, provider_tpm, provider_max_in_flight)
@@ -0,0 +1,207 @@
+import asyncio
+import json
+import threading
+from typing import AsyncIterator, Callable, Dict, Hashable, Iterator, List
+from rate_limit import queue_listener
+
+def queued_event(position: int, wait: float, progress: float) -> str:
+    """
+    排队等待服务商名额时的SSE进度事件
+    :param position: 在队列中的位置（从1开始），为0时表示在等待速率额度
+    :param wait: 等待速率额度的秒数
+    :param progress: 沿用上一个进度事件的进度值
+    """
+    if position > 0:
+        message = f"当前请求较多，正在排队...\n当前排在第 {position} 位"
+    else:
+        message = f"当前请求较多，正在排队...\n预计等待 {wait:.0f} 秒"
+    return "data: " + json.dumps({
+        'status': 'queued',
+        'progress': progress,
+        'message': message,
+        'queue_position': position
+    }) + '\n\n'
+
+class _ProgressTracker:
+    """
+    记录生成最近一次进度事件的进度值，排队事件沿用该值，进度条不会倒退
+    """
+    def __init__(self):
+        self.progress = 10
+
+    def observe(self, event) -> None:
+        if isinstance(event, bytes):
+            event = event.decode('utf-8')
+        try:
+            progress = json.loads(event[len("data:"):]).get('progress')
+        except ValueError:
+            return
+        if progress is not None:
+            self.progress = progress
+
+class _Flight:
+    """
+    一次进行中的生成：记录已产出的全部事件，供先后加入的请求回放并继续接收
+    """
+    def __init__(self):
+        self.events: List[str] = []
+        self.done = False
+        self.condition = threading.Condition()
+        self.subscribers = 0
+
+    def publish(self, event: str) -> None:
+        with self.condition:
+            self.events.append(event)
+            self.condition.notify_all()
+
+    def finish(self) -> None:
+        with self.condition:
+            self.done = True
+            self.condition.notify_all()
+
+    def subscribe(self) -> Iterator[str]:
+        index = 0
+        while True:
+            with self.condition:
+                while index >= len(self.events) and not self.done:
+                    self.condition.wait()
+                pending = self.events[index:]
+                index = len(self.events)
+                finished = self.done
+            yield from pending
+            if finished and index >= len(self.events):
+                return
+
+class SingleFlight:
+    """
+    相同键的并发请求合并为一次执行：第一个请求（leader）在后台线程中运行生成器，
+    之后加入的请求不再重复生成，而是接收同一份SSE事件（包括加入前已产出的进度）。
+    leader 的客户端断开不会中断生成，其余请求照常收到结果。
+    """
+    def __init__(self, name: str = "flight"):
+        self.name = name
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.followers = 0
+
+    def join(self, key: Hashable, producer: Callable[[], Iterator[str]]) -> Iterator[str]:
+        """
+        加入键对应的生成，不存在时以 producer 新建一次生成
+        :param key: 合并键
+        :param producer: 返回SSE事件生成器的函数，只会被 leader 调用一次
+        :return: 事件迭代器
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = _Flight()
+                self._flights[key] = flight
+                self.leaders += 1
+                threading.Thread(target=self._run, args=(key, flight, producer), daemon=True, name=self.name).start()
+            else:
+                self.followers += 1
+            flight.subscribers += 1
+        return flight.subscribe()
+
+    def _run(self, key: Hashable, flight: _Flight, producer: Callable[[], Iterator[str]]) -> None:
+        # 生成线程中调用模型时若需排队，排队位置作为进度事件推送给所有请求
+        tracker = _ProgressTracker()
+        queue_listener.set(lambda position, wait: flight.publish(queued_event(position, wait, tracker.progress)))
+        try:
+            for event in producer():
+                tracker.observe(event)
+                flight.publish(event)
+        except Exception as e:
+            flight.publish("data: " + json.dumps({
+                'status': 'error',
+                'message': str(e)
+            }) + '\n\n')
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.finish()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'in_flight': len(self._flights),
+                'leaders': self.leaders,
+                'followers': self.followers
+            }
+
+class AsyncSingleFlight:
+    """
+    SingleFlight 的 asyncio 版本，供 ASGI 模式使用：leader 以任务形式运行异步生成器
+    """
+    def __init__(self):
+        self._flights: Dict[Hashable, tuple] = {}  # key -> (事件列表, asyncio.Condition, 完成标记)
+        self.leaders = 0
+        self.followers = 0
+
+    async def join(self, key: Hashable, producer: Callable[[], AsyncIterator[bytes]]) -> AsyncIterator[bytes]:
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = ([], asyncio.Condition(), [False])
+            self._flights[key] = flight
+            self.leaders += 1
+            asyncio.create_task(self._run(key, flight, producer))
+        else:
+            self.followers += 1
+        events, condition, done = flight
+        index = 0
+        while True:
+            async with condition:
+                await condition.wait_for(lambda: index < len(events) or done[0])
+                pending = events[index:]
+                index = len(events)
+                finished = done[0]
+            for event in pending:
+                yield event
+            if finished and index >= len(events):
+                return
+
+    async def _run(self, key: Hashable, flight: tuple, producer: Callable[[], AsyncIterator[bytes]]) -> None:
+        events, condition, done = flight
+        tracker = _ProgressTracker()
+
+        def on_queued(position, wait):
+            # 排队通知在事件循环中同步调用，追加事件后另起任务唤醒订阅者
+            events.append(queued_event(position, wait, tracker.progress).encode('utf-8'))
+            asyncio.ensure_future(notify())
+
+        async def notify():
+            async with condition:
+                condition.notify_all()
+
+        queue_listener.set(on_queued)
+        try:
+            async for event in producer():
+                tracker.observe(event)
+                async with condition:
+                    events.append(event)
+                    condition.notify_all()
+        except Exception as e:
+            async with condition:
+                events.append(("data: " + json.dumps({
+                    'status': 'error',
+                    'message': str(e)
+                }) + '\n\n').encode('utf-8'))
+        finally:
+            self._flights.pop(key, None)
+            async with condition:
+                done[0] = True
+                condition.notify_all()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'in_flight': len(self._flights),
+            'leaders': self.leaders,
+            'followers': self.followers
+        }
+
+# 相同 (规范化主题, 概念数量) 的新图谱生成共享一次LLM流水线
+generation_flights = SingleFlight("generation")
+
+# 点踩后重新生成：每次使用唯一的键、不与其他请求合并，只借用后台线程把排队位置推送给客户端
+regeneration_flights = SingleFlight("regeneration")
@@ -330,7 +330,8 @@ document.addEventListener('DOMContentLoaded', function() {
                                 }
                                 currentGraphId = data.data.graph_id;
                                 updateGraphIdDisplay(currentGraphId);
-                                feedbackButtons.style.display = 'flex';
+                                // 从更大的图谱派生、未保存的图谱没有编号，不能点赞、点踩或分享
+                                feedbackButtons.style.display = currentGraphId ? 'flex' : 'none';
                                 searchGraphBtn.style.display = 'block';
                                 createNetwork(data.data.network_data);
                                 document.getElementById('download-btn').style.display = 'block';
@@ -572,7 +573,8 @@ document.addEventListener('DOMContentLoaded', function() {
                                 }
                                 currentGraphId = data.data.graph_id;
                                 updateGraphIdDisplay(currentGraphId);
-                                feedbackButtons.style.display = 'flex';
+                                // 从更大的图谱派生、未保存的图谱没有编号，不能点赞、点踩或分享
+                                feedbackButtons.style.display = currentGraphId ? 'flex' : 'none';
                                 searchGraphBtn.style.display = 'block';
                                 createNetwork(data.data.network_data);
                                 document.getElementById('download-btn').style.display = 'block';
@@ -822,8 +824,8 @@ document.addEventListener('DOMContentLoaded', function() {
         const graphIdElem = document.getElementById('graph-id-value');
         if (graphIdElem) {
             graphIdElem.textContent = id;
-            // 生成完成后显示图谱编号区域
-            document.getElementById('graph-id-display').style.display = 'block';
+            // 生成完成后显示图谱编号区域，没有编号（未保存的派生图谱）时隐藏
+            document.getElementById('graph-id-display').style.display = id ? 'block' : 'none';
         }
     }
 
@@ -880,16 +882,9 @@ document.addEventListener('DOMContentLoaded', function() {
             document.getElementById('network-loading').style.display = 'flex';
             infoBox.textContent = '正在加载指定图谱...';
             
-            const response = await fetch('/search_graph', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify({ 
-                    graph_id: graphId
-                })
-            });
-            const data = await response.json();
+            // 图谱保存后不再变化，只读接口的响应可被浏览器和CDN缓存
+            const response = await fetch('/graphs/' + encodeURIComponent(graphId) + '.json');
+            const data = await response.json().catch(() => ({ error: '未找到图谱，图谱编号: ' + graphId }));
             
             if (data.error) {
                 throw new Error(data.error);
@@ -1034,7 +1029,8 @@ document.addEventListener('DOMContentLoaded', function() {
                             if (data.status === 'complete' && data.data) {
                                 currentGraphId = data.data.graph_id;
                                 updateGraphIdDisplay(currentGraphId);
-                                feedbackButtons.style.display = 'flex';
+                                // 从更大的图谱派生、未保存的图谱没有编号，不能点赞、点踩或分享
+                                feedbackButtons.style.display = currentGraphId ? 'flex' : 'none';
                                 likeBtn.disabled = false;
                                 dislikeBtn.disabled = false;
                                 searchGraphBtn.style.display = 'block';
@@ -1316,10 +1312,7 @@ document.addEventListener('DOMContentLoaded', function() {
         const graphId = urlParams.get('graph_id');
         if (graphId) {
             // 调用后端接口获取graph_id对应的图谱详细数据
-            fetch('/get_graph?graph_id=' + graphId, {
-                method: 'GET',
-                headers: { 'Cache-Control': 'no-cache' }
-            })
+            fetch('/graphs/' + encodeURIComponent(graphId) + '.json')
             .then(response => {
                 if (!response.ok) {
                     throw new Error('获取图谱数据失败');
@@ -1488,7 +1481,7 @@ document.getElementById('download-btn').addEventListener('click', async function
         // 使用较大尺寸生成二维码以便后续缩小
         const genQrSize = 200;
         // 使用 QRious 在浏览器端本地生成二维码，避免外部依赖
-        const qrValue = `${window.location.origin}/?graph_id=${graphId}`;
+        const qrValue = graphId ? `${window.location.origin}/?graph_id=${graphId}` : `${window.location.origin}/`;
         const qrCanvasOriginal = document.createElement('canvas');
         new QRious({
             element: qrCanvasOriginal,
@@ -0,0 +1,133 @@
+import json
+import re
+from typing import Dict, List, Optional, Tuple
+
+_STRING_SPECIAL = re.compile(r'["\\]')
+_WHITESPACE = " \t\r\n"
+
+class ConceptStreamParser:
+    """
+    增量JSON解析器：逐块接收LLM流式输出的 {"概念名称": "概念介绍", ...} 文本，
+    每当一个键值对完整结束即产出 (概念, 介绍)，每个字符只处理一次。
+    遇到无法识别的格式（如未转义的引号）时停止增量解析，由调用方回退到 parse_json_response。
+    """
+    # 解析状态
+    BEFORE_OBJECT = 0
+    EXPECT_KEY = 1
+    IN_KEY = 2
+    EXPECT_COLON = 3
+    EXPECT_VALUE = 4
+    IN_VALUE = 5
+    EXPECT_COMMA = 6
+    DONE = 7
+    FAILED = 8
+
+    def __init__(self):
+        self.state = self.BEFORE_OBJECT
+        self.concepts: Dict[str, str] = {}
+        self._chunks: List[str] = []
+        self._buf: List[str] = []  # 当前字符串的原始片段（保留转义）
+        self._escape = False
+        self._key: Optional[str] = None
+
+    @property
+    def text(self) -> str:
+        """
+        到目前为止接收到的完整原始文本
+        """
+        return "".join(self._chunks)
+
+    @property
+    def failed(self) -> bool:
+        return self.state == self.FAILED
+
+    def feed(self, chunk: str) -> List[Tuple[str, str]]:
+        """
+        送入新的文本块
+        :return: 本次新完成的 (概念, 介绍) 列表
+        """
+        if not chunk:
+            return []
+        self._chunks.append(chunk)
+        completed = []
+        i, n = 0, len(chunk)
+        while i < n and self.state not in (self.DONE, self.FAILED):
+            state = self.state
+            if state in (self.IN_KEY, self.IN_VALUE):
+                i = self._consume_string(chunk, i, completed)
+                continue
+            ch = chunk[i]
+            i += 1
+            if ch in _WHITESPACE:
+                continue
+            if state == self.BEFORE_OBJECT:
+                # 跳过 ```json 之类的前缀
+                if ch == '{':
+                    self.state = self.EXPECT_KEY
+            elif state == self.EXPECT_KEY:
+                if ch == '"':
+                    self.state = self.IN_KEY
+                elif ch == '}' and not self.concepts:
+                    self.state = self.DONE
+                else:
+                    self.state = self.FAILED
+            elif state == self.EXPECT_COLON:
+                self.state = self.EXPECT_VALUE if ch == ':' else self.FAILED
+            elif state == self.EXPECT_VALUE:
+                self.state = self.IN_VALUE if ch == '"' else self.FAILED
+            elif state == self.EXPECT_COMMA:
+                if ch == ',':
+                    self.state = self.EXPECT_KEY
+                elif ch == '}':
+                    self.state = self.DONE
+                else:
+                    self.state = self.FAILED
+        return completed
+
+    def _consume_string(self, chunk: str, i: int, completed: list) -> int:
+        n = len(chunk)
+        while i < n:
+            if self._escape:
+                self._buf.append(chunk[i])
+                self._escape = False
+                i += 1
+                continue
+            m = _STRING_SPECIAL.search(chunk, i)
+            if not m:
+                self._buf.append(chunk[i:])
+                return n
+            j = m.start()
+            self._buf.append(chunk[i:j])
+            if chunk[j] == '\\':
+                self._buf.append('\\')
+                self._escape = True
+                i = j + 1
+                continue
+            self._finish_string(completed)
+            return j + 1
+        return n
+
+    def _finish_string(self, completed: list) -> None:
+        raw = "".join(self._buf)
+        self._buf = []
+        try:
+            value = json.loads('"' + raw + '"', strict=False)
+        except json.JSONDecodeError:
+            self.state = self.FAILED
+            return
+        if self.state == self.IN_KEY:
+            self._key = value
+            self.state = self.EXPECT_COLON
+        else:
+            self.concepts[self._key] = value
+            completed.append((self._key, value))
+            self._key = None
+            self.state = self.EXPECT_COMMA
+
+    def result(self) -> Optional[Dict[str, str]]:
+        """
+        返回解析完成的概念字典；若文本不完整或格式异常则返回None
+        """
+        if self.state == self.DONE and self.concepts:
+            return self.concepts
+        return None
@@ -0,0 +1,51 @@
+import itertools
+import os
+import sys
+import tempfile
+
+# 导入 models 时会按 DATABASE_URL 建库，测试使用临时目录中的 SQLite，不在仓库目录下建库
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{tempfile.mkdtemp()}/knowledge_graphs.db")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+
+# PostgreSQL 测试库，可用 TEST_POSTGRESQL_URL 指定，连接不上时跳过
+POSTGRESQL_URL = os.getenv('TEST_POSTGRESQL_URL', 'postgresql+psycopg://postgres@localhost/termsai_test')
+
+def _database_url(name: str, tmp_path) -> str:
+    if name == 'sqlite':
+        return f"sqlite:///{tmp_path}/test.db"
+    return POSTGRESQL_URL
+
+@pytest.fixture(params=['sqlite', 'postgresql'])
+def db(request, tmp_path, monkeypatch):
+    """
+    按 DATABASE_URL 建一个空库，并让 database 模块的读写会话都使用它；
+    只读会话在两个指向同一个库的引擎之间轮流使用，模拟只读副本
+    :return: 主库引擎
+    """
+    import database
+    import models
+    from graph_cache import hot_graphs
+
+    url = _database_url(request.param, tmp_path)
+    try:
+        engine = models.create_db_engine(url)
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+    except Exception as e:
+        pytest.skip(f"无法连接 {request.param}: {e}")
+    models.Base.metadata.drop_all(engine)
+    models.Base.metadata.create_all(engine)
+
+    replicas = [models.create_db_engine(url) for _ in range(2)]
+    monkeypatch.setattr(database, 'Session', sessionmaker(bind=engine))
+    monkeypatch.setattr(models, '_read_sessionmakers', itertools.cycle([sessionmaker(bind=replica) for replica in replicas]))
+    hot_graphs.clear()
+    yield engine
+    for replica in replicas:
+        replica.dispose()
+    models.Base.metadata.drop_all(engine)
+    engine.dispose()
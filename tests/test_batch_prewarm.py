@@ -0,0 +1,92 @@
+"""
+BatchPrewarm 对本地假批处理服务（见 benchmark._start_stub_batch_server）的端到端测试：
+失败的任务记入检查点，中断后继续不会重复提交或重复记录
+"""
+import json
+import uuid
+import pytest
+import llm_batch
+from benchmark import _start_stub_batch_server
+from configs.client import PROVIDERS
+from prewarm import BatchPrewarm
+
+COUNT = 5
+
+@pytest.fixture
+def stub(db, tmp_path, monkeypatch):
+    """
+    启动假批处理服务，并让 stub-batch 模型使用它
+    :return: 启动函数，参数同 _start_stub_batch_server，返回 (各接口的请求次数, 每个已创建批处理的请求ID列表)
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("STUB_API_KEY", "stub")
+
+    def start(**kwargs):
+        base_url, calls, submitted = _start_stub_batch_server(**kwargs)
+        monkeypatch.setitem(PROVIDERS, "stub-batch", {"models": ["stub-batch"], "api_key_env": "STUB_API_KEY", "base_url": base_url})
+        return calls, submitted
+    return start
+
+def _jobs(n):
+    # 人物预判结论会缓存在进程内，每个测试使用不同的主题
+    prefix = uuid.uuid4().hex[:8]
+    return [(f"{prefix} topic {i}", COUNT) for i in range(n)]
+
+def _worker():
+    return BatchPrewarm(model="stub-batch", poll_interval=0.05, state="batch.json", checkpoint="checkpoint.jsonl")
+
+def _checkpoint():
+    with open("checkpoint.jsonl", encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+def _fail(jobs, prejudge, concepts):
+    """
+    让指定主题的人物预判和指定任务序号的概念生成失败
+    """
+    def fail_for(request):
+        prompt = request["body"]["messages"][0]["content"]
+        if request["custom_id"] == jobs[prejudge][0]:
+            return True
+        return request["custom_id"] == str(concepts) and '"relations"' not in prompt
+    return fail_for
+
+def test_failed_jobs_land_in_checkpoint(stub):
+    jobs = _jobs(4)
+    calls, submitted = stub(fail_for=_fail(jobs, prejudge=0, concepts=1))
+    counts = _worker().run(jobs)
+    assert counts == {'done': 2, 'skipped': 0, 'failed': 2}
+    statuses = {(record['topic'], record['count']): record['status'] for record in _checkpoint()}
+    assert statuses == {jobs[0]: 'failed', jobs[1]: 'failed', jobs[2]: 'done', jobs[3]: 'done'}
+    assert calls["/v1/batches"] == 3
+
+    # 再次运行只重试失败的任务：重新预判主题 0，为主题 1（新任务列表中的序号 1）生成概念，已完成的主题不再提交
+    _worker().run(jobs)
+    assert submitted[3:] == [[jobs[0][0]], ["1"]]
+
+def test_resume_does_not_resubmit_or_record_twice(stub, monkeypatch):
+    jobs = _jobs(4)
+    calls, submitted = stub(fail_for=_fail(jobs, prejudge=0, concepts=1))
+
+    # 在等待概念批处理时中断
+    wait_for_batch = llm_batch.wait_for_batch
+    seen = []
+
+    def interrupted(batch_id, model, poll_interval=60, timeout=None):
+        if batch_id not in seen:
+            seen.append(batch_id)
+            if len(seen) == 2:
+                raise KeyboardInterrupt
+        return wait_for_batch(batch_id, model, poll_interval, timeout)
+    monkeypatch.setattr(llm_batch, 'wait_for_batch', interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        _worker().run(jobs)
+    assert calls["/v1/batches"] == 2
+
+    counts = _worker().run(jobs)
+    assert counts == {'done': 2, 'skipped': 0, 'failed': 1}
+    # 继续等待已提交的概念批处理，三个阶段各只提交一次
+    assert calls["/v1/batches"] == 3
+    assert submitted[1:] == [["1", "2", "3"], ["2", "3"]]
+    records = _checkpoint()
+    assert [(record['topic'], record['status']) for record in records].count((jobs[0][0], 'failed')) == 1
+    assert len(records) == len(jobs)
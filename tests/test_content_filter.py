@@ -0,0 +1,35 @@
+"""
+流式过滤扫描器（content_filter.StreamScanner）跨chunk命中过滤词，以及词表热加载
+"""
+import os
+from content_filter import ContentFilter
+
+def _filter(tmp_path, words):
+    path = tmp_path / "filters.txt"
+    path.write_text("\n".join(words), encoding='utf-8')
+    return ContentFilter(str(path), reload_interval=0)
+
+def _rewrite(content_filter, words):
+    with open(content_filter.path, 'w', encoding='utf-8') as f:
+        f.write("\n".join(words))
+    # 确保修改时间变化，触发热加载
+    stat = os.stat(content_filter.path)
+    os.utime(content_filter.path, (stat.st_atime, stat.st_mtime + 1))
+
+def test_word_across_chunks(tmp_path):
+    scanner = _filter(tmp_path, ["forbidden"]).scanner()
+    assert not scanner.feed("this is forb")
+    assert scanner.feed("IDDEN text")
+
+def test_reload_during_stream_keeps_scanner_consistent(tmp_path):
+    content_filter = _filter(tmp_path, ["ab"])
+    scanner = content_filter.scanner()
+    assert not scanner.feed("xxlongerw")
+    # 热加载加入更长的词：正在进行的扫描器仍使用创建时的词表，新的扫描器使用新词表
+    _rewrite(content_filter, ["ab", "longerword"])
+    assert not scanner.feed("ord")
+    assert scanner.feed("ab")
+    fresh = content_filter.scanner()
+    assert not fresh.feed("xxlongerw")
+    assert fresh.feed("ord")
+    assert content_filter.contains("a longerword")
@@ -0,0 +1,98 @@
+"""
+数据库方言相关的路径（upsert、UPDATE ... RETURNING、JSON/JSONB 列、只读会话轮流使用），
+在 SQLite 和 PostgreSQL 上分别运行（见 conftest.db）
+"""
+from sqlalchemy import event, inspect, select
+from sqlalchemy.engine import Engine
+from database import DatabaseManager, _write
+from models import ReadSession, KnowledgeGraph, UserView, TopicDemand
+
+CONCEPTS = {"主题 (Topic)": "介绍", "子概念 (Sub)": "介绍"}
+RELATIONSHIPS = [["主题 (Topic)", "子概念 (Sub)", "包含"]]
+
+def _save(topic="Topic", count=5):
+    return DatabaseManager.save_knowledge_graph(topic, count, CONCEPTS, RELATIONSHIPS, is_person=0)
+
+def test_user_view_upsert_ignores_duplicates(db):
+    graph_id = _save()
+    for _ in range(3):
+        DatabaseManager.record_user_view("user", graph_id, wait=True)
+    with ReadSession() as session:
+        assert session.query(UserView).filter_by(user_id="user", graph_id=graph_id).count() == 1
+    assert DatabaseManager.get_viewed_count("topic", 5, "user") == 1
+
+def test_topic_demand_upsert_accumulates(db):
+    for _ in range(3):
+        _write('demand', ("topic", 5)).result()
+    with ReadSession() as session:
+        demand = session.get(TopicDemand, ("topic", 5))
+        assert demand.requests == 3
+    assert DatabaseManager.get_warm_list() == [("topic", 5, 3, 0)]
+
+def test_warm_list_covers_normalized_variants(db):
+    # 需求按规范化后的主题记录，全角字母、多余空白的写法保存的图谱也应计入
+    _write('demand', ("full width", 5)).result()
+    _save("Ｆｕｌｌ  Width")
+    assert DatabaseManager.get_warm_list() == []
+    assert DatabaseManager.count_graphs("full width", 5) == 1
+
+def test_feedback_update_returning(db):
+    graph_id = _save()
+    assert DatabaseManager.update_feedback(graph_id, True) == {'id': graph_id, 'likes': 1, 'dislikes': 0, 'score': 1}
+    # 评分目前只计点赞数
+    assert DatabaseManager.update_feedback(graph_id, False) == {'id': graph_id, 'likes': 1, 'dislikes': 1, 'score': 1}
+
+def test_graph_payload_round_trip(db):
+    graph_id = _save()
+    if db.dialect.name == 'postgresql':
+        columns = {column['name']: column['type'] for column in inspect(db).get_columns(KnowledgeGraph.__tablename__)}
+        assert type(columns['concepts']).__name__ == 'JSONB'
+        assert type(columns['relationships']).__name__ == 'JSONB'
+    graph = DatabaseManager.get_best_graph("Topic", 5)
+    assert graph['id'] == graph_id
+    assert graph['concepts'] == CONCEPTS
+    assert graph['relationships'] == RELATIONSHIPS
+    assert graph['network_data']['nodes']
+
+def test_read_sessions_round_robin(db):
+    _save()
+    binds = []
+    for _ in range(4):
+        with ReadSession() as session:
+            binds.append(session.get_bind())
+            assert session.execute(select(KnowledgeGraph.topic)).scalar() == "topic"
+    assert binds[0] is not binds[1]
+    assert binds[0] is binds[2] and binds[1] is binds[3]
+
+def _selects(fn):
+    """
+    调用 fn 并返回其间执行的查询语句
+    """
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(Engine, 'before_cursor_execute', record)
+    try:
+        return fn(), [s for s in statements if s.lstrip().upper().startswith(('SELECT', 'WITH'))]
+    finally:
+        event.remove(Engine, 'before_cursor_execute', record)
+
+def test_best_graph_is_one_statement(db):
+    graph_id = _save()
+    other_id = _save()
+    DatabaseManager.update_feedback(graph_id, True)
+    graph, selects = _selects(lambda: DatabaseManager.get_best_graph("Topic", 5))
+    assert len(selects) == 1, selects
+    assert graph['id'] == graph_id
+    assert graph['total_available'] == 2
+    assert graph['concepts'] == CONCEPTS
+    assert graph['network_data']['nodes']
+
+    graph, selects = _selects(lambda: DatabaseManager.get_best_graph("Topic", 5, exclude_ids=[graph_id]))
+    assert len(selects) == 1, selects
+    assert (graph['id'], graph['total_available']) == (other_id, 1)
+    DatabaseManager.record_user_view("user", other_id, wait=True)
+    graph, selects = _selects(lambda: DatabaseManager.get_user_best_graph("Topic", 5, "user"))
+    assert len(selects) == 1, selects
+    assert graph['id'] == graph_id
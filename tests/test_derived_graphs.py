@@ -0,0 +1,40 @@
+"""
+从节点更多的图谱派生较小的图谱（app.derive_cached_graph）
+"""
+import json
+import threading
+import app
+from database import DatabaseManager
+from graph_cache import hot_graphs
+
+CONCEPTS = {f"概念{i} (C{i})": "介绍" for i in range(12)}
+RELATIONSHIPS = [[f"概念{i} (C{i})", f"概念{i + 1} (C{i + 1})", "相关"] for i in range(11)]
+
+def _fetch(topic, count):
+    event = hot_graphs.fetch(topic, count, lambda: app.load_cached_graph_event(topic, count))
+    return json.loads(event.decode('utf-8')[len("data:"):])['data']
+
+def test_unsaved_derived_graph_has_no_id_and_follows_source(db, monkeypatch):
+    monkeypatch.setattr(app, 'save_derived_graphs', False)
+    source_id = DatabaseManager.save_knowledge_graph("AI", 12, CONCEPTS, RELATIONSHIPS)
+    data = _fetch("AI", 5)
+    assert data['graph_id'] is None
+    assert len(data['concepts']) == 5
+    assert hot_graphs.get("AI", 5) is not None
+    # 来源图谱的点赞使派生图谱的缓存一并失效
+    DatabaseManager.update_feedback(source_id, True)
+    assert hot_graphs.get("AI", 5) is None
+    assert DatabaseManager.count_graphs("AI", 5) == 0
+
+def test_concurrent_misses_save_one_derived_graph(db, monkeypatch):
+    monkeypatch.setattr(app, 'save_derived_graphs', True)
+    DatabaseManager.save_knowledge_graph("AI", 12, CONCEPTS, RELATIONSHIPS)
+    ids = []
+    threads = [threading.Thread(target=lambda: ids.append(app.derive_cached_graph("AI", 5)[0]['id'])) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(set(ids)) == 1 and None not in ids
+    assert DatabaseManager.count_graphs("AI", 5) == 1
+    assert not app.derive_locks
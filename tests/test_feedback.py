@@ -0,0 +1,40 @@
+"""
+并发点赞：多个线程同时写入同一个图谱，最终点赞数必须等于写入次数（见 conftest.db）
+"""
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import database
+from database import DatabaseManager
+from db_writer import FeedbackAggregator
+from models import ReadSession, KnowledgeGraph
+
+THREADS = 16
+LIKES_PER_THREAD = 50
+
+def _hammer(graph_id: int) -> None:
+    def worker(_):
+        for _ in range(LIKES_PER_THREAD):
+            DatabaseManager.update_feedback(graph_id, True)
+    with ThreadPoolExecutor(max_workers=THREADS) as executor:
+        list(executor.map(worker, range(THREADS)))
+
+def _likes(graph_id: int) -> int:
+    with ReadSession() as session:
+        return session.get(KnowledgeGraph, graph_id).likes
+
+@pytest.fixture
+def graph_id(db):
+    return DatabaseManager.save_knowledge_graph("topic", 5, {"主题 (Topic)": "介绍"}, [], is_person=0)
+
+def test_concurrent_likes_are_not_lost(graph_id):
+    _hammer(graph_id)
+    assert _likes(graph_id) == THREADS * LIKES_PER_THREAD
+
+def test_concurrent_likes_with_aggregation(graph_id, monkeypatch):
+    aggregator = FeedbackAggregator(database._flush_feedback, interval=0.05)
+    monkeypatch.setattr(database, 'feedback_flush_interval', 0.05)
+    monkeypatch.setattr(database, '_feedback', aggregator)
+    _hammer(graph_id)
+    aggregator.flush_now()
+    assert _likes(graph_id) == THREADS * LIKES_PER_THREAD
+    aggregator.close()
@@ -0,0 +1,37 @@
+"""
+热门图谱缓存的键规范化与别名失效
+"""
+from graph_cache import HotGraphCache
+
+def test_key_is_normalized():
+    cache = HotGraphCache()
+    assert cache.fetch("Ｍachine  Learning ", 5, lambda: (b"event", ("Ｍachine  Learning ", 5))) == b"event"
+    assert cache.get("machine learning", 5) == b"event"
+    cache.invalidate("MACHINE LEARNING", 5)
+    assert cache.get("machine learning", 5) is None
+
+def test_alias_invalidated_with_source():
+    cache = HotGraphCache()
+    cache.load("machine-learning", 5, lambda: (b"similar", ("machine learning", 5)))
+    cache.load("machine learning", 5, lambda: (b"source", ("machine learning", 5)))
+    assert cache.get("machine-learning", 5) == b"similar"
+    # 来源图谱被点赞/点踩或保存了新图谱时，别名一并失效
+    cache.invalidate("machine learning", 5)
+    assert cache.get("machine-learning", 5) is None
+    assert cache.get("machine learning", 5) is None
+
+def test_alias_not_stored_when_source_invalidated_during_load():
+    cache = HotGraphCache()
+
+    def build():
+        cache.invalidate("machine learning", 5)
+        return b"stale", ("machine learning", 5)
+    assert cache.load("machine-learning", 5, build) == b"stale"
+    assert cache.get("machine-learning", 5) is None
+
+def test_evicted_alias_is_forgotten():
+    cache = HotGraphCache(maxsize=1)
+    cache.load("alias", 5, lambda: (b"alias", ("source", 10)))
+    cache.load("other", 5, lambda: (b"other", ("other", 5)))
+    assert cache.get("alias", 5) is None
+    assert not cache._aliases
@@ -0,0 +1,25 @@
+"""
+图谱只读接口 /graphs/<id>.json 的条件请求
+"""
+import pytest
+import app
+from database import DatabaseManager
+from graph_cache import EncodedGraphCache
+
+@pytest.fixture
+def client(db, monkeypatch):
+    monkeypatch.setattr(app, 'graph_files', EncodedGraphCache())
+    return app.app.test_client()
+
+def test_matching_etag_returns_304_for_existing_graph(client):
+    graph_id = DatabaseManager.save_knowledge_graph("topic", 5, {"主题 (Topic)": "介绍"}, [], is_person=0)
+    etag = client.get(f"/graphs/{graph_id}.json").headers['ETag'].strip('"')
+    assert client.get(f"/graphs/{graph_id}.json", headers={'If-None-Match': f'"{etag}"'}).status_code == 304
+
+    # 编码缓存未命中时按主键确认图谱存在
+    app.graph_files = EncodedGraphCache()
+    assert client.get(f"/graphs/{graph_id}.json", headers={'If-None-Match': f'"{etag}"'}).status_code == 304
+
+def test_matching_etag_for_missing_graph_is_404(client):
+    etag = f"graph-999-v{app.GRAPH_FILE_VERSION}.{app.NETWORK_DATA_VERSION}"
+    assert client.get("/graphs/999.json", headers={'If-None-Match': f'"{etag}"'}).status_code == 404
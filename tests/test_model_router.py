@@ -0,0 +1,55 @@
+"""
+流式调用在流结束时才向模型路由器记录结果：延迟覆盖整个流，中途出错计为失败
+"""
+import time
+from types import SimpleNamespace
+import pytest
+import model_router
+import utils
+
+def _chunk(content):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))])
+
+class FakeStream:
+    def __init__(self, chunks, delay, error=None):
+        self.chunks, self.delay, self.error = chunks, delay, error
+
+    def __iter__(self):
+        for content in self.chunks:
+            time.sleep(self.delay)
+            yield _chunk(content)
+        if self.error:
+            raise self.error
+
+@pytest.fixture
+def router(monkeypatch):
+    router = model_router.ModelRouter("stub-a", [])
+    monkeypatch.setattr(utils, 'model_router', router)
+    return router
+
+def _serve(monkeypatch, stream):
+    create = lambda **kwargs: stream
+    monkeypatch.setattr(utils, 'client', lambda model: SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create))))
+
+def test_stream_latency_covers_whole_stream(router, monkeypatch):
+    _serve(monkeypatch, FakeStream(["a"] * 5, delay=0.02))
+    chunks = utils.call_llm_api([{"role": "user", "content": "hi"}], "test", stream=True)
+    assert router.stats()["stub-a"]["requests"] == 0
+    assert "".join(chunks) == "aaaaa"
+    health = router._health["stub-a"]
+    assert [ok for _, ok, _ in health.samples] == [True]
+    assert health.samples[0][0] >= 0.1
+
+def test_error_mid_stream_counts_as_failure(router, monkeypatch):
+    _serve(monkeypatch, FakeStream(["a"] * 2, delay=0, error=ConnectionError("reset")))
+    chunks = utils.call_llm_api([{"role": "user", "content": "hi"}], "test", stream=True)
+    with pytest.raises(ConnectionError):
+        list(chunks)
+    assert [ok for _, ok, _ in router._health["stub-a"].samples] == [False]
+
+def test_stream_closed_early_records_nothing(router, monkeypatch):
+    _serve(monkeypatch, FakeStream(["a"] * 5, delay=0))
+    chunks = utils.call_llm_api([{"role": "user", "content": "hi"}], "test", stream=True)
+    next(chunks)
+    chunks.close()
+    assert not router._health["stub-a"].samples
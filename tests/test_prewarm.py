@@ -0,0 +1,24 @@
+"""
+PrewarmWorker 检查点：watch 模式在冷却时间内跳过最近失败的任务
+"""
+import json
+from prewarm import PrewarmWorker
+
+def _fail(topic, count):
+    raise ValueError("parse error")
+
+def test_recently_failed_jobs_cool_down(db, tmp_path):
+    checkpoint = str(tmp_path / "checkpoint.jsonl")
+    worker = PrewarmWorker(retries=0, checkpoint=checkpoint, generate=_fail)
+    worker.run([("failing topic", 5)], resume=False)
+    assert worker.recently_failed(3600) == {("failing topic", 5)}
+    assert worker.recently_failed(-1) == set()
+
+    # 之后成功的任务不再处于冷却中
+    PrewarmWorker(retries=0, checkpoint=checkpoint, generate=lambda topic, count: 1).run([("failing topic", 5)], resume=False)
+    assert worker.recently_failed(3600) == set()
+
+def test_checkpoint_without_timestamp_is_not_cooling_down(tmp_path):
+    checkpoint = tmp_path / "checkpoint.jsonl"
+    checkpoint.write_text(json.dumps(dict(topic="old", count=5, status="failed")) + "\n", encoding='utf-8')
+    assert PrewarmWorker(checkpoint=str(checkpoint)).recently_failed(3600) == set()
@@ -0,0 +1,76 @@
+"""
+排队位置事件：投机预判、投机概念流和流水线关系批次在其他线程中调用模型，
+排队时也应通知发起生成的单飞请求（rate_limit.queue_listener）
+"""
+import json
+import threading
+import pytest
+import model_router
+import rate_limit
+import utils
+from benchmark import _start_stub_llm_server
+from configs.client import PROVIDERS
+from pipeline import PipelinedRelationships
+from rate_limit import provider_limits
+from single_flight import SingleFlight
+
+@pytest.fixture
+def reports(db, monkeypatch):
+    """
+    只有一个并发名额的假服务商，记录每次排队通知所在的线程以及当时是否有排队通知函数
+    :return: [(线程名, 是否有排队通知函数)]
+    """
+    base_url = _start_stub_llm_server(latency=0.2, stream_chunks=10, chunk_delay=0.02)
+    monkeypatch.setitem(PROVIDERS, "stub", {"models": ["stub-a"], "api_key_env": "STUB_API_KEY", "base_url": base_url})
+    monkeypatch.setenv("STUB_API_KEY", "stub")
+    monkeypatch.setattr(utils, 'model_router', model_router.ModelRouter("stub-a", []))
+    monkeypatch.setattr(provider_limits, '_limiters', {})
+    provider_limits.configure("stub", max_in_flight=1)
+
+    records = []
+    report = rate_limit.ProviderLimiter._report
+
+    def recording_report(self, position, wait, last):
+        if position > 0:
+            records.append((threading.current_thread().name, rate_limit.queue_listener.get() is not None))
+        return report(self, position, wait, last)
+    monkeypatch.setattr(rate_limit.ProviderLimiter, '_report', recording_report)
+    return records
+
+def _queue_positions(producer):
+    stream = SingleFlight("test").join("key", producer)
+    events = [json.loads(event[len("data:"):]) for event in stream]
+    assert events[-1]['status'] == 'complete'
+    return [event['queue_position'] for event in events if event['status'] == 'queued']
+
+def _complete():
+    return "data: " + json.dumps({'status': 'complete', 'progress': 100}) + '\n\n'
+
+def test_speculative_prejudge_reports_queue_position(reports):
+    # 预判和投机概念流同时开始，只有一个名额时其中一个需要排队
+    def producer():
+        is_person, chunks = utils.judge_and_generate_concepts("queued topic", 5, speculative=True)
+        assert not is_person
+        for _ in chunks:
+            pass
+        yield _complete()
+    assert 1 in _queue_positions(producer)
+    assert reports
+    assert all(has_listener for _, has_listener in reports)
+    assert {name for name, _ in reports} <= {"prejudge", "speculative-concepts"}
+
+def test_pipelined_relationships_report_queue_position(reports):
+    # 概念流占用唯一的名额时，流水线提交的关系批次需要排队
+    def producer():
+        stream = utils.call_llm_api([{"role": "user", "content": "概念"}], "测试", stream=True)
+        next(stream)
+        builder = PipelinedRelationships(batch_size=1)
+        builder.add("概念 (Concept)", "介绍")
+        for _ in stream:
+            pass
+        builder.finish({"概念 (Concept)": "介绍"})
+        yield _complete()
+    assert 1 in _queue_positions(producer)
+    assert reports
+    assert all(has_listener for _, has_listener in reports)
+    assert all(name.startswith("relationships") for name, _ in reports)
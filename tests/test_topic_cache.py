@@ -0,0 +1,56 @@
+"""
+相近主题索引与人物预判缓存
+"""
+import threading
+import time
+import topic_cache
+from database import DatabaseManager
+from topic_cache import TopicIndex
+
+CONCEPTS = {"主题 (Topic)": "介绍", "子概念 (Sub)": "介绍"}
+RELATIONSHIPS = [["主题 (Topic)", "子概念 (Sub)", "包含"]]
+
+def test_saved_graph_is_matched_without_refresh(db, monkeypatch):
+    index = TopicIndex(threshold=0.8, refresh_interval=3600)
+    monkeypatch.setattr(topic_cache, 'topic_index', index)
+    assert index.match("Machine Learning", 5) is None
+    DatabaseManager.save_knowledge_graph("Machine Learning", 5, CONCEPTS, RELATIONSHIPS)
+    assert index.match("machine-learning", 5) == "machine learning"
+    assert index.match("Machine Learnin", 5) == "machine learning"
+    assert index.match("Machine Learning", 10) is None
+
+def test_match_does_not_wait_for_refresh(db, monkeypatch):
+    index = TopicIndex(threshold=0.8, refresh_interval=0)
+    index.add("deep learning", 5)
+    loading = threading.Event()
+    get_graph_topics = DatabaseManager.get_graph_topics
+
+    def slow_get_graph_topics(after_id=0, limit=10000):
+        loading.set()
+        time.sleep(1)
+        return get_graph_topics(after_id, limit)
+    monkeypatch.setattr(DatabaseManager, 'get_graph_topics', staticmethod(slow_get_graph_topics))
+    refresh = threading.Thread(target=index.match, args=("unknown", 5))
+    refresh.start()
+    assert loading.wait(1)
+    # 其他线程正在从数据库加载时，直接使用已加载的主题匹配
+    start = time.monotonic()
+    assert index.match("Deep Learning", 5) == "deep learning"
+    assert time.monotonic() - start < 0.5
+    refresh.join()
+
+def test_graph_verdict_expires_manual_does_not(db):
+    DatabaseManager.save_knowledge_graph("Graph Topic", 5, CONCEPTS, RELATIONSHIPS, is_person=1)
+    cache = topic_cache.TopicClassificationCache(ttl=60)
+    assert cache.get("Graph Topic") is True
+    assert cache._entries["graph topic"][1] is not None
+    # 沿用已有图谱的结果可以被之后的模型预判覆盖
+    cache.set("Graph Topic", False)
+    assert cache.get("Graph Topic") is False
+
+    cache.override("Manual Topic", True)
+    fresh = topic_cache.TopicClassificationCache(ttl=60)
+    assert fresh.get("Manual Topic") is True
+    assert fresh._entries["manual topic"][1] is None
+    fresh.set("Manual Topic", False)
+    assert fresh.get("Manual Topic") is True
@@ -0,0 +1,232 @@
+import argparse
+import itertools
+import math
+import threading
+import time
+from array import array
+from collections import Counter, OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from configs import person_verdict_ttl, person_verdict_cache_size, topic_similarity_threshold, topic_index_refresh_interval
+from database import DatabaseManager
+from topic_text import normalize_topic, fold_topic, topic_grams
+
+class TopicIndex:
+    """
+    相近主题索引：已有图谱的主题按字符二元组建立倒排索引，
+    为没有图谱的主题找到Dice相似度不低于阈值、且有相同节点数量图谱的已有主题。
+    空白、标点、大小写、全角半角不同的主题折叠后完全相同，直接命中；拼写略有差异的主题按相似度匹配。
+    索引从数据库按图谱ID增量加载，多进程部署下各进程也能看到其他进程保存的主题。
+    """
+    def __init__(self, threshold: float = topic_similarity_threshold, refresh_interval: float = topic_index_refresh_interval):
+        """
+        :param threshold: 最低相似度，0 表示关闭相近主题匹配
+        :param refresh_interval: 从数据库增量加载新主题的最短间隔（秒）
+        """
+        self.threshold = threshold
+        self.refresh_interval = refresh_interval
+        self._topics: List[str] = []  # 主题编号 -> 数据库中保存的主题
+        self._masks: List[int] = []  # 主题编号 -> 已有图谱的节点数量位图
+        self._sizes = array('I')  # 主题编号 -> 二元组个数
+        self._numbers: Dict[str, int] = {}  # 主题 -> 主题编号
+        self._folded: Dict[str, List[int]] = {}  # 折叠后的主题 -> 主题编号
+        self._postings: Dict[str, array] = {}  # 二元组 -> 含有它的主题编号
+        self._last_id = 0
+        self._refreshed_at = float("-inf")
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self.exact_matches = 0
+        self.similar_matches = 0
+        self.misses = 0
+
+    def add(self, topic: str, concept_count: int) -> None:
+        """
+        把已有图谱的主题加入索引
+        """
+        with self._lock:
+            self._add(topic, concept_count)
+
+    def _add(self, topic: str, concept_count: int) -> None:
+        number = self._numbers.get(topic)
+        if number is None:
+            folded = fold_topic(topic)
+            if not folded:
+                return
+            number = len(self._topics)
+            self._topics.append(topic)
+            self._masks.append(0)
+            self._numbers[topic] = number
+            self._folded.setdefault(folded, []).append(number)
+            grams = topic_grams(folded)
+            self._sizes.append(len(grams))
+            for gram in grams:
+                self._postings.setdefault(gram, array('I')).append(number)
+        self._masks[number] |= 1 << concept_count
+
+    def _refresh(self) -> None:
+        """
+        从数据库增量加载新主题。查询数据库时不持有 _lock，只在把一页主题加入索引时短暂持有；
+        同一时间只有一个线程加载，其他线程不等待，直接使用已加载的主题匹配
+        """
+        if time.monotonic() - self._refreshed_at < self.refresh_interval or not self._refresh_lock.acquire(blocking=False):
+            return
+        try:
+            self._refreshed_at = time.monotonic()
+            while True:
+                rows = DatabaseManager.get_graph_topics(self._last_id)
+                with self._lock:
+                    for graph_id, topic, concept_count in rows:
+                        self._add(topic, concept_count)
+                        self._last_id = graph_id
+                if len(rows) < 10000:
+                    return
+        finally:
+            self._refresh_lock.release()
+
+    def match(self, topic: str, concept_count: int) -> Optional[str]:
+        """
+        查找与主题相近、且有该节点数量图谱的已有主题
+        :return: 数据库中保存的主题；没有足够相近的主题时返回None
+        """
+        if self.threshold <= 0:
+            return None
+        folded = fold_topic(topic)
+        if not folded:
+            return None
+        bit = 1 << concept_count
+        self._refresh()
+        with self._lock:
+            for number in self._folded.get(folded, ()):
+                if self._masks[number] & bit:
+                    self.exact_matches += 1
+                    return self._topics[number]
+
+            grams = topic_grams(folded)
+            # 在倒排列表中统计每个主题与查询共有的二元组数，Dice ≥ t 至少需要共有 ceil(t·|q| / (2 - t)) 个
+            shared = Counter(itertools.chain.from_iterable(self._postings.get(gram, ()) for gram in grams))
+            least = math.ceil(self.threshold * len(grams) / (2 - self.threshold))
+            best_topic, best_score = None, self.threshold
+            for number, count in shared.items():
+                if count < least or not self._masks[number] & bit:
+                    continue
+                score = 2 * count / (len(grams) + self._sizes[number])
+                if score >= best_score:
+                    best_topic, best_score = self._topics[number], score
+            if best_topic is None:
+                self.misses += 1
+            else:
+                self.similar_matches += 1
+            return best_topic
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'topics': len(self._topics),
+                'exact_matches': self.exact_matches,
+                'similar_matches': self.similar_matches,
+                'misses': self.misses
+            }
+
+class TopicClassificationCache:
+    """
+    主题人物预判缓存：进程内LRU在前，SQLite表 topic_classifications 在后。
+    模型预判和沿用已有图谱的结果按TTL过期，人工指定的结果永不过期。
+    """
+    def __init__(self, maxsize: int = person_verdict_cache_size, ttl: float = person_verdict_ttl):
+        """
+        :param maxsize: 进程内LRU的最大条目数
+        :param ttl: 模型预判结果的有效期（秒）
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # topic -> (is_person, 过期时间戳或None)
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    def _remember(self, key: str, is_person: bool, expires_at: Optional[float]) -> None:
+        with self._lock:
+            self._entries[key] = (is_person, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get(self, topic: str) -> Optional[bool]:
+        """
+        查询主题的人物预判结果，未命中或已过期时返回None
+        """
+        key = normalize_topic(topic)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                is_person, expires_at = entry
+                if expires_at is None or expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.memory_hits += 1
+                    return is_person
+                del self._entries[key]
+
+        record = DatabaseManager.get_topic_classification(key)
+        if record is not None:
+            # 只有人工指定的结果不过期；沿用已有图谱的结果（没有更新时间）从现在起按TTL过期
+            expires_at = None
+            if record['source'] != 'manual':
+                expires_at = now + self.ttl
+                if record['updated_at'] is not None:
+                    expires_at = (record['updated_at'] + timedelta(seconds=self.ttl) - datetime.utcnow()).total_seconds() + now
+            if expires_at is None or expires_at > now:
+                self._remember(key, record['is_person'], expires_at)
+                with self._lock:
+                    self.db_hits += 1
+                return record['is_person']
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, topic: str, is_person: bool, source: str = 'llm') -> None:
+        """
+        保存主题的人物预判结果
+        :param source: llm 表示模型预判，manual 表示人工指定（不过期，且不会被模型预判覆盖）
+        """
+        key = normalize_topic(topic)
+        if source != 'manual':
+            with self._lock:
+                entry = self._entries.get(key)
+            if entry is not None and entry[1] is None:
+                return
+        DatabaseManager.save_topic_classification(key, is_person, source)
+        self._remember(key, is_person, None if source == 'manual' else time.time() + self.ttl)
+
+    def override(self, topic: str, is_person: bool) -> None:
+        """
+        人工指定主题是否为人物
+        """
+        self.set(topic, is_person, source='manual')
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            total = self.memory_hits + self.db_hits + self.misses
+            return {
+                'size': len(self._entries),
+                'memory_hits': self.memory_hits,
+                'db_hits': self.db_hits,
+                'misses': self.misses,
+                'hit_rate': (self.memory_hits + self.db_hits) / total if total else 0.0
+            }
+
+# 进程内共享的人物预判缓存
+person_cache = TopicClassificationCache()
+
+# 进程内共享的相近主题索引
+topic_index = TopicIndex()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="人工指定主题是否为人物")
+    parser.add_argument('topic')
+    parser.add_argument('is_person', choices=['0', '1'])
+    args = parser.parse_args()
+    person_cache.override(args.topic, args.is_person == '1')
+    print(f"已设置主题 '{normalize_topic(args.topic)}' 是否为人物: {args.is_person == '1'}")
@@ -0,0 +1,24 @@
+"""
+主题文本的规范化，供缓存键、单飞合并键和数据库中的主题共用；不依赖其他模块，各处均可导入
+"""
+import unicodedata
+from typing import Set
+
+def normalize_topic(topic: str) -> str:
+    """
+    规范化主题文本，用于缓存键：Unicode兼容规范化、去除首尾空白、合并连续空白并转小写
+    """
+    return " ".join(unicodedata.normalize("NFKC", topic).split()).lower()
+
+def fold_topic(topic: str) -> str:
+    """
+    在 normalize_topic 的基础上去掉所有空白和标点符号，只保留字母和数字，用于相近主题匹配
+    """
+    return "".join(ch for ch in normalize_topic(topic) if unicodedata.category(ch)[0] in "LN")
+
+def topic_grams(folded: str) -> Set[str]:
+    """
+    折叠后主题的字符二元组（首尾加边界标记，单字主题也有二元组）
+    """
+    padded = "^" + folded + "$"
+    return {padded[i:i + 2] for i in range(len(padded) - 1)}
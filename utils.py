@@ -1,10 +1,37 @@
-from configs import client, model, backup_models
-from configs.prompt_configs import CONCEPT_PROMPT_TEMPLATE, RELATIONSHIP_PROMPT_TEMPLATE, NEW_CONCEPT_PROMPT_TEMPLATE, RELATIONSHIP_ORG_PROMPT_TEMPLATE, PREJUDGE_PROMPT_TEMPLATE, ORG_PROMPT_TEMPLATE, NEW_ORG_PROMPT_TEMPLATE
+from configs import client, speculative_prejudge
+from configs.prompt_configs import CONCEPT_PROMPT_TEMPLATE, RELATIONSHIP_PROMPT_TEMPLATE, NEW_CONCEPT_PROMPT_TEMPLATE, RELATIONSHIP_ORG_PROMPT_TEMPLATE, PREJUDGE_PROMPT_TEMPLATE, ORG_PROMPT_TEMPLATE, NEW_ORG_PROMPT_TEMPLATE, CROSS_RELATIONSHIP_PROMPT_TEMPLATE, CROSS_RELATIONSHIP_ORG_PROMPT_TEMPLATE
+import contextvars
 import json
+import queue
+import threading
 import time
+from concurrent.futures import Future
 from functools import wraps
-from typing import Any, Callable
+from typing import Any, Callable, Iterator, Optional, Tuple
 import re
+from content_filter import content_filter
+from topic_cache import person_cache, normalize_topic
+from model_router import model_router
+from rate_limit import provider_limits, estimate_tokens, RateLimitExceeded
+from network import format_label, create_network_data
+
+def _start_thread(fn: Callable, *args, name: str = "speculative") -> Future:
+    """
+    在新线程中运行 fn，沿用调用方的上下文（如 rate_limit.queue_listener 排队通知）。
+    投机执行每个请求各用一个线程，不与其他请求争用固定大小的线程池
+    :return: fn 结果的 Future
+    """
+    future = Future()
+    context = contextvars.copy_context()
+
+    def run():
+        future.set_running_or_notify_cancel()
+        try:
+            future.set_result(context.run(fn, *args))
+        except BaseException as e:
+            future.set_exception(e)
+    threading.Thread(target=run, name=name, daemon=True).start()
+    return future
 
 def retry_on_error(max_retries: int = 3, initial_delay: float = 1, max_delay: float = 8) -> Callable:
     """
@@ -106,63 +133,103 @@ def parse_json_response(text: str, error_context: str) -> dict:
                 f"详细错误: {str(e)}"
             )
 
+def chat_request(model: str, messages: list, stream: bool = False) -> dict:
+    """
+    构造 chat.completions 请求参数，在线调用和批处理文件共用
+    """
+    kwargs = {
+        "model": model,
+        "messages": messages,
+        "temperature": 0.7
+    }
+    if stream:
+        kwargs["stream"] = True
+    elif model not in ["deepseek-ai/DeepSeek-V3", "Pro/deepseek-ai/DeepSeek-V3"]:
+        kwargs["response_format"] = {"type": "json_object"}
+    return kwargs
+
+def settle_stream(model: str, start: float, completed: bool, error: Exception = None) -> None:
+    """
+    流式响应结束时向模型路由器记录结果：读完整个流才算成功（延迟为整个流的耗时），
+    中途出错计为失败，被调用方提前关闭（如投机生成被取消、命中过滤词）时只归还探测机会
+    :param start: 发出请求的时间
+    :param completed: 是否读完了整个流
+    :param error: 读取过程中出现的异常
+    """
+    if completed:
+        model_router.record_success(model, time.time() - start)
+    elif error is not None:
+        model_router.record_failure(model, "429" in str(error))
+    else:
+        model_router.release_probe(model)
+
 @retry_on_error(max_retries=3)
 def call_llm_api(messages: list, context: str, stream: bool = False):
     """
-    调用LLM API的通用函数，支持流式输出，遇到限流时自动切换模型
+    调用LLM API的通用函数，支持流式输出，由模型路由器为每个请求选择模型，遇到限流时切换到其他可用模型
     :param messages: 消息列表
     :param context: 错误上下文描述
     :param stream: 是否启用流式输出
     :return: 若 stream 为 False，则返回完整响应文本；若为 True，则返回生成器逐块yield内容
     """
-    global model  # 添加全局声明以便修改model变量
-    
-    try:
-        ai_client = client(model)
-        kwargs = {
-            "model": model,
-            "messages": messages,
-            "temperature": 0.7
-        }
-        if stream:
-            kwargs["stream"] = True
-        
-        if model in ["deepseek-ai/DeepSeek-V3", "Pro/deepseek-ai/DeepSeek-V3"]:
-            response = ai_client.chat.completions.create(**kwargs)
-        else:
-            if stream:
-                response = ai_client.chat.completions.create(**kwargs)
-            else:
-                kwargs["response_format"] = {"type": "json_object"}
-                response = ai_client.chat.completions.create(**kwargs)
+    tried = []
+    last_error = "没有可用的模型"
+    while True:
+        current_model = model_router.choose(exclude=tried)
+        if current_model is None:
+            raise Exception(f"{context}失败: {last_error}")
+        tried.append(current_model)
+        try:
+            # 主动排队等待服务商的名额和额度，而不是等收到429后再切换模型
+            permit = provider_limits.acquire(current_model, messages)
+        except RateLimitExceeded as e:
+            model_router.release_probe(current_model)
+            print(f"模型 {current_model} 排队过久，尝试其他可用模型")
+            last_error = str(e)
+            continue
+        start = time.time()
+        try:
+            ai_client = client(current_model)
+            response = ai_client.chat.completions.create(**chat_request(current_model, messages, stream))
+        except Exception as e:
+            permit.release()
+            rate_limited = "429" in str(e)
+            model_router.record_failure(current_model, rate_limited)
+            if rate_limited:
+                print(f"模型 {current_model} 遇到限流，尝试其他可用模型")
+                last_error = str(e)
+                continue
+            raise Exception(f"{context}失败: {str(e)}")
         
         if stream:
             def stream_generator():
-                for chunk in response:
-                    delta = chunk.choices[0].delta
-                    # 使用 getattr 获取 content 属性（防止出现 .get 错误）
-                    content = getattr(delta, "content", "")
-                    yield content
+                received = []
+                completed, error = False, None
+                try:
+                    for chunk in response:
+                        delta = chunk.choices[0].delta
+                        # 使用 getattr 获取 content 属性（防止出现 .get 错误）
+                        content = getattr(delta, "content", "")
+                        received.append(content or "")
+                        yield content
+                    completed = True
+                except Exception as e:
+                    error = e
+                    raise
+                finally:
+                    # 生成器被提前关闭时（如投机生成被取消）同时关闭底层HTTP流
+                    close = getattr(response, "close", None)
+                    if close:
+                        close()
+                    permit.release(permit.prompt_tokens + estimate_tokens("".join(received)))
+                    settle_stream(current_model, start, completed, error)
             return stream_generator()
         else:
+            model_router.record_success(current_model, time.time() - start)
+            usage = getattr(response, "usage", None)
+            permit.release(usage.total_tokens if usage else None)
             print(f"LLM回复: {response.choices[0].message.content}")
             return response.choices[0].message.content
-            
-    except Exception as e:
-        error_str = str(e)
-        if "429" in error_str:
-            # 定义备用模型列表
-            current_model = model
-            
-            # 选择一个不同于当前模型的备用模型
-            for backup_model in backup_models:
-                if backup_model != current_model:
-                    print(f"遇到限流，切换到备用模型: {backup_model}")
-                    model = backup_model
-                    # 递归调用自身，使用新模型重试
-                    return call_llm_api(messages, context, stream)
-                    
-        raise Exception(f"{context}失败: {str(e)}")
 
 def check_content_filter(text: str) -> bool:
     """
@@ -171,35 +238,112 @@ def check_content_filter(text: str) -> bool:
     :return: 如果包含过滤词返回True，否则返回False
     """
     try:
-        with open('static/filter.txt', 'r', encoding='utf-8') as f:
-            filter_words = [line.strip().lower() for line in f if line.strip()]
-        
-        text_lower = text.lower()
-        return any(word in text_lower for word in filter_words)
+        return content_filter.contains(text)
     except Exception as e:
         print(f"Error checking content filters: {e}")
         return False
 
 def pre_judge_person(topic: str) -> bool:
     """
-    预判主题是否为人物
+    预判主题是否为人物，先查询主题预判缓存，未命中时才调用LLM
     :param topic: 主题
     :return: 如果主题为人物返回True，否则返回False
     """
-    messages = [{
-        "role": "user",
-        "content": PREJUDGE_PROMPT_TEMPLATE.format(topic=topic)
-    }]
+    cached = person_cache.get(topic)
+    if cached is not None:
+        return cached
+    return _classify_person(topic)
+
+def _classify_person(topic: str) -> bool:
+    """
+    调用LLM预判主题是否为人物，并写入主题预判缓存
+    """
     response_text = call_llm_api(
-        messages,
+        prejudge_messages(topic),
         context="预判主题是否为人物"
     )
+    is_person = parse_person_verdict(response_text)
+    person_cache.set(topic, is_person)
+    return is_person
+
+def prejudge_messages(topic: str) -> list:
+    """
+    人物预判的消息列表
+    """
+    return [{
+        "role": "user",
+        "content": PREJUDGE_PROMPT_TEMPLATE.format(topic=topic)
+    }]
+
+def parse_person_verdict(response_text: str) -> bool:
+    """
+    解析人物预判的回复
+    """
     response_data = parse_json_response(
         response_text,
         error_context="处理预判主题是否为人物结果时"
     )   
     return response_data["result"] == "1"  # 确保返回布尔值
 
+def judge_and_generate_concepts(topic: str, count: int = 10, speculative: bool = speculative_prejudge) -> Tuple[bool, Iterator[str]]:
+    """
+    预判主题是否为人物并开始流式生成概念
+    投机模式下，预判请求与更可能的概念提示词（非人物）并发执行：投机流由单独的线程读入队列，
+    预判结果一致则从队列继续读取，不一致则取消该流并改用人物提示词重新生成。
+    :param topic: 主题
+    :param count: 概念数量
+    :param speculative: 是否启用投机执行，默认使用 configs 中的 speculative_prejudge
+    :return: (是否为人物, 概念文本chunk迭代器)
+    """
+    is_person = person_cache.get(topic)
+    if is_person is not None or not speculative:
+        if is_person is None:
+            is_person = _classify_person(topic)
+        return is_person, generate_concepts(topic, count, is_person, True)
+
+    verdict = _start_thread(_classify_person, topic, name="prejudge")
+    chunks = queue.Queue()
+    cancelled = threading.Event()
+    done = object()
+
+    def pump():
+        # 生成器只能在读取它的线程中关闭，取消后在收到下一个chunk时停止读取
+        speculative_stream = generate_concepts(topic, count, False, True)
+        try:
+            for chunk in speculative_stream:
+                if cancelled.is_set():
+                    return
+                chunks.put(chunk)
+            chunks.put(done)
+        except Exception as e:
+            chunks.put(e)
+        finally:
+            speculative_stream.close()
+    _start_thread(pump, name="speculative-concepts")
+
+    try:
+        is_person = verdict.result()
+    except Exception:
+        cancelled.set()
+        raise
+    if is_person:
+        print(f"投机生成未命中，主题 '{topic}' 为人物，改用人物提示词")
+        cancelled.set()
+        return is_person, generate_concepts(topic, count, True, True)
+
+    def replay():
+        try:
+            while True:
+                chunk = chunks.get()
+                if chunk is done:
+                    return
+                if isinstance(chunk, Exception):
+                    raise chunk
+                yield chunk
+        finally:
+            cancelled.set()
+    return is_person, replay()
+
 def generate_concepts(topic: str, count: int = 10, is_person: bool = False, stream: bool = False):
     """
     生成概念，可以选择流式输出
@@ -212,46 +356,64 @@ def generate_concepts(topic: str, count: int = 10, is_person: bool = False, stre
     # 预判主题是否为人物 - 移除这里的判断，使用传入的is_person参数
     # is_person = pre_judge_person(topic)
     
-    if is_person:
-        messages = [{
-            "role": "user",
-            "content": ORG_PROMPT_TEMPLATE.format(topic=topic, count=count)
-        }]
-    else:
-        messages = [{
-            "role": "user",
-            "content": CONCEPT_PROMPT_TEMPLATE.format(topic=topic, count=count)
-        }]
+    messages = concept_messages(topic, count, is_person)
     
+    # 增量扫描器只检查新到达的chunk，跨chunk的过滤词由自动机状态衔接
+    scanner = content_filter.scanner()
     if stream:
-        accumulated_text = ""  # 用于累积文本进行过滤检查
         stream_gen = call_llm_api(messages, f"生成主体 '{topic}' 相关的节点", stream=True)
         for chunk in stream_gen:
-            accumulated_text += chunk
-            # 检查每个新chunk是否包含过滤词
-            if check_content_filter(chunk) or check_content_filter(accumulated_text):
+            if scanner.feed(chunk):
                 yield "[[CONTENT_FILTERED]]"
                 return
             yield chunk
     else:
         # 非流式模式下，分块接收并检查内容
-        accumulated_text = ""
+        chunks = []
         stream_gen = call_llm_api(messages, f"生成主体 '{topic}' 相关的节点", stream=True)
         for chunk in stream_gen:
-            # 检查每个新chunk是否包含过滤词
-            if check_content_filter(chunk):
-                raise ValueError("抱歉，这不是我擅长的主题，问我点别的吧！")
-            accumulated_text += chunk
-            # 检查累积的文本是否包含过滤词
-            if check_content_filter(accumulated_text):
+            if scanner.feed(chunk):
                 raise ValueError("抱歉，这不是我擅长的主题，问我点别的吧！")
+            chunks.append(chunk or "")
         
         # 只有在确认没有过滤词后才解析JSON
         return parse_json_response(
-            text=accumulated_text,
+            text="".join(chunks),
             error_context=f"处理主体 '{topic}' 的概念生成结果时"
         )
 
+def concept_messages(topic: str, count: int, is_person: bool = False) -> list:
+    """
+    生成概念的消息列表，人物主题使用人物提示词
+    """
+    template = ORG_PROMPT_TEMPLATE if is_person else CONCEPT_PROMPT_TEMPLATE
+    return [{
+        "role": "user",
+        "content": template.format(topic=topic, count=count)
+    }]
+
+def relationship_messages(concepts: dict, is_person: bool = False) -> list:
+    """
+    生成关系的消息列表，人物主题使用人物提示词
+    """
+    template = RELATIONSHIP_ORG_PROMPT_TEMPLATE if is_person else RELATIONSHIP_PROMPT_TEMPLATE
+    return [{
+        "role": "user",
+        "content": template.format(
+            concepts_json=json.dumps(concepts, ensure_ascii=False)
+        )
+    }]
+
+def new_concept_messages(new_concept_input: str, is_person: bool = False) -> list:
+    """
+    生成新增概念描述的消息列表，人物主题使用人物提示词
+    """
+    template = NEW_ORG_PROMPT_TEMPLATE if is_person else NEW_CONCEPT_PROMPT_TEMPLATE
+    return [{
+        "role": "user",
+        "content": template.format(new_concept_input=new_concept_input)
+    }]
+
 def generate_relationships(concepts: dict, is_person: bool = False) -> list:
     """
     生成关系
@@ -260,191 +422,75 @@ def generate_relationships(concepts: dict, is_person: bool = False) -> list:
     :return: 关系列表
     """
     try:
-        if is_person:
-            messages = [{
-                "role": "user",
-                "content": RELATIONSHIP_ORG_PROMPT_TEMPLATE.format(
-                    concepts_json=json.dumps(concepts, ensure_ascii=False)
-                )
-            }]
-        else:
-            messages = [{
-                "role": "user",
-                "content": RELATIONSHIP_PROMPT_TEMPLATE.format(
-                    concepts_json=json.dumps(concepts, ensure_ascii=False)
-            )
-        }]
-        
         response_text = call_llm_api(
-            messages=messages,
+            messages=relationship_messages(concepts, is_person),
             context="生成概念关系"
         )
         
         # 打印原始响应，用于调试
         print(f"关系生成原始响应: {response_text}")
         
-        # 解析 JSON 响应并提取 relations 数组
-        response_data = parse_json_response(
-            text=response_text,
-            error_context="处理概念关系生成结果时"
-        )
-        
-        # 确保返回的是包含 relations 的字典
-        if not isinstance(response_data, dict):
-            raise ValueError(f"返回的数据格式错误，应为字典但得到: {type(response_data)}")
-            
-        if 'relations' not in response_data:
-            raise ValueError(f"返回的数据缺少 'relations' 字段: {response_data}")
-            
-        relations = response_data['relations']
-        
-        # 验证关系数据的格式
-        if not isinstance(relations, list):
-            raise ValueError(f"relations 不是列表格式: {relations}")
-            
-        # 验证每个关系是否是包含三个元素的列表
-        for i, relation in enumerate(relations):
-            if not isinstance(relation, list) or len(relation) != 3:
-                raise ValueError(f"关系 {i} 格式错误: {relation}")
-        
-        return relations
+        return extract_relations(response_text, error_context="处理概念关系生成结果时")
         
     except Exception as e:
         raise ValueError(f"生成关系时出错: {str(e)}")
 
-def format_label(text: str) -> str:
+def extract_relations(response_text: str, error_context: str) -> list:
     """
-    格式化标签文本，如果存在括号，则处理括号内的英文部分
+    解析关系生成的JSON响应并校验 relations 数组
     """
-    if " (" not in text:
-        return text
-
-    # 只拆分一次，避免额外的 " (" 导致多个元素
-    chinese, english_with_paren = text.split(" (", 1)
-    english = english_with_paren.rstrip(")")
-
-    # 以逗号拆分，若正好拆分为两个部分则进行特殊格式化，否则直接返回换行格式
-    parts = english.split(", ")
-    if len(parts) == 2:
-        full_english, abbr = parts
-        return f"{chinese} {abbr}\n{full_english}"
-    else:
-        # 如果拆分的部分不等于2，则直接返回 "中文\n英文"
-        return f"{chinese}\n{english}"
-
-def create_network_data(concepts: dict, relationships: list) -> dict:
-    """
-    创建网络数据
-    """
-    # 定义层级颜色（使用 Google Material Design 配色）
-    color_scheme = {
-        "root": "#4285F4",     # Google Blue - 根节点
-        "level1": "#EA4335",   # Google Red - 一级节点
-        "level2": "#FBBC05",   # Google Yellow - 二级节点
-        "level3": "#34A853",   # Google Green - 三级节点
-        "level4": "#673AB7",   # Purple - 四级节点
-        "level5": "#FF7043"    # Deep Orange - 五级节点
-    }
+    response_data = parse_json_response(
+        text=response_text,
+        error_context=error_context
+    )
     
-    # 根据关系确定节点层级
-    def determine_level(node_id, relationships):
-        # 找出所有作为目标的节点（被指向的节点）
-        targets = set(rel[1] for rel in relationships)
-        # 找出所有作为源的节点（指向其他节点的节点）
-        sources = set(rel[0] for rel in relationships)
+    # 确保返回的是包含 relations 的字典
+    if not isinstance(response_data, dict):
+        raise ValueError(f"返回的数据格式错误，应为字典但得到: {type(response_data)}")
         
-        if node_id not in targets:  # 如果节点没有被指向，则为根节点
-            return "root"
-        elif node_id not in sources:  # 如果节点不指向其他节点，则为最底层
-            return "level5"
-        else:
-            # 计算入度（被指向次数）和出度（指向其他节点次数）
-            in_degree = sum(1 for rel in relationships if rel[1] == node_id)
-            out_degree = sum(1 for rel in relationships if rel[0] == node_id)
-            
-            if in_degree > out_degree:
-                return "level4"
-            elif in_degree == out_degree:
-                return "level3"
-            else:
-                return "level2"
-
-    nodes = []
-    edges = []
-    
-    # 创建节点
-    for concept, description in concepts.items():
-        level = determine_level(concept, relationships)
-        nodes.append({
-            'id': concept,
-            'label': format_label(concept),
-            'color': {
-                'background': color_scheme[level],
-                'highlight': {
-                    'background': color_scheme[level]
-                }
-            },
-            'explanation': description
-        })
-    
-    # 创建边
-    for source, target, relation in relationships:
-        edges.append({
-            'from': source,
-            'to': target,
-            'label': relation,
-            'smooth': {
-                'type': 'curvedCW',
-                'roundness': 0.2
-            }
-        })
+    if 'relations' not in response_data:
+        raise ValueError(f"返回的数据缺少 'relations' 字段: {response_data}")
+        
+    relations = response_data['relations']
     
-    # 添加网络配置选项
-    options = {
-        "nodes": {
-            "shape": "dot",
-            "size": 25,
-            "font": {
-                "face": "NotoSansHans-Regular",
-                "size": 14,
-                "multi": True
-            }
-        },
-        "edges": {
-            "font": {
-                "face": "NotoSansHans-Regular",
-                "size": 12
-            },
-            "smooth": {
-                "type": "curvedCW",
-                "roundness": 0.2
-            },
-            "width": 2
-        },
-        "physics": {
-            "barnesHut": {
-                "gravitationalConstant": -30000,
-                "springLength": 150,
-                "springConstant": 0.04,
-                "centralGravity": 0.3,
-                "damping": 0.09
-            }
-        },
-        "interaction": {
-            "hover": True,
-            "zoomView": True
-        },
-        "layout": {
-            "randomSeed": 42
-        }
-    }
+    # 验证关系数据的格式
+    if not isinstance(relations, list):
+        raise ValueError(f"relations 不是列表格式: {relations}")
+        
+    # 验证每个关系是否是包含三个元素的列表
+    for i, relation in enumerate(relations):
+        if not isinstance(relation, list) or len(relation) != 3:
+            raise ValueError(f"关系 {i} 格式错误: {relation}")
     
-    return {
-        'nodes': nodes,
-        'edges': edges,
-        'options': options,
-        'color_scheme': color_scheme  # 添加颜色方案以供前端使用
-    }
+    return relations
+
+def generate_cross_relationships(groups: list, relationships: list, is_person: bool = False) -> list:
+    """
+    补充不同分组概念之间的关系（流水线模式的最终合并阶段）
+    :param groups: 概念名称分组列表
+    :param relationships: 各分组内已生成的关系
+    :param is_person: 是否为人物类型，默认为False
+    :return: 新增的跨分组关系列表
+    """
+    try:
+        template = CROSS_RELATIONSHIP_ORG_PROMPT_TEMPLATE if is_person else CROSS_RELATIONSHIP_PROMPT_TEMPLATE
+        messages = [{
+            "role": "user",
+            "content": template.format(
+                groups_json=json.dumps(groups, ensure_ascii=False),
+                relations_json=json.dumps(relationships, ensure_ascii=False)
+            )
+        }]
+        
+        response_text = call_llm_api(
+            messages=messages,
+            context="生成跨分组概念关系"
+        )
+        
+        return extract_relations(response_text, error_context="处理跨分组概念关系生成结果时")
+        
+    except Exception as e:
+        raise ValueError(f"生成跨分组关系时出错: {str(e)}")
 
 @retry_on_error(max_retries=3)
 def generate_new_concept_detail(new_concept_input: str, is_person: bool = False) -> dict:
@@ -455,23 +501,8 @@ def generate_new_concept_detail(new_concept_input: str, is_person: bool = False)
     :param is_person: 是否为人物类型
     """
     try:
-        if is_person:
-            messages = [{
-                "role": "user",
-                "content": NEW_ORG_PROMPT_TEMPLATE.format(
-                    new_concept_input=new_concept_input
-                )
-            }]
-        else:
-            messages = [{
-                "role": "user",
-                "content": NEW_CONCEPT_PROMPT_TEMPLATE.format(
-                    new_concept_input=new_concept_input
-                )
-            }]
-        
         response_text = call_llm_api(
-            messages,
+            new_concept_messages(new_concept_input, is_person),
             context=f"生成新概念 '{new_concept_input}' 的描述",
             stream=False
         )